@@ -2,14 +2,66 @@
 产量预测 API 路由
 """
 
-from fastapi import APIRouter, Query, HTTPException
-from typing import Optional, List
-from pydantic import BaseModel
-from ..services.forecast import forecast_service, generate_mock_historical_data
+from fastapi import APIRouter, Depends, Query, HTTPException
+from sqlalchemy.orm import Session
+from typing import Optional, List, Dict
+from datetime import datetime
+from pydantic import BaseModel, Field
+import asyncio
+import math
+import numpy as np
+from ..config import settings
+from ..database import get_db
+from ..models.models import CropRecord, YieldRecord
+from ..services.forecast import forecast_service, FACTOR_NAMES
+from ..services.forecast_executor import forecast_executor, ForecastQueueFull
+from ..services.backtest import backtest_jobs
+from ..services.yield_history import yield_loader
+from ..services.materialize import forecast_materializer, snapshot_info
+from ..services.singleflight import forecast_flights, factors_key
+from ..services.reconcile import reconcile_forecasts
 
 router = APIRouter(prefix="/forecast", tags=["产量预测"])
 
 
+def _busy_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="预测任务繁忙，请稍后重试",
+        headers={"Retry-After": "1"}
+    )
+
+
+async def _forecast(crop: str, periods: int,
+                    current_factors: Optional[Dict[str, float]] = None,
+                    interval_method: str = 'spread',
+                    confidence_level: float = 0.95,
+                    n_paths: Optional[int] = None) -> Dict:
+    """单作物预测：作物、期数、环境因素与区间参数相同的并发请求共享一次计算"""
+    if interval_method == 'bootstrap':
+        interval = (interval_method, confidence_level, n_paths or settings.FORECAST_BOOTSTRAP_PATHS)
+    else:
+        interval = (interval_method,)
+    key = ('forecast', crop, periods, factors_key(current_factors), interval)
+    return await forecast_flights.do(key, lambda: forecast_executor.forecast(
+        crop=crop,
+        periods=periods,
+        current_factors=current_factors,
+        interval_method=interval_method,
+        confidence_level=confidence_level,
+        n_paths=n_paths
+    ))
+
+
+async def _forecast_many(crops: List[str], periods: int) -> Dict[str, Dict]:
+    """多作物批量预测：作物集合与期数相同的并发请求共享一次计算"""
+    unique = sorted(set(crops))
+    return await forecast_flights.do(
+        ('compare', tuple(unique), periods),
+        lambda: forecast_executor.forecast_many(unique, periods=periods)
+    )
+
+
 class EnvironmentFactors(BaseModel):
     """环境因素模型"""
     temperature: Optional[float] = 25.0      # 温度 (°C)
@@ -24,21 +76,77 @@ class ForecastRequest(BaseModel):
     crop: str = "水稻"
     periods: int = 3
     factors: Optional[EnvironmentFactors] = None
+    scenarios: Optional[List[EnvironmentFactors]] = None  # 多组情景，批量评估
+    interval_method: str = Field("spread", pattern="^(spread|bootstrap)$")  # 置信区间计算方式
+    confidence_level: float = Field(0.95, gt=0.5, lt=1)   # bootstrap 区间水平
+    n_paths: Optional[int] = Field(None, ge=100, le=100000)  # bootstrap 模拟路径数
+
+
+class FactorRange(BaseModel):
+    """因素取值范围（含 stop）"""
+    start: float
+    stop: float
+    step: float
+
+
+class ScenarioSweepRequest(BaseModel):
+    """情景网格扫描请求模型"""
+    crop: str = "水稻"
+    periods: int = Field(3, ge=1, le=12)
+    ranges: Dict[str, FactorRange] = {}        # 按范围给出的因素
+    values: Dict[str, List[float]] = {}        # 按取值列表给出的因素
+    top_k: Optional[int] = Field(None, ge=1, le=1000)
+    include_periods: bool = False              # 是否返回每个网格点的逐期预测
+
+
+class YieldObservation(BaseModel):
+    """产量观测记录"""
+    crop: Optional[str] = None                 # 未给出时取种植记录的作物
+    period_start: datetime                     # 观测期起始（月度数据为当月 1 日）
+    yield_value: float = Field(..., ge=0)      # 产量 (kg)
+    crop_record_id: Optional[int] = None
+    plot_id: Optional[int] = None              # 未给出时取种植记录的地块
+    area: Optional[float] = None
+    temperature: Optional[float] = None
+    rainfall: Optional[float] = None
+    fertilizer: Optional[float] = None
+    soil_ph: Optional[float] = None
+    sunshine: Optional[float] = None
+
+
+class YieldObservationBatch(BaseModel):
+    """产量观测批量上报"""
+    observations: List[YieldObservation] = Field(..., min_length=1, max_length=10000)
+
+
+class BacktestRequest(BaseModel):
+    """回测请求模型"""
+    crops: List[str] = ['水稻', '玉米', '蔬菜']
+    horizon: int = Field(3, ge=1, le=12)       # 预测步长
+    min_train: int = Field(12, ge=3)           # 第一个起点前的最少训练长度
+    step: int = Field(1, ge=1)                 # 起点间隔
 
 
 @router.get("/predict")
 async def predict_yield(
     crop: str = Query("水稻", description="作物类型: 水稻, 玉米, 蔬菜, 小麦"),
-    periods: int = Query(3, description="预测期数(月)", ge=1, le=12)
+    periods: int = Query(3, description="预测期数(月)", ge=1, le=12),
+    interval_method: str = Query("spread", pattern="^(spread|bootstrap)$",
+                                 description="置信区间计算方式: spread, bootstrap"),
+    confidence_level: float = Query(0.95, gt=0.5, lt=1, description="bootstrap 区间水平"),
+    n_paths: Optional[int] = Query(None, ge=100, le=100000, description="bootstrap 模拟路径数")
 ):
     """
     产量预测接口
 
     返回指定作物未来几个月的产量预测结果，包括：
     - 各期预测值
-    - 置信区间
+    - 置信区间（spread: 子模型离散程度；bootstrap: 残差自助法模拟路径的经验分位数）
     - 趋势判断
     - 算法信息
+
+    spread 区间的结果由后台预计算，直接返回最新快照（snapshot 给出计算时间与已过时长，
+    快照过期时仍先返回并在后台重新计算）；bootstrap 区间实时计算
     """
     valid_crops = ['水稻', '玉米', '蔬菜', '小麦']
     if crop not in valid_crops:
@@ -48,11 +156,26 @@ async def predict_yield(
         )
 
     try:
-        result = forecast_service.forecast(crop=crop, periods=periods)
+        if settings.FORECAST_MATERIALIZE and interval_method == 'spread':
+            snapshot = forecast_materializer.get(crop, periods)
+            if snapshot is None:
+                # 首次使用会初始化预测服务，不在事件循环中执行
+                token = await asyncio.to_thread(forecast_service.data_token, crop)
+                result = await _forecast(crop, periods)
+                snapshot = forecast_materializer.put(crop, periods, result, token)
+            return {
+                "success": True,
+                "data": snapshot['data'],
+                "snapshot": snapshot_info(snapshot)
+            }
+
+        result = await _forecast(crop, periods, None, interval_method, confidence_level, n_paths)
         return {
             "success": True,
             "data": result
         }
+    except ForecastQueueFull:
+        raise _busy_error()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"预测失败: {str(e)}")
 
@@ -62,7 +185,8 @@ async def predict_with_factors(request: ForecastRequest):
     """
     带环境因素的产量预测
 
-    根据当前环境因素进行更精准的产量预测
+    根据当前环境因素进行更精准的产量预测。
+    传入 scenarios 时模型只拟合一次，所有情景向量化评估，返回列式结果
     """
     valid_crops = ['水稻', '玉米', '蔬菜', '小麦']
     if request.crop not in valid_crops:
@@ -72,30 +196,113 @@ async def predict_with_factors(request: ForecastRequest):
         )
 
     try:
+        if request.scenarios:
+            scenarios = [f.dict() for f in request.scenarios]
+            key = ('scenarios', request.crop, request.periods,
+                   tuple(factors_key(f) for f in scenarios))
+            result = await forecast_flights.do(key, lambda: forecast_executor.score_scenarios(
+                crop=request.crop,
+                periods=request.periods,
+                scenarios=scenarios
+            ))
+            return {
+                "success": True,
+                "data": result
+            }
+
         factors_dict = None
         if request.factors:
             factors_dict = request.factors.dict()
 
-        result = forecast_service.forecast(
+        result = await _forecast(request.crop, request.periods, factors_dict,
+                                 request.interval_method, request.confidence_level,
+                                 request.n_paths)
+        return {
+            "success": True,
+            "data": result
+        }
+    except ForecastQueueFull:
+        raise _busy_error()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"预测失败: {str(e)}")
+
+
+def _range_length(r: FactorRange) -> float:
+    """范围内（含 stop）的取值个数，步数过大无法表示时返回 inf"""
+    count = (r.stop - r.start) / r.step
+    if not math.isfinite(count):
+        return math.inf
+    # 容许浮点误差，使 stop 恰好落在步长整数倍上时计入
+    return math.floor(count + 1e-9) + 1
+
+
+@router.post("/scenarios")
+async def sweep_scenarios(request: ScenarioSweepRequest):
+    """
+    环境因素情景网格扫描
+
+    对给定因素范围/取值的笛卡尔网格批量预测产量：模型只拟合一次，
+    整个网格向量化评估。返回按网格顺序排列的总产量列，可选返回产量最高的 top_k 个情景
+    """
+    valid_crops = ['水稻', '玉米', '蔬菜', '小麦']
+    if request.crop not in valid_crops:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的作物类型: {request.crop}"
+        )
+
+    unknown = [name for name in list(request.ranges) + list(request.values)
+               if name not in FACTOR_NAMES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"不支持的环境因素: {', '.join(unknown)}")
+
+    axes = {name: list(values) for name, values in request.values.items() if values}
+    lengths = {name: len(values) for name, values in axes.items()}
+    for name, r in request.ranges.items():
+        if not r.step > 0:
+            raise HTTPException(status_code=400, detail=f"因素 {name} 的步长必须为正数")
+        if r.stop < r.start:
+            raise HTTPException(status_code=400, detail=f"因素 {name} 的范围无效")
+        lengths[name] = _range_length(r)
+
+    # 先由各轴长度计算网格规模，超限时在分配任何数组之前拒绝
+    points = math.prod(lengths.values())
+    if points > settings.FORECAST_SCENARIO_MAX_POINTS:
+        detail = f"情景数 {int(points)} 超过上限" if math.isfinite(points) else "情景数超过上限"
+        raise HTTPException(
+            status_code=400,
+            detail=f"{detail} {settings.FORECAST_SCENARIO_MAX_POINTS}"
+        )
+
+    for name, r in request.ranges.items():
+        axes[name] = (r.start + r.step * np.arange(lengths[name])).round(6).tolist()
+
+    try:
+        result = await forecast_executor.sweep_scenarios(
             crop=request.crop,
             periods=request.periods,
-            current_factors=factors_dict
+            axes=axes,
+            top_k=request.top_k,
+            include_periods=request.include_periods
         )
         return {
             "success": True,
             "data": result
         }
+    except ForecastQueueFull:
+        raise _busy_error()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"预测失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"情景扫描失败: {str(e)}")
 
 
 @router.get("/history/{crop}")
 async def get_historical_data(crop: str):
     """
     获取历史产量数据
+
+    返回预测服务当前使用的历史数据（已加载的产量观测，无观测的作物在允许模拟数据时为模拟数据）
     """
-    all_data = generate_mock_historical_data(24)
-    crop_data = [d for d in all_data if d.get('crop') == crop]
+    crop_data = await asyncio.to_thread(forecast_service.history_records, crop)
 
     if not crop_data:
         raise HTTPException(status_code=404, detail=f"未找到作物 {crop} 的历史数据")
@@ -106,6 +313,54 @@ async def get_historical_data(crop: str):
     }
 
 
+@router.post("/observations")
+def add_observations(batch: YieldObservationBatch, db: Session = Depends(get_db)):
+    """
+    上报产量观测
+
+    写入 yield_records 表后增量加载新增的行，相关作物已缓存的模型随之增量更新
+    """
+    record_ids = {o.crop_record_id for o in batch.observations if o.crop_record_id is not None}
+    crop_records = {}
+    if record_ids:
+        crop_records = {
+            r.id: r for r in db.query(CropRecord).filter(CropRecord.id.in_(record_ids)).all()
+        }
+        missing = sorted(record_ids - crop_records.keys())
+        if missing:
+            raise HTTPException(
+                status_code=404,
+                detail=f"种植记录不存在: {', '.join(map(str, missing))}"
+            )
+
+    rows = []
+    for o in batch.observations:
+        crop_record = crop_records.get(o.crop_record_id)
+        crop = o.crop or (crop_record.crop_name if crop_record else None)
+        if not crop:
+            raise HTTPException(status_code=400, detail="产量观测缺少作物类型")
+        values = o.model_dump(exclude={'crop', 'plot_id'})
+        values.update(
+            crop=crop,
+            plot_id=o.plot_id if o.plot_id is not None else (crop_record.plot_id if crop_record else None)
+        )
+        rows.append(values)
+
+    db.bulk_insert_mappings(YieldRecord, rows)
+    db.commit()
+
+    loaded = yield_loader.refresh(db)
+    # 相关作物的预测快照随之过期，立即在后台重新计算
+    forecast_materializer.refresh_stale()
+    return {
+        "success": True,
+        "data": {
+            "inserted": len(rows),
+            "loaded": loaded
+        }
+    }
+
+
 @router.get("/compare")
 async def compare_crops(
     crops: str = Query("水稻,玉米,蔬菜", description="要比较的作物，逗号分隔"),
@@ -114,7 +369,9 @@ async def compare_crops(
     """
     多作物产量预测对比
 
-    同时预测多种作物的产量，用于对比分析
+    同时预测多种作物的产量，用于对比分析。
+    各作物优先返回预计算的快照（snapshots 给出各自的计算时间与已过时长），
+    没有快照的作物一次批量拟合
     """
     crop_list = [c.strip() for c in crops.split(',')]
     valid_crops = ['水稻', '玉米', '蔬菜', '小麦']
@@ -126,16 +383,146 @@ async def compare_crops(
             detail=f"不支持的作物: {', '.join(invalid)}"
         )
 
-    results = {}
-    for crop in crop_list:
+    if not settings.FORECAST_MATERIALIZE:
         try:
-            results[crop] = forecast_service.forecast(crop=crop, periods=periods)
+            # 所有作物一次批量拟合
+            results = await _forecast_many(crop_list, periods)
+        except ForecastQueueFull:
+            raise _busy_error()
         except Exception as e:
-            results[crop] = {"error": str(e)}
+            raise HTTPException(status_code=500, detail=f"预测失败: {str(e)}")
+
+        return {
+            "success": True,
+            "data": {crop: results[crop] for crop in crop_list}
+        }
+
+    snapshots = {crop: forecast_materializer.get(crop, periods) for crop in crop_list}
+    missing = [crop for crop, snapshot in snapshots.items() if snapshot is None]
+    if missing:
+        try:
+            tokens = await asyncio.to_thread(
+                lambda: {crop: forecast_service.data_token(crop) for crop in missing}
+            )
+            results = await _forecast_many(missing, periods)
+        except ForecastQueueFull:
+            raise _busy_error()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"预测失败: {str(e)}")
+        for crop in missing:
+            snapshots[crop] = forecast_materializer.put(crop, periods, results[crop], tokens[crop])
+
+    return {
+        "success": True,
+        "data": {crop: snapshot['data'] for crop, snapshot in snapshots.items()},
+        "snapshots": {crop: snapshot_info(snapshot) for crop, snapshot in snapshots.items()}
+    }
+
+
+@router.get("/reconcile")
+def reconcile_hierarchy(
+    periods: int = Query(3, ge=1, le=12, description="预测期数"),
+    method: str = Query("mint", pattern="^(bottom_up|top_down|mint)$",
+                        description="协调方法: bottom_up, top_down, mint"),
+    weights: str = Query("variance", pattern="^(structural|variance)$",
+                         description="mint 方差权重: structural, variance"),
+    include_plots: bool = Query(False, description="是否返回各地块的协调结果"),
+    db: Session = Depends(get_db)
+):
+    """
+    地块 → 作物 → 农场层级预测协调
+
+    以最近一次地块级预测任务的结果为底层、ForecastService 的作物级预测为中间层、
+    作物级预测之和为农场合计，协调后各级预测满足逐级求和关系。
+    两级预测按预测期起始日对齐，只协调共同覆盖的各期（其余列入 dropped_periods），
+    两级严重不一致的作物在 warnings 中给出。
+    mint 的 variance 权重由各预测的置信区间宽度估计方差
+    """
+    try:
+        result = reconcile_forecasts(db, forecast_service, periods, method, weights, include_plots)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"预测协调失败: {str(e)}")
+    if result is None:
+        raise HTTPException(status_code=404, detail="暂无地块级预测结果，请先运行地块级预测任务")
+
+    return {
+        "success": True,
+        "data": result
+    }
+
+
+@router.post("/backtest")
+async def start_backtest(request: BacktestRequest):
+    """
+    启动滚动起点回测任务
+
+    在后台评估各子模型与集成模型在每个预测步长上的 MAE、MAPE 及区间覆盖率，
+    返回任务编号，通过 GET /forecast/backtest/{job_id} 查询结果
+    """
+    valid_crops = ['水稻', '玉米', '蔬菜', '小麦']
+    invalid = [c for c in request.crops if c not in valid_crops]
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的作物: {', '.join(invalid)}"
+        )
+
+    try:
+        yields = await forecast_executor.yield_series(request.crops)
+    except ForecastQueueFull:
+        raise _busy_error()
+    series = [(crop, yields[crop]) for crop in request.crops]
+    job = backtest_jobs.submit(
+        series,
+        horizon=request.horizon,
+        min_train=request.min_train,
+        step=request.step,
+        config=forecast_service.forecaster.get_config(),
+        group_configs={crop: forecast_service.config_for(crop) for crop in request.crops},
+        workers=settings.BACKTEST_WORKERS
+    )
+
+    return {
+        "success": True,
+        "data": {
+            "job_id": job['job_id'],
+            "status": job['status']
+        }
+    }
+
+
+@router.get("/backtest/{job_id}")
+async def get_backtest(job_id: str):
+    """
+    查询回测任务状态与结果
+    """
+    job = backtest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"回测任务 {job_id} 不存在")
 
     return {
         "success": True,
-        "data": results
+        "data": job
+    }
+
+
+@router.get("/stats")
+async def get_forecast_stats():
+    """
+    获取预测服务运行统计
+
+    包括已拟合模型缓存的命中/未命中次数、历史数据存储规模
+    """
+    return {
+        "success": True,
+        "data": {
+            "model_cache": forecast_service.cache_stats(),
+            "history": forecast_service.history.stats(),
+            "yield_loader": yield_loader.stats(),
+            "materializer": forecast_materializer.stats(),
+            "coalescing": forecast_flights.stats(),
+            "executor": forecast_executor.stats()
+        }
     }
 
 
@@ -9,6 +9,7 @@ from ..models.schemas import (
     CropRecordResponse, FarmTaskCreate, FarmTaskResponse,
     MessageResponse
 )
+from ..services.plot_forecast import plot_forecast_runner, latest_plot_forecast
 
 router = APIRouter(prefix="/plots", tags=["地块管理"])
 
@@ -66,7 +67,9 @@ def get_plot_detail(plot_id: int, db: Session = Depends(get_db)):
 
     return {
         **plot.__dict__,
-        "current_crop": current_crop
+        "current_crop": current_crop,
+        # 最近一次地块级预测的结果（由批量任务预先计算）
+        "forecast": latest_plot_forecast(db, plot_id)
     }
 
 
@@ -143,3 +146,18 @@ def complete_task(task_id: int, db: Session = Depends(get_db)):
     db.commit()
 
     return MessageResponse(message="任务已完成")
+
+
+# ============ 地块级产量预测 ============
+
+@router.post("/forecasts/run")
+def run_plot_forecasts():
+    """启动地块级产量预测批量任务（已在运行时返回当前任务状态）"""
+    state, started = plot_forecast_runner.start()
+    return {**state, "started": started}
+
+
+@router.get("/forecasts/status")
+def get_plot_forecast_status():
+    """获取地块级产量预测任务状态与最近一次运行摘要"""
+    return plot_forecast_runner.status()
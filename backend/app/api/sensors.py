@@ -1,14 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime, timedelta
+import asyncio
+import base64
+import json
 import random
 
+from ..config import settings
 from ..database import get_db
 from ..models.models import Sensor, SensorData, AlertRule
 from ..models.schemas import (
-    SensorCreate, SensorResponse, SensorDataResponse,
-    RealtimeDataResponse, MessageResponse
+    SensorCreate, SensorResponse, SensorDataResponse, SensorDataPage,
+    SensorDataBatch, SensorDataBatchResponse,
+    RealtimeDataResponse, AlertRuleCreate, AlertRuleResponse, MessageResponse
+)
+from ..services.rollup import query_history
+from ..services.realtime import realtime_store
+from ..services.stream import stream_hub
+from ..services.alerts import alert_engine, CONDITIONS
+from ..services.ingest import (
+    sensor_cache, ingest_buffer, IngestQueueFull, IngestBufferStopped,
+    resolve_readings, write_readings, notify_ingest
 )
 
 router = APIRouter(prefix="/sensors", tags=["传感器"])
@@ -32,18 +47,33 @@ def get_sensors(db: Session = Depends(get_db)):
 
 @router.get("/realtime", response_model=List[RealtimeDataResponse])
 def get_realtime_data():
-    """获取实时传感器数据"""
+    """
+    获取实时传感器数据
+
+    直接读取内存环形缓冲区中各传感器的最新值，同类型多个传感器取平均，
+    任一传感器超出范围即告警，不访问数据库
+    """
+    latest = realtime_store.latest_by_type()
+
     data = []
     for sensor_type, config in SENSOR_TYPES.items():
-        value = round(random.uniform(config["min"], config["max"]), 1)
-        # 模拟偶尔超出范围
-        if random.random() < 0.1:
-            if random.random() < 0.5:
-                value = config["min"] - random.uniform(1, 5)
-            else:
-                value = config["max"] + random.uniform(1, 5)
+        readings = latest.get(sensor_type)
+        if readings:
+            values = [value for _, _, value in readings]
+            value = sum(values) / len(values)
+            is_warning = any(v < config["min"] or v > config["max"] for v in values)
+        elif settings.MOCK_DATA_ENABLED:
+            value = round(random.uniform(config["min"], config["max"]), 1)
+            # 模拟偶尔超出范围
+            if random.random() < 0.1:
+                if random.random() < 0.5:
+                    value = config["min"] - random.uniform(1, 5)
+                else:
+                    value = config["max"] + random.uniform(1, 5)
 
-        is_warning = value < config["min"] or value > config["max"]
+            is_warning = value < config["min"] or value > config["max"]
+        else:
+            continue
 
         data.append(RealtimeDataResponse(
             type=sensor_type,
@@ -57,17 +87,87 @@ def get_realtime_data():
     return data
 
 
+@router.get("/stream")
+async def stream_realtime_data(
+    types: Optional[str] = Query(None, description="传感器类型，逗号分隔"),
+    locations: Optional[str] = Query(None, description="安装位置，逗号分隔"),
+    interval: float = Query(0, ge=0, le=60, description="合并推送间隔（秒），0 表示逐批推送")
+):
+    """
+    实时数据推送 (Server-Sent Events)
+
+    每批新数据推送一条 readings 事件；指定 interval 时按间隔合并，
+    每个传感器只保留最新值
+    """
+    subscriber = stream_hub.subscribe(
+        types=set(types.split(",")) if types else None,
+        locations=set(locations.split(",")) if locations else None
+    )
+
+    async def event_source():
+        try:
+            while True:
+                try:
+                    events = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=settings.STREAM_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if events is None:
+                    # 消费过慢已被断开
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+
+                if interval > 0:
+                    await asyncio.sleep(interval)
+                    latest = {e["sensor_id"]: e for e in events}
+                    while not subscriber.queue.empty():
+                        more = subscriber.queue.get_nowait()
+                        if more is None:
+                            return
+                        latest.update((e["sensor_id"], e) for e in more)
+                    events = list(latest.values())
+
+                payload = json.dumps(events, ensure_ascii=False)
+                yield f"event: readings\ndata: {payload}\n\n"
+        finally:
+            stream_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/history")
 def get_history_data(
     sensor_type: str = "temperature",
     time_range: str = "24h",
     db: Session = Depends(get_db)
 ):
-    """获取历史数据"""
-    # 生成模拟历史数据
+    """
+    获取历史数据
+
+    1h 优先由内存环形缓冲区计算分钟曲线；其余从分级汇总表读取：
+    24h 使用小时桶，7d/30d 使用日桶
+    """
+    data = None
+    if time_range == "1h":
+        data = realtime_store.window_history(sensor_type)
+    if data is None:
+        data = query_history(db, sensor_type, time_range)
+    if data or not settings.MOCK_DATA_ENABLED:
+        return {"sensor_type": sensor_type, "time_range": time_range, "data": data}
+
+    # 尚无真实数据时生成模拟历史数据
     now = datetime.utcnow()
 
-    if time_range == "24h":
+    if time_range == "1h":
+        points = 60
+        delta = timedelta(minutes=1)
+    elif time_range == "24h":
         points = 24
         delta = timedelta(hours=1)
     elif time_range == "7d":
@@ -94,6 +194,122 @@ def get_history_data(
     return {"sensor_type": sensor_type, "time_range": time_range, "data": data}
 
 
+def _encode_cursor(recorded_at: datetime, row_id: int) -> str:
+    raw = f"{recorded_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        recorded_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(recorded_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+@router.get("/{sensor_id}/data", response_model=SensorDataPage)
+def get_sensor_data(
+    sensor_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    db: Session = Depends(get_db)
+):
+    """
+    获取传感器历史数据
+
+    使用 (recorded_at, id) 游标分页，配合 (sensor_id, recorded_at) 复合索引，
+    每页查询代价与翻页深度无关
+    """
+    if not db.query(Sensor.id).filter(Sensor.id == sensor_id).first():
+        raise HTTPException(status_code=404, detail="传感器不存在")
+
+    query = db.query(SensorData).filter(SensorData.sensor_id == sensor_id)
+    if start:
+        query = query.filter(SensorData.recorded_at >= start)
+    if end:
+        query = query.filter(SensorData.recorded_at < end)
+
+    descending = order == "desc"
+    if cursor:
+        last_at, last_id = _decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(
+                SensorData.recorded_at < last_at,
+                and_(SensorData.recorded_at == last_at, SensorData.id < last_id)
+            ))
+        else:
+            query = query.filter(or_(
+                SensorData.recorded_at > last_at,
+                and_(SensorData.recorded_at == last_at, SensorData.id > last_id)
+            ))
+
+    if descending:
+        query = query.order_by(SensorData.recorded_at.desc(), SensorData.id.desc())
+    else:
+        query = query.order_by(SensorData.recorded_at.asc(), SensorData.id.asc())
+
+    # 多取一条用于判断是否还有下一页
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].recorded_at, rows[-1].id)
+
+    return SensorDataPage(data=rows, next_cursor=next_cursor)
+
+
+@router.post("/data/batch", response_model=SensorDataBatchResponse)
+def ingest_batch(batch: SensorDataBatch, db: Session = Depends(get_db)):
+    """网关批量上报传感器数据"""
+    if len(batch.readings) > settings.INGEST_MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"单批数据不能超过 {settings.INGEST_MAX_BATCH_SIZE} 条"
+        )
+
+    rows, unknown = resolve_readings(
+        db, [(r.sensor_id, r.value, r.recorded_at) for r in batch.readings]
+    )
+
+    queued = settings.INGEST_WRITE_BEHIND
+    if queued:
+        try:
+            ingest_buffer.put(rows, timeout=settings.INGEST_BLOCK_TIMEOUT)
+        except IngestQueueFull:
+            raise HTTPException(
+                status_code=429,
+                detail="写入队列已满，请稍后重试",
+                headers={"Retry-After": "1"}
+            )
+        except IngestBufferStopped:
+            # 服务关闭中写后队列不再接收，改为直接写入
+            queued = False
+    accepted = len(rows) if queued else write_readings(db, rows)
+
+    notify_ingest(rows)
+
+    return SensorDataBatchResponse(
+        accepted=accepted,
+        rejected=len(batch.readings) - accepted,
+        unknown_sensors=unknown,
+        queued=queued
+    )
+
+
+@router.get("/ingest/stats")
+def get_ingest_stats():
+    """获取数据写入队列统计"""
+    return {
+        "buffer": ingest_buffer.stats(),
+        "sensor_cache": sensor_cache.stats(),
+        "stream": stream_hub.stats()
+    }
+
+
 @router.post("", response_model=SensorResponse)
 def create_sensor(sensor: SensorCreate, db: Session = Depends(get_db)):
     """创建新传感器"""
@@ -116,6 +332,7 @@ def create_sensor(sensor: SensorCreate, db: Session = Depends(get_db)):
     db.add(db_sensor)
     db.commit()
     db.refresh(db_sensor)
+    sensor_cache.invalidate(db_sensor.sensor_id)
     return db_sensor
 
 
@@ -128,4 +345,72 @@ def delete_sensor(sensor_id: int, db: Session = Depends(get_db)):
 
     db.delete(sensor)
     db.commit()
+    sensor_cache.invalidate(sensor.sensor_id)
+    realtime_store.forget(sensor_id)
+    return MessageResponse(message="删除成功")
+
+
+# ============ 告警规则相关 ============
+
+def _validate_condition(condition: str) -> None:
+    if condition not in CONDITIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的告警条件: {condition}。支持: {', '.join(CONDITIONS)}"
+        )
+
+
+@router.get("/alert-rules", response_model=List[AlertRuleResponse])
+def get_alert_rules(db: Session = Depends(get_db)):
+    """获取所有告警规则"""
+    return db.query(AlertRule).all()
+
+
+@router.post("/alert-rules", response_model=AlertRuleResponse)
+def create_alert_rule(rule: AlertRuleCreate, db: Session = Depends(get_db)):
+    """创建告警规则（立即生效）"""
+    _validate_condition(rule.condition)
+    db_rule = AlertRule(**rule.model_dump())
+    db.add(db_rule)
+    db.commit()
+    db.refresh(db_rule)
+    alert_engine.load(db)
+    return db_rule
+
+
+@router.put("/alert-rules/{rule_id}", response_model=AlertRuleResponse)
+def update_alert_rule(rule_id: int, rule: AlertRuleCreate, db: Session = Depends(get_db)):
+    """修改告警规则（立即生效）"""
+    db_rule = db.query(AlertRule).filter(AlertRule.id == rule_id).first()
+    if not db_rule:
+        raise HTTPException(status_code=404, detail="告警规则不存在")
+    _validate_condition(rule.condition)
+
+    for field, value in rule.model_dump().items():
+        setattr(db_rule, field, value)
+    db.commit()
+    db.refresh(db_rule)
+    alert_engine.load(db)
+    return db_rule
+
+
+@router.delete("/alert-rules/{rule_id}", response_model=MessageResponse)
+def delete_alert_rule(rule_id: int, db: Session = Depends(get_db)):
+    """删除告警规则"""
+    db_rule = db.query(AlertRule).filter(AlertRule.id == rule_id).first()
+    if not db_rule:
+        raise HTTPException(status_code=404, detail="告警规则不存在")
+
+    db.delete(db_rule)
+    db.commit()
+    alert_engine.load(db)
     return MessageResponse(message="删除成功")
+
+
+@router.get("/alerts")
+def get_alerts():
+    """获取最近的告警事件及引擎统计"""
+    return {
+        "events": alert_engine.recent_events(),
+        "stats": alert_engine.stats()
+    }
@@ -19,6 +19,61 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # 传感器数据写入配置
+    INGEST_MAX_BATCH_SIZE: int = 10000
+    INGEST_WRITE_BEHIND: bool = True        # 是否经写后缓冲队列分组提交
+    INGEST_QUEUE_SIZE: int = 100000         # 队列容量
+    INGEST_FLUSH_BATCH_SIZE: int = 5000     # 单次提交最大行数
+    INGEST_FLUSH_INTERVAL: float = 0.5      # 最长刷新间隔（秒）
+    INGEST_BLOCK_TIMEOUT: float = 0         # 队列满时阻塞等待秒数，0 表示直接返回 429
+    INGEST_MAX_RETRIES: int = 3             # 分组提交失败后的重试次数，仍失败时转存死信表
+    INGEST_RETRY_BACKOFF: float = 0.5       # 首次重试等待秒数，之后每次加倍
+
+    # 实时数据缓存配置
+    REALTIME_BUFFER_SIZE: int = 3600        # 每个传感器保留的最近数据条数
+    STREAM_QUEUE_SIZE: int = 100            # 每个推送订阅者的消息队列长度
+    STREAM_KEEPALIVE: float = 15            # 推送连接保活间隔（秒）
+
+    # 告警配置
+    ALERT_HYSTERESIS: float = 0.02          # 解除告警的迟滞比例（相对阈值）
+    ALERT_COOLDOWN: float = 300             # 同一告警再次触发的最短间隔（秒）
+
+    # 产量预测配置
+    FORECAST_CACHE_SIZE: int = 64           # 已拟合模型缓存容量
+    FORECAST_EXECUTOR: str = "thread"       # 预测执行模式: inline, thread, process
+    FORECAST_WORKERS: int = 4               # 预测线程/进程数
+    FORECAST_MAX_PENDING: int = 32          # 排队与执行中的预测任务上限
+    FORECAST_MF_SOLVER: str = "heuristic"   # 多因素预测器求解方式: heuristic, lstsq
+    FORECAST_MF_RIDGE: float = 1.0          # lstsq 模式的岭回归系数
+    FORECAST_SCENARIO_MAX_POINTS: int = 100000  # 单次情景网格扫描的最大点数
+    FORECAST_BOOTSTRAP_PATHS: int = 2000    # bootstrap 区间默认模拟路径数
+    FORECAST_BOOTSTRAP_MAX_DRAWS: int = 240000  # 单次 bootstrap 抽样上限（路径数 × 期数）
+    FORECAST_RESIDUAL_ORIGINS: int = 240    # bootstrap 残差取最近多少个一步预测起点
+    FORECAST_REFIT_EVERY: int = 12          # 增量更新累计多少个观测后完整重拟合
+    YIELD_LOAD_BATCH_SIZE: int = 5000       # 产量历史流式加载的每批行数
+    FORECAST_TUNED_PARAMS_PATH: str = "./forecast_params.json"  # 按作物调优的模型参数文件
+    FORECAST_WARMUP: bool = True            # 启动后在后台线程预先拟合各作物模型
+    FORECAST_MATERIALIZE: bool = True       # 预计算各作物预测结果，接口直接返回快照
+    FORECAST_MATERIALIZE_PERIODS: List[int] = [3]  # 定时预计算的预测期数
+    FORECAST_MATERIALIZE_INTERVAL: float = 60.0    # 检查并刷新过期快照的间隔（秒）
+    FORECAST_SNAPSHOT_TTL: float = 900.0    # 快照最长有效期（秒），数据或模型变化时立即过期
+    BACKTEST_WORKERS: int = 4               # 回测进程数，<= 1 时在当前进程执行
+    BACKTEST_MAX_JOBS: int = 20             # 保留的回测任务记录数
+    PLOT_FORECAST_PERIODS: int = 3          # 地块级预测期数（月）
+    PLOT_FORECAST_MIN_POINTS: int = 3       # 参与地块级预测的最少观测期数
+    PLOT_FORECAST_WORKERS: int = 4          # 地块级预测进程数，<= 1 时在当前进程执行
+    PLOT_FORECAST_CHUNK_SIZE: int = 2000    # 每个进程任务包含的序列数
+    PLOT_FORECAST_INTERVAL: float = 3600.0  # 物化线程定时重算地块级预测的间隔（秒），<= 0 时只在数据变化时重算
+
+    # 准入控制配置（按路由类别限制并发，超出时排队或返回 503）
+    ADMISSION_CONTROL: bool = True
+    ADMISSION_ANALYTICS_CONCURRENCY: int = 2    # 对比/情景扫描/回测的并发上限
+    ADMISSION_ANALYTICS_QUEUE: int = 8          # 等待队列长度
+    ADMISSION_ANALYTICS_TIMEOUT: float = 5.0    # 最长排队时间（秒）
+    ADMISSION_FORECAST_CONCURRENCY: int = 8     # 单作物预测的并发上限
+    ADMISSION_FORECAST_QUEUE: int = 32
+    ADMISSION_FORECAST_TIMEOUT: float = 2.0
+
     # 模拟数据配置
     MOCK_DATA_ENABLED: bool = True
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
@@ -31,6 +31,43 @@ class SensorData(Base):
 
     sensor = relationship("Sensor", back_populates="data_records")
 
+    # 单个传感器按时间范围查询的复合索引
+    __table_args__ = (
+        Index("ix_sensor_data_sensor_time", "sensor_id", "recorded_at"),
+    )
+
+
+class SensorRollup(Base):
+    """传感器数据分级汇总（1m/1h/1d），写入时增量维护"""
+    __tablename__ = "sensor_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_id = Column(Integer, ForeignKey("sensors.id"), nullable=False)
+    bucket = Column(String(4), nullable=False)  # 1m, 1h, 1d
+    bucket_start = Column(DateTime, nullable=False)
+    min_value = Column(Float)
+    max_value = Column(Float)
+    sum_value = Column(Float)
+    count = Column(Integer)
+    last_value = Column(Float)
+    last_at = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint("sensor_id", "bucket", "bucket_start", name="uq_sensor_rollup_bucket"),
+    )
+
+
+class SensorDataDeadLetter(Base):
+    """多次重试仍未能写入的传感器数据（原始行以 JSON 保存，待排查后重新导入）"""
+    __tablename__ = "sensor_data_dead_letters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    rows = Column(Text, nullable=False)      # JSON 数组: [{sensor_id, value, recorded_at}]
+    row_count = Column(Integer)
+    attempts = Column(Integer)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 
 class Plot(Base):
     __tablename__ = "plots"
@@ -44,6 +81,7 @@ class Plot(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     crops = relationship("CropRecord", back_populates="plot")
+    yield_records = relationship("YieldRecord", back_populates="plot")
 
 
 class CropRecord(Base):
@@ -62,6 +100,68 @@ class CropRecord(Base):
 
     plot = relationship("Plot", back_populates="crops")
     tasks = relationship("FarmTask", back_populates="crop_record")
+    yield_records = relationship("YieldRecord", back_populates="crop_record")
+
+
+class YieldRecord(Base):
+    """产量观测记录（按期），产量预测的历史数据来源"""
+    __tablename__ = "yield_records"
+
+    id = Column(Integer, primary_key=True, index=True)
+    crop_record_id = Column(Integer, ForeignKey("crop_records.id"), nullable=True)
+    plot_id = Column(Integer, ForeignKey("plots.id"), nullable=True)
+    crop = Column(String(100), nullable=False)
+    period_start = Column(DateTime, nullable=False)  # 观测期起始（月度数据为当月 1 日）
+    yield_value = Column(Float, nullable=False)      # 产量 (kg)
+    area = Column(Float)  # 面积(亩)
+    temperature = Column(Float)
+    rainfall = Column(Float)
+    fertilizer = Column(Float)
+    soil_ph = Column(Float)
+    sunshine = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    crop_record = relationship("CropRecord", back_populates="yield_records")
+    plot = relationship("Plot", back_populates="yield_records")
+
+    # 按期流式加载
+    __table_args__ = (
+        Index("ix_yield_records_period", "period_start", "id"),
+    )
+
+
+class ForecastSnapshot(Base):
+    """预计算（物化）的作物产量预测结果，按 (作物, 预测期数) 保存最新一份"""
+    __tablename__ = "forecast_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    crop = Column(String(100), nullable=False)
+    periods = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)            # 预测结果 JSON
+    computed_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("crop", "periods", name="uq_forecast_snapshot"),
+    )
+
+
+class PlotForecast(Base):
+    """地块级产量预测结果，每个地块每期保留最近一次计算的结果"""
+    __tablename__ = "plot_forecasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    plot_id = Column(Integer, ForeignKey("plots.id"), nullable=False)
+    crop_record_id = Column(Integer, ForeignKey("crop_records.id"), nullable=False)
+    crop = Column(String(100))
+    period_start = Column(DateTime, nullable=False)  # 预测期起始（当月 1 日）
+    predicted_yield = Column(Float)
+    confidence_lower = Column(Float)
+    confidence_upper = Column(Float)
+    computed_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("plot_id", "period_start", name="uq_plot_forecast_period"),
+    )
 
 
 class FarmTask(Base):
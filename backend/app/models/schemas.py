@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 
 # ============ 传感器相关 ============
 class SensorBase(BaseModel):
@@ -32,6 +32,32 @@ class SensorDataResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class SensorDataPage(BaseModel):
+    data: List[SensorDataResponse]
+    next_cursor: Optional[str] = None       # 为空表示没有更多数据
+
+class SensorReadingIn(BaseModel):
+    sensor_id: str                          # 传感器编号，如 S001
+    value: float
+    recorded_at: Optional[datetime] = None  # 为空时使用服务器时间
+
+    @field_validator('recorded_at')
+    @classmethod
+    def normalize_recorded_at(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # 带时区的时间换算为 UTC 并去掉时区（数据库统一保存不带时区的 UTC 时间）
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+class SensorDataBatch(BaseModel):
+    readings: List[SensorReadingIn]
+
+class SensorDataBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    unknown_sensors: List[str]
+    queued: bool = False                    # 是否经写后队列异步提交
+
 class RealtimeDataResponse(BaseModel):
     type: str
     label: str
@@ -41,6 +67,23 @@ class RealtimeDataResponse(BaseModel):
     max: float
     is_warning: bool
 
+class AlertRuleBase(BaseModel):
+    name: str
+    sensor_type: str
+    condition: str                          # gt, lt, gte, lte
+    threshold: float
+    enabled: bool = True
+
+class AlertRuleCreate(AlertRuleBase):
+    pass
+
+class AlertRuleResponse(AlertRuleBase):
+    id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 # ============ 地块相关 ============
 class PlotBase(BaseModel):
     name: str
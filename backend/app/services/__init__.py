@@ -1,4 +1,10 @@
 # Services package
-from .forecast import forecast_service, ForecastService, generate_mock_historical_data
-
+# 预测服务按需导入，导入 app.services 下的其他模块时不加载 numpy 与预测模型
 __all__ = ['forecast_service', 'ForecastService', 'generate_mock_historical_data']
+
+
+def __getattr__(name):
+    if name in __all__:
+        from . import forecast
+        return getattr(forecast, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
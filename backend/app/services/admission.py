@@ -0,0 +1,216 @@
+"""
+准入控制模块
+按路由类别限制 CPU 密集接口的并发数：超出并发上限的请求在有界队列中等待，
+队列已满、预计等待超过期限或等待超时即返回 503 (Retry-After)，
+传感器写入、实时数据等轻量接口不受影响
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from starlette.responses import JSONResponse
+
+from ..config import settings
+
+# 路由类别: (类别, 方法, 路径前缀)，未匹配的请求不做准入控制
+ROUTE_CLASSES: List[Tuple[str, Set[str], str]] = [
+    ('analytics', {'GET'}, '/api/forecast/compare'),
+    ('analytics', {'POST'}, '/api/forecast/scenarios'),
+    ('analytics', {'POST'}, '/api/forecast/backtest'),
+    ('analytics', {'GET'}, '/api/forecast/reconcile'),
+    ('forecast', {'GET', 'POST'}, '/api/forecast/predict'),
+]
+
+
+class AdmissionRejected(Exception):
+    """请求未获准入"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    单个路由类别的并发限制器（在事件循环中使用，无需加锁）
+
+    空闲名额按到达顺序直接交给队首的等待者；根据最近请求耗时的指数滑动平均
+    估算排队等待时间，预计等待超过 queue_timeout 的请求立即拒绝，不占用队列
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._active = 0
+        self._waiters: deque = deque()
+        self._avg_service = 0.0     # 请求耗时的指数滑动平均（秒）
+
+        # 统计计数
+        self.admitted = 0
+        self.queued = 0
+        self.shed_queue_full = 0
+        self.shed_deadline = 0
+        self.shed_timeout = 0
+        self.max_queue_depth = 0
+
+    def expected_wait(self, position: int) -> float:
+        """排在第 position 位（从 1 开始）的请求的预计等待时间（秒）"""
+        return math.ceil(position / self.max_concurrent) * self._avg_service
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.expected_wait(len(self._waiters) + 1) or self.queue_timeout))
+
+    async def acquire(self) -> None:
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.shed_queue_full += 1
+            raise AdmissionRejected("等待队列已满", self._retry_after())
+        if self.expected_wait(len(self._waiters) + 1) > self.queue_timeout:
+            self.shed_deadline += 1
+            raise AdmissionRejected("预计等待时间超过期限", self._retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not (future.done() and not future.cancelled()):
+                self._discard(future)
+                self.shed_timeout += 1
+                raise AdmissionRejected("排队等待超时", self._retry_after())
+        except asyncio.CancelledError:
+            # 客户端断开：已分到的名额交还，未分到的退出队列
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            else:
+                self._discard(future)
+            raise
+        # 名额由 release 直接移交，_active 不变
+        self.admitted += 1
+
+    def _discard(self, future: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+
+    def _release_slot(self) -> None:
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def release(self, elapsed: float) -> None:
+        """请求结束，记录耗时并将名额交给下一个等待者"""
+        self._avg_service = elapsed if not self._avg_service else \
+            0.8 * self._avg_service + 0.2 * elapsed
+        self._release_slot()
+
+    def stats(self) -> Dict:
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'queue_timeout': self.queue_timeout,
+            'active': self._active,
+            'queue_depth': len(self._waiters),
+            'max_queue_depth': self.max_queue_depth,
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'shed_queue_full': self.shed_queue_full,
+            'shed_deadline': self.shed_deadline,
+            'shed_timeout': self.shed_timeout,
+            'avg_service_ms': round(self._avg_service * 1000, 2)
+        }
+
+
+class AdmissionController:
+    """按路由类别分派到各自的并发限制器"""
+
+    def __init__(self, limiters: Iterable[ConcurrencyLimiter],
+                 routes: List[Tuple[str, Set[str], str]] = ROUTE_CLASSES,
+                 enabled: bool = True):
+        self.limiters = {limiter.name: limiter for limiter in limiters}
+        self.routes = [r for r in routes if r[0] in self.limiters]
+        self.enabled = enabled
+
+    def limiter_for(self, method: str, path: str) -> Optional[ConcurrencyLimiter]:
+        if not self.enabled:
+            return None
+        for name, methods, prefix in self.routes:
+            if method in methods and path.startswith(prefix):
+                return self.limiters[name]
+        return None
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'classes': {name: limiter.stats() for name, limiter in self.limiters.items()}
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI 中间件：受控路由的请求先取得所属类别的并发名额"""
+
+    def __init__(self, app, controller: 'AdmissionController'):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope['type'] == 'http':
+            limiter = self.controller.limiter_for(scope['method'], scope['path'])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                status_code=503,
+                content={'detail': f"服务繁忙（{e.reason}），请稍后重试"},
+                headers={'Retry-After': str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - started)
+
+
+# 创建全局实例
+admission_controller = AdmissionController(
+    [
+        ConcurrencyLimiter(
+            'analytics',
+            max_concurrent=settings.ADMISSION_ANALYTICS_CONCURRENCY,
+            max_queue=settings.ADMISSION_ANALYTICS_QUEUE,
+            queue_timeout=settings.ADMISSION_ANALYTICS_TIMEOUT
+        ),
+        ConcurrencyLimiter(
+            'forecast',
+            max_concurrent=settings.ADMISSION_FORECAST_CONCURRENCY,
+            max_queue=settings.ADMISSION_FORECAST_QUEUE,
+            queue_timeout=settings.ADMISSION_FORECAST_TIMEOUT
+        )
+    ],
+    enabled=settings.ADMISSION_CONTROL
+)
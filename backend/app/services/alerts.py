@@ -0,0 +1,216 @@
+"""
+告警规则引擎模块
+将启用的 AlertRule 按传感器类型编译为判定表，在数据接收路径上逐条增量评估
+"""
+
+import logging
+import operator
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.models import AlertRule
+from .ingest import sensor_cache, add_ingest_listener
+
+logger = logging.getLogger(__name__)
+
+# 告警条件
+CONDITIONS: Dict[str, Callable[[float, float], bool]] = {
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le
+}
+
+
+class CompiledRule(NamedTuple):
+    """编译后的告警规则"""
+    id: int
+    name: str
+    condition: str
+    threshold: float
+    trigger: Callable[[float, float], bool]
+    clear_below: bool           # True: 数值回落到 clear_at 以下才解除；False: 回升到以上
+    clear_at: float
+
+
+class AlertState:
+    """单个 (规则, 传感器) 的告警状态"""
+    __slots__ = ('active', 'last_fired')
+
+    def __init__(self):
+        self.active = False
+        self.last_fired = 0.0
+
+
+def compile_rule(rule: AlertRule, hysteresis: float) -> Optional[CompiledRule]:
+    """编译单条规则，条件不合法时返回 None"""
+    trigger = CONDITIONS.get(rule.condition)
+    if trigger is None or rule.threshold is None:
+        return None
+
+    # 迟滞区间：触发后需回到阈值另一侧 margin 之外才解除，避免在阈值附近反复抖动
+    margin = abs(rule.threshold) * hysteresis
+    clear_below = rule.condition in ('gt', 'gte')
+    clear_at = rule.threshold - margin if clear_below else rule.threshold + margin
+
+    return CompiledRule(rule.id, rule.name, rule.condition, rule.threshold,
+                        trigger, clear_below, clear_at)
+
+
+class AlertEngine:
+    """
+    告警引擎
+    每条数据只评估其传感器类型下的规则，复杂度 O(该类型规则数)；
+    状态切换时才产生事件（去重），同一 (规则, 传感器) 在冷却时间内不重复触发
+    """
+
+    def __init__(self, hysteresis: float = 0.02, cooldown: float = 300,
+                 history_size: int = 200):
+        """
+        hysteresis: 解除告警的迟滞比例（相对阈值）
+        cooldown: 同一告警再次触发的最短间隔（秒）
+        history_size: 保留的最近告警事件数
+        """
+        self.hysteresis = hysteresis
+        self.cooldown = cooldown
+        self._rules_by_type: Dict[str, List[CompiledRule]] = {}
+        self._state: Dict[Tuple[int, int], AlertState] = {}
+        self._events = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._loaded = False
+
+        # 统计计数
+        self.evaluated = 0
+        self.fired = 0
+        self.resolved = 0
+        self.suppressed = 0
+
+    def load(self, db: Session) -> None:
+        """从数据库加载启用的规则（规则增删改后调用即可热更新）"""
+        rules = db.query(AlertRule).filter(AlertRule.enabled == True).all()  # noqa: E712
+
+        by_type: Dict[str, List[CompiledRule]] = {}
+        for rule in rules:
+            compiled = compile_rule(rule, self.hysteresis)
+            if compiled is None:
+                logger.warning("告警规则 %s 条件无效，已忽略", rule.id)
+                continue
+            by_type.setdefault(rule.sensor_type, []).append(compiled)
+
+        rule_ids = {r.id for rules in by_type.values() for r in rules}
+        with self._lock:
+            self._rules_by_type = by_type
+            # 已删除或停用规则的状态一并清理
+            self._state = {k: v for k, v in self._state.items() if k[0] in rule_ids}
+            self._loaded = True
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        db = SessionLocal()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    def evaluate(self, rows: List[Dict]) -> List[Dict]:
+        """评估一批数据行（作为数据接收回调注册），返回新产生的告警事件"""
+        self._ensure_loaded()
+        now = time.time()
+        events = []
+
+        with self._lock:
+            rules_by_type = self._rules_by_type
+            if not rules_by_type:
+                return events
+
+            for row in rows:
+                ref = sensor_cache.get_by_pk(row['sensor_id'])
+                if ref is None:
+                    continue
+                rules = rules_by_type.get(ref.type)
+                if not rules:
+                    continue
+
+                value = row['value']
+                self.evaluated += 1
+                for rule in rules:
+                    key = (rule.id, ref.id)
+                    state = self._state.get(key)
+                    if state is None:
+                        state = self._state[key] = AlertState()
+
+                    if not state.active:
+                        if not rule.trigger(value, rule.threshold):
+                            continue
+                        if now - state.last_fired < self.cooldown:
+                            # 冷却期内不触发，状态保持未告警：订阅方不会收到没有 firing 的 resolved；
+                            # 冷却结束后数值仍满足条件即正常触发
+                            self.suppressed += 1
+                            continue
+                        state.active = True
+                        state.last_fired = now
+                        self.fired += 1
+                        events.append(self._event(rule, ref, row, 'firing'))
+                    else:
+                        cleared = value < rule.clear_at if rule.clear_below else value > rule.clear_at
+                        if cleared:
+                            state.active = False
+                            self.resolved += 1
+                            events.append(self._event(rule, ref, row, 'resolved'))
+
+            self._events.extend(events)
+
+        for event in events:
+            if event['status'] == 'firing':
+                logger.warning("传感器告警: %s %s=%s", event['rule_name'],
+                               event['sensor_id'], event['value'])
+        return events
+
+    @staticmethod
+    def _event(rule: CompiledRule, ref, row: Dict, status: str) -> Dict:
+        return {
+            'rule_id': rule.id,
+            'rule_name': rule.name,
+            'condition': rule.condition,
+            'threshold': rule.threshold,
+            'sensor_id': ref.sensor_id,
+            'type': ref.type,
+            'location': ref.location,
+            'value': row['value'],
+            'recorded_at': row['recorded_at'].isoformat(),
+            'status': status
+        }
+
+    def active_alerts(self) -> List[Tuple[int, int]]:
+        """当前处于告警状态的 (规则ID, 传感器主键)"""
+        with self._lock:
+            return [key for key, state in self._state.items() if state.active]
+
+    def recent_events(self) -> List[Dict]:
+        with self._lock:
+            return list(reversed(self._events))
+
+    def stats(self) -> Dict:
+        return {
+            'rules': sum(len(r) for r in self._rules_by_type.values()),
+            'active': len(self.active_alerts()),
+            'evaluated': self.evaluated,
+            'fired': self.fired,
+            'resolved': self.resolved,
+            'suppressed': self.suppressed
+        }
+
+
+# 创建全局实例
+alert_engine = AlertEngine(
+    hysteresis=settings.ALERT_HYSTERESIS,
+    cooldown=settings.ALERT_COOLDOWN
+)
+add_ingest_listener(alert_engine.evaluate)
@@ -3,11 +3,21 @@
 使用多种机器学习算法进行作物产量预测
 """
 
+import copy
 import numpy as np
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Tuple, Optional
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 import json
+import logging
+import os
+
+from ..config import settings
+from .history import HistoricalStore
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -20,6 +30,71 @@ class ForecastResult:
     contributing_factors: Dict[str, float]  # 影响因素权重
 
 
+# 环境因素名称（顺序即因素矩阵的列顺序）
+FACTOR_NAMES = ['temperature', 'rainfall', 'fertilizer', 'soil_ph', 'sunshine']
+
+# 未提供某项因素时使用的默认值
+FACTOR_DEFAULTS = {
+    'temperature': 25,
+    'rainfall': 150,
+    'fertilizer': 50,
+    'soil_ph': 6.5,
+    'sunshine': 8
+}
+
+
+def factors_to_matrix(scenarios: List[Dict[str, float]]) -> np.ndarray:
+    """将因素字典列表转换为 (N × 5) 因素矩阵，缺失项使用默认值"""
+    return np.array([
+        [s.get(name, FACTOR_DEFAULTS[name]) for name in FACTOR_NAMES]
+        for s in scenarios
+    ], dtype=np.float64).reshape(-1, len(FACTOR_NAMES))
+
+
+def factor_columns(factors, fill_defaults: bool = False) -> np.ndarray:
+    """
+    将因素字典列表或 (N × 5) 因素矩阵（缺失为 NaN）统一为矩阵
+    缺失项填默认值 (fill_defaults) 或 0
+    """
+    if isinstance(factors, np.ndarray):
+        X = np.asarray(factors, dtype=np.float64).reshape(-1, len(FACTOR_NAMES))
+    else:
+        X = np.array([
+            [f.get(name, np.nan) for name in FACTOR_NAMES] for f in factors
+        ], dtype=np.float64).reshape(-1, len(FACTOR_NAMES))
+    if fill_defaults:
+        fill = np.array([FACTOR_DEFAULTS[name] for name in FACTOR_NAMES], dtype=np.float64)
+    else:
+        fill = np.zeros(len(FACTOR_NAMES))
+    return np.where(np.isnan(X), fill, X)
+
+
+def to_series_matrix(series: List[List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将长度不一的多条序列右对齐为 (序列数 × 时间) 矩阵，前部以 NaN 填充
+    返回: (矩阵, 各序列长度)
+    """
+    lengths = np.array([len(s) for s in series], dtype=np.int64)
+    width = int(lengths.max()) if len(series) else 0
+    matrix = np.full((len(series), width), np.nan)
+    for i, s in enumerate(series):
+        if len(s):
+            matrix[i, width - len(s):] = s
+    return matrix, lengths
+
+
+def bootstrap_paths(n_paths: int, steps: int) -> int:
+    """按单次模拟的抽样上限 (路径数 × 期数) 截断 bootstrap 路径数"""
+    cap = max(1, settings.FORECAST_BOOTSTRAP_MAX_DRAWS // max(steps, 1))
+    return max(1, min(n_paths, cap))
+
+
+def _row_means(matrix: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """各序列均值，空序列为 0"""
+    sums = np.nansum(matrix, axis=1)
+    return np.where(lengths > 0, sums / np.maximum(lengths, 1), 0.0)
+
+
 class MovingAveragePredictor:
     """
     移动平均预测器
@@ -34,6 +109,10 @@ class MovingAveragePredictor:
         """拟合历史数据"""
         self.history_data = data
 
+    def update(self, new_data: List[float]) -> None:
+        """追加新观测（重新绑定列表，不修改拟合时传入的序列）"""
+        self.history_data = list(self.history_data) + list(new_data)
+
     def predict(self, steps: int = 1) -> List[float]:
         """预测未来 steps 期"""
         if len(self.history_data) < self.window:
@@ -52,6 +131,31 @@ class MovingAveragePredictor:
 
         return predictions
 
+    def fit_batch(self, matrix: np.ndarray, lengths: np.ndarray) -> None:
+        """批量拟合：matrix 为右对齐的 (序列数 × 时间) 矩阵"""
+        self.batch_matrix = matrix
+        self.batch_lengths = lengths
+
+    def predict_batch(self, steps: int = 1) -> np.ndarray:
+        """批量预测，返回 (序列数 × steps) 数组"""
+        matrix, lengths = self.batch_matrix, self.batch_lengths
+        predictions = np.zeros((len(lengths), steps))
+
+        short = lengths < self.window
+        if short.any():
+            # 数据不足时使用简单平均
+            predictions[short] = _row_means(matrix[short], lengths[short])[:, None]
+
+        full = ~short
+        if full.any():
+            recent = matrix[full, -self.window:]
+            for h in range(steps):
+                ma = recent.mean(axis=1)
+                predictions[full, h] = ma
+                recent = np.column_stack([recent[:, 1:], ma])
+
+        return predictions
+
 
 class ExponentialSmoothingPredictor:
     """
@@ -68,9 +172,11 @@ class ExponentialSmoothingPredictor:
         self.beta = beta
         self.level = None
         self.trend = None
+        self.n_obs = 0
 
     def fit(self, data: List[float]) -> None:
         """拟合历史数据，计算初始水平和趋势"""
+        self.n_obs = len(data)
         if len(data) < 2:
             self.level = data[0] if data else 0
             self.trend = 0
@@ -88,6 +194,27 @@ class ExponentialSmoothingPredictor:
             # 更新趋势
             self.trend = self.beta * (self.level - prev_level) + (1 - self.beta) * self.trend
 
+    def update(self, new_data: List[float]) -> None:
+        """
+        增量更新：每个新观测只做一步 Holt 递推，O(1)
+        结果与在完整序列上重新 fit 一致
+        """
+        new_data = list(new_data)
+        if not new_data:
+            return
+        if self.n_obs == 0:
+            self.fit(new_data)
+            return
+        if self.n_obs == 1:
+            # 第二个观测到达时才确定初始趋势
+            self.trend = new_data[0] - self.level
+
+        for x in new_data:
+            prev_level = self.level
+            self.level = self.alpha * x + (1 - self.alpha) * (prev_level + self.trend)
+            self.trend = self.beta * (self.level - prev_level) + (1 - self.beta) * self.trend
+        self.n_obs += len(new_data)
+
     def predict(self, steps: int = 1) -> List[float]:
         """预测未来 steps 期"""
         if self.level is None:
@@ -100,6 +227,42 @@ class ExponentialSmoothingPredictor:
 
         return predictions
 
+    def fit_batch(self, matrix: np.ndarray, lengths: np.ndarray) -> None:
+        """
+        批量拟合：按时间列推进 Holt 递推，每一步同时更新所有序列
+        各序列从自身第一个有效值开始，递推规则与 fit 相同
+        """
+        n, width = matrix.shape
+        rows = np.arange(n)
+        starts = width - lengths
+        level = np.zeros(n)
+        trend = np.zeros(n)
+
+        has_one = lengths >= 1
+        level[has_one] = matrix[rows[has_one], starts[has_one]]
+        has_two = lengths >= 2
+        trend[has_two] = (matrix[rows[has_two], starts[has_two] + 1] -
+                          matrix[rows[has_two], starts[has_two]])
+
+        for t in range(width):
+            active = has_two & (t >= starts + 1)
+            if not active.any():
+                continue
+            x = matrix[:, t]
+            new_level = self.alpha * x + (1 - self.alpha) * (level + trend)
+            new_trend = self.beta * (new_level - level) + (1 - self.beta) * trend
+            level = np.where(active, new_level, level)
+            trend = np.where(active, new_trend, trend)
+
+        self.batch_level = level
+        self.batch_trend = trend
+
+    def predict_batch(self, steps: int = 1) -> np.ndarray:
+        """批量预测，返回 (序列数 × steps) 数组"""
+        h = np.arange(1, steps + 1)
+        forecast = self.batch_level[:, None] + h[None, :] * self.batch_trend[:, None]
+        return np.maximum(0, forecast)
+
 
 class SeasonalPredictor:
     """
@@ -116,49 +279,108 @@ class SeasonalPredictor:
         self.deseasonalized_trend = []
         self.avg_trend = 0
 
+        # 增量更新所需的累计量：观测数、总和、各季节有效比率之和与个数、末尾窗口
+        self._n = 0
+        self._total = 0.0
+        self._ratio_sums = np.zeros(season_length)
+        self._ratio_counts = np.zeros(season_length)
+        self._tail = np.empty(0)
+
     def fit(self, data: List[float]) -> None:
-        """拟合历史数据，计算季节性指数"""
-        if len(data) < self.season_length:
+        """
+        拟合历史数据，计算季节性指数
+        中心化移动平均由累积和一次求出，季节性比率按周期重排为二维数组后
+        用掩码均值按列归约，长周期（如周度 52、日度 365）同样适用
+        """
+        values = np.asarray(data, dtype=np.float64)
+        n = len(values)
+        season_length = self.season_length
+        half_period = season_length // 2
+
+        sums = np.zeros(season_length)
+        counts = np.zeros(season_length)
+        if n > 2 * half_period:
+            # 计算移动平均（中心化）
+            csum = np.concatenate(([0.0], np.cumsum(values)))
+            centers = np.arange(half_period, n - half_period)
+            ma = (csum[centers + half_period + 1] - csum[centers - half_period]) / (2 * half_period + 1)
+
+            # 计算季节性比率，按周期重排为 (周期数 × 季节长度)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratios = np.where(ma != 0, values[centers] / ma, 1.0)
+            padded = np.full(-(-n // season_length) * season_length, np.nan)
+            padded[centers] = ratios
+            grid = padded.reshape(-1, season_length)
+
+            # 去除异常值
+            keep = (grid > 0.5) & (grid < 2.0)
+            counts = keep.sum(axis=0).astype(np.float64)
+            sums = np.where(keep, grid, 0.0).sum(axis=0)
+
+        self._n = n
+        self._total = float(values.sum())
+        self._ratio_sums = sums
+        self._ratio_counts = counts
+        self._tail = values[n - 2 * half_period:] if n > 2 * half_period else values
+        self._derive()
+
+    def update(self, new_data: List[float]) -> None:
+        """
+        增量更新：只计算因新观测而可求的中心化移动平均比率，累加到各季节，
+        再由累计量重新得到季节性指数与趋势（与在完整序列上重新 fit 一致）
+        累计量按新对象重新绑定，不原地修改
+        """
+        new = np.asarray(new_data, dtype=np.float64)
+        if not len(new):
+            return
+        season_length = self.season_length
+        half_period = season_length // 2
+        width = 2 * half_period + 1
+
+        n_old = self._n
+        n_new = n_old + len(new)
+        ext = np.concatenate([self._tail, new])
+        offset = n_old - len(self._tail)          # ext[0] 在完整序列中的位置
+
+        # 窗口右端落在新观测上的中心点
+        centers = np.arange(max(half_period, n_old - half_period), n_new - half_period)
+        sums, counts = self._ratio_sums, self._ratio_counts
+        if len(centers):
+            local = centers - offset
+            csum = np.concatenate(([0.0], np.cumsum(ext)))
+            ma = (csum[local + half_period + 1] - csum[local - half_period]) / width
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratios = np.where(ma != 0, ext[local] / ma, 1.0)
+            keep = (ratios > 0.5) & (ratios < 2.0)
+            seasons = centers % season_length
+            sums = sums + np.bincount(seasons[keep], ratios[keep], minlength=season_length)
+            counts = counts + np.bincount(seasons[keep], minlength=season_length)
+
+        self._n = n_new
+        self._total = self._total + float(new.sum())
+        self._ratio_sums = sums
+        self._ratio_counts = counts
+        self._tail = ext[max(0, len(ext) - (width - 1)):] if width > 1 else ext[:0]
+        self._derive()
+
+    def _derive(self) -> None:
+        """由累计量计算季节性指数与去季节化趋势"""
+        if self._n < self.season_length:
             # 数据不足一个周期，退化为简单平均
-            self.avg_trend = np.mean(data) if data else 0
+            self.avg_trend = self._total / self._n if self._n else 0
             self.seasonal_indices = [1.0] * self.season_length
             return
 
-        # 计算移动平均（中心化）
-        ma_values = []
-        half_period = self.season_length // 2
-
-        for i in range(half_period, len(data) - half_period):
-            window = data[i - half_period:i + half_period + 1]
-            ma_values.append(np.mean(window))
-
-        # 计算季节性比率
-        seasonal_ratios = [[] for _ in range(self.season_length)]
-
-        for i, ma in enumerate(ma_values):
-            actual_idx = i + half_period
-            if actual_idx < len(data):
-                season_idx = actual_idx % self.season_length
-                ratio = data[actual_idx] / ma if ma != 0 else 1
-                seasonal_ratios[season_idx].append(ratio)
-
-        # 计算平均季节性指数
-        self.seasonal_indices = []
-        for ratios in seasonal_ratios:
-            if ratios:
-                # 去除异常值后取平均
-                filtered = [r for r in ratios if 0.5 < r < 2.0]
-                avg_ratio = np.mean(filtered) if filtered else 1.0
-                self.seasonal_indices.append(avg_ratio)
-            else:
-                self.seasonal_indices.append(1.0)
+        counts = self._ratio_counts
+        indices = np.where(counts > 0, self._ratio_sums / np.maximum(counts, 1), 1.0)
 
         # 标准化季节性指数
-        avg_index = np.mean(self.seasonal_indices)
-        self.seasonal_indices = [idx / avg_index for idx in self.seasonal_indices]
+        avg_index = indices.mean()
+        self.seasonal_indices = (indices / avg_index).tolist()
 
         # 计算去季节化后的趋势
-        self.avg_trend = np.mean(data) / avg_index if avg_index != 0 else np.mean(data)
+        mean_value = self._total / self._n
+        self.avg_trend = mean_value / avg_index if avg_index != 0 else mean_value
 
     def predict(self, steps: int = 1, start_season: int = 0) -> List[float]:
         """
@@ -175,14 +397,83 @@ class SeasonalPredictor:
 
         return predictions
 
+    def fit_batch(self, matrix: np.ndarray, lengths: np.ndarray) -> None:
+        """
+        批量拟合：累积和计算所有序列的中心化移动平均，
+        季节性比率按 (序列, 季节) 用 bincount 一次性求均值
+        """
+        n, width = matrix.shape
+        season_length = self.season_length
+        half_period = season_length // 2
+        starts = width - lengths
+
+        values = np.nan_to_num(matrix)
+        means = _row_means(matrix, lengths)
+        indices = np.ones((n, season_length))
+        avg_trend = means.copy()
+
+        # 数据不足一个周期的序列退化为简单平均
+        full = lengths >= season_length
+        if full.any():
+            if width > 2 * half_period:
+                csum = np.concatenate([np.zeros((n, 1)), np.cumsum(values, axis=1)], axis=1)
+                centers = np.arange(half_period, width - half_period)
+                window_sum = csum[:, centers + half_period + 1] - csum[:, centers - half_period]
+                ma = window_sum / (2 * half_period + 1)
+
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    ratios = np.where(ma != 0, values[:, centers] / ma, 1.0)
+                valid = full[:, None] & (centers[None, :] >= starts[:, None] + half_period)
+                # 去除异常值
+                keep = valid & (ratios > 0.5) & (ratios < 2.0)
+
+                seasons = (centers[None, :] - starts[:, None]) % season_length
+                flat = (np.arange(n)[:, None] * season_length + seasons)[keep]
+                sums = np.bincount(flat, weights=ratios[keep], minlength=n * season_length)
+                counts = np.bincount(flat, minlength=n * season_length)
+                averaged = np.where(counts > 0, sums / np.maximum(counts, 1), 1.0)
+                indices[full] = averaged.reshape(n, season_length)[full]
+
+            # 标准化季节性指数
+            avg_index = indices[full].mean(axis=1)
+            indices[full] = indices[full] / avg_index[:, None]
+            avg_trend[full] = np.where(avg_index != 0, means[full] / avg_index, means[full])
+
+        self.batch_indices = indices
+        self.batch_avg_trend = avg_trend
+
+    def predict_batch(self, steps: int = 1, start_season=0) -> np.ndarray:
+        """
+        批量预测，返回 (序列数 × steps) 数组
+        start_season: 统一的起始季节，或每条序列各自的起始季节数组
+        """
+        start = np.broadcast_to(np.asarray(start_season), (len(self.batch_avg_trend),))
+        seasons = (start[:, None] + np.arange(steps)[None, :]) % self.season_length
+        factors = np.take_along_axis(self.batch_indices, seasons, axis=1)
+        return np.maximum(0, self.batch_avg_trend[:, None] * factors)
+
 
 class MultiFactorPredictor:
     """
     多因素预测器
     综合考虑温度、降雨、施肥量、土壤pH等因素
+
+    solver:
+        heuristic - 按各因素最优区间打分（默认）
+        lstsq     - 以因素矩阵整体做最小二乘回归（可选岭回归），预测为线性模型
     """
 
-    def __init__(self):
+    def __init__(self, solver: str = 'heuristic', ridge: float = 0.0):
+        """
+        solver: 求解方式，heuristic 或 lstsq
+        ridge: lstsq 模式下的岭回归系数（作用于标准化后的因素）
+        """
+        if solver not in ('heuristic', 'lstsq'):
+            raise ValueError(f"不支持的求解方式: {solver}")
+        self.solver = solver
+        self.ridge = ridge
+        self.intercept = None           # lstsq 拟合成功后才有值
+        self.factor_means = None
         self.feature_weights = {
             'temperature': 0.25,      # 温度影响权重
             'rainfall': 0.20,         # 降雨影响权重
@@ -193,19 +484,27 @@ class MultiFactorPredictor:
         }
         self.baseline_yield = 0
         self.coefficients = {}
+        self._n = 0
+        self._total = 0.0
 
-    def fit(self, historical_yields: List[float],
-            factors: Optional[List[Dict[str, float]]] = None) -> None:
+    def fit(self, historical_yields: List[float], factors=None) -> None:
         """
         拟合历史数据
         historical_yields: 历史产量列表
-        factors: 历史因素数据列表（可选）
+        factors: 历史因素数据（字典列表或 (N × 5) 因素矩阵，可选）
         """
-        self.baseline_yield = np.mean(historical_yields) if historical_yields else 0
-
-        if factors and len(factors) == len(historical_yields):
-            # 简化的线性回归计算系数
-            self._calculate_coefficients(historical_yields, factors)
+        self.baseline_yield = np.mean(historical_yields) if len(historical_yields) else 0
+        self._n = len(historical_yields)
+        self._total = float(np.sum(historical_yields)) if len(historical_yields) else 0.0
+
+        self.intercept = None
+        if factors is not None and len(factors) and len(factors) == len(historical_yields):
+            if self.solver == 'lstsq' and len(historical_yields) >= 2:
+                # 多元最小二乘联合求解
+                self._fit_least_squares(historical_yields, factors)
+            else:
+                # 简化的线性回归计算系数
+                self._calculate_coefficients(historical_yields, factors)
         else:
             # 使用默认系数
             self.coefficients = {
@@ -216,30 +515,59 @@ class MultiFactorPredictor:
                 'sunshine': 10          # 每小时日照影响
             }
 
-    def _calculate_coefficients(self, yields: List[float], factors: List[Dict]) -> None:
-        """计算各因素的回归系数（简化版）"""
-        avg_yield = np.mean(yields)
-
-        for factor_name in ['temperature', 'rainfall', 'fertilizer', 'soil_ph', 'sunshine']:
-            values = [f.get(factor_name, 0) for f in factors]
-            avg_value = np.mean(values)
-
-            # 计算协方差和方差
-            covariance = sum((yields[i] - avg_yield) * (values[i] - avg_value)
-                           for i in range(len(yields)))
-            variance = sum((v - avg_value) ** 2 for v in values)
-
-            if variance != 0:
-                self.coefficients[factor_name] = covariance / variance
+    def update(self, new_yields: List[float]) -> None:
+        """
+        增量更新基准产量（历史均值）
+        因素系数依赖全部历史因素，保持不变，在定期完整重拟合时刷新
+        """
+        if not len(new_yields):
+            return
+        self._n += len(new_yields)
+        self._total += float(np.sum(new_yields))
+        self.baseline_yield = self._total / self._n
+
+    def _calculate_coefficients(self, yields: List[float], factors) -> None:
+        """计算各因素的回归系数（简化版），缺失的因素按 0 计"""
+        y_dev = np.asarray(yields, dtype=np.float64) - np.mean(yields)
+        X = factor_columns(factors)
+        x_dev = X - X.mean(axis=0)
+
+        # 计算协方差和方差
+        covariance = y_dev @ x_dev
+        variance = (x_dev ** 2).sum(axis=0)
+
+        for j, factor_name in enumerate(FACTOR_NAMES):
+            if variance[j] != 0:
+                self.coefficients[factor_name] = float(covariance[j] / variance[j])
             else:
                 self.coefficients[factor_name] = 0
 
-    def predict(self, current_factors: Dict[str, float],
-                trend_adjustment: float = 0) -> Tuple[float, Dict[str, float]]:
+    def _fit_least_squares(self, yields: List[float], factors) -> None:
         """
-        基于当前因素预测产量
-        返回: (预测值, 各因素贡献度)
+        构建因素矩阵，一次性联合求解所有系数
+        因素先标准化，岭回归项通过增广矩阵加入，截距不做惩罚
         """
+        X = factor_columns(factors, fill_defaults=True)
+        y = np.asarray(yields, dtype=np.float64)
+        means = X.mean(axis=0)
+        scales = X.std(axis=0)
+        scales[scales == 0] = 1.0
+
+        Z = (X - means) / scales
+        A = np.column_stack([np.ones(len(y)), Z])
+        if self.ridge > 0:
+            penalty = np.sqrt(self.ridge) * np.eye(A.shape[1])[1:]
+            A = np.vstack([A, penalty])
+            y = np.concatenate([y, np.zeros(len(penalty))])
+
+        beta, *_ = np.linalg.lstsq(A, y, rcond=None)
+        coefficients = beta[1:] / scales
+        self.intercept = float(beta[0] - coefficients @ means)
+        self.factor_means = means
+        self.coefficients = dict(zip(FACTOR_NAMES, coefficients.tolist()))
+
+    def _factor_contributions(self, current_factors: Dict[str, float]) -> Dict[str, float]:
+        """各环境因素的贡献度（不含历史趋势）"""
         contributions = {}
 
         # 温度贡献（最优温度范围 20-30°C）
@@ -267,6 +595,19 @@ class MultiFactorPredictor:
         sunshine_factor = min(1, sunshine / 8) * self.feature_weights['sunshine']
         contributions['sunshine'] = sunshine_factor
 
+        return contributions
+
+    def predict(self, current_factors: Dict[str, float],
+                trend_adjustment: float = 0) -> Tuple[float, Dict[str, float]]:
+        """
+        基于当前因素预测产量
+        返回: (预测值, 各因素贡献度)
+        """
+        if self.intercept is not None:
+            return self._predict_linear(current_factors, trend_adjustment)
+
+        contributions = self._factor_contributions(current_factors)
+
         # 历史趋势
         contributions['historical_trend'] = (1 + trend_adjustment) * self.feature_weights['historical_trend']
 
@@ -276,6 +617,151 @@ class MultiFactorPredictor:
 
         return max(0, predicted), contributions
 
+    def _predict_linear(self, current_factors: Dict[str, float],
+                        trend_adjustment: float) -> Tuple[float, Dict[str, float]]:
+        """lstsq 模式预测，贡献度为各因素相对历史均值带来的产量变化"""
+        x = factors_to_matrix([current_factors])[0]
+        coefficients = np.array([self.coefficients[name] for name in FACTOR_NAMES])
+        base = self.intercept + float(coefficients @ x)
+
+        contributions = dict(zip(FACTOR_NAMES, (coefficients * (x - self.factor_means)).tolist()))
+        contributions['historical_trend'] = base * trend_adjustment * 0.1
+
+        predicted = base * (1 + trend_adjustment * 0.1)
+        return max(0, predicted), contributions
+
+    def predict_scenarios(self, scenarios: np.ndarray,
+                          trend_adjustment: np.ndarray) -> np.ndarray:
+        """
+        向量化评估多组因素情景
+        scenarios: (N × 5) 因素矩阵，列顺序同 FACTOR_NAMES
+        trend_adjustment: (期数,) 各期趋势调整
+        返回: (N × 期数) 预测值
+        """
+        trend = np.asarray(trend_adjustment, dtype=np.float64)[None, :]
+
+        if self.intercept is not None:
+            # 所有情景一次矩阵乘法
+            coefficients = np.array([self.coefficients[name] for name in FACTOR_NAMES])
+            base = self.intercept + scenarios @ coefficients
+            return np.maximum(0, base[:, None] * (1 + trend * 0.1))
+
+        w = self.feature_weights
+        temp, rainfall, fertilizer, ph, sunshine = scenarios.T
+        factor_total = (
+            np.maximum(0, 1 - np.abs(temp - 25) / 15) * w['temperature'] +
+            np.maximum(0, 1 - np.abs(rainfall - 150) / 150) * w['rainfall'] +
+            np.minimum(1, fertilizer / 50) * w['fertilizer'] +
+            np.maximum(0, 1 - np.abs(ph - 6.5) / 2) * w['soil_ph'] +
+            np.minimum(1, sunshine / 8) * w['sunshine']
+        )
+        total_factor = factor_total[:, None] + (1 + trend) * w['historical_trend']
+        return np.maximum(0, self.baseline_yield * total_factor * (1 + trend * 0.1))
+
+    def fit_batch(self, matrix: np.ndarray, lengths: np.ndarray,
+                  factor_tensor: Optional[np.ndarray] = None) -> None:
+        """
+        批量拟合
+        factor_tensor: 与 matrix 对齐的 (序列数 × 时间 × 因素数) 数组，缺失处为 NaN
+        """
+        means = _row_means(matrix, lengths)
+        self.batch_baseline = means
+
+        default = np.array([50, 0.5, 2, -100, 10], dtype=np.float64)
+        coefficients = np.tile(default, (len(lengths), 1))
+        if factor_tensor is not None:
+            has_factors = ~np.isnan(factor_tensor).all(axis=(1, 2))
+            counts = np.maximum(lengths, 1)[:, None]
+            factor_means = np.nansum(factor_tensor, axis=1) / counts
+            y_dev = (matrix - means[:, None])[:, :, None]
+            f_dev = factor_tensor - factor_means[:, None, :]
+            covariance = np.nansum(y_dev * f_dev, axis=1)
+            variance = np.nansum(f_dev ** 2, axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fitted = np.where(variance != 0, covariance / variance, 0.0)
+            coefficients[has_factors] = fitted[has_factors]
+        self.batch_coefficients = coefficients
+        self.batch_intercept = None
+
+        if self.solver == 'lstsq' and factor_tensor is not None:
+            self._fit_least_squares_batch(matrix, factor_tensor)
+
+    def _fit_least_squares_batch(self, matrix: np.ndarray, factor_tensor: np.ndarray) -> None:
+        """
+        批量最小二乘：对每条序列构建正规方程 (AᵀA + λI)β = Aᵀy，
+        以堆叠矩阵一次求解，与逐条 lstsq 的结果一致
+        """
+        valid = ~np.isnan(matrix) & ~np.isnan(factor_tensor).any(axis=2)
+        counts = valid.sum(axis=1)
+        n_valid = np.maximum(counts, 1)[:, None]
+
+        F = np.where(valid[:, :, None], factor_tensor, 0.0)
+        means = F.sum(axis=1) / n_valid
+        dev = np.where(valid[:, :, None], factor_tensor - means[:, None, :], 0.0)
+        scales = np.sqrt((dev ** 2).sum(axis=1) / n_valid)
+        scales[scales == 0] = 1.0
+
+        Z = dev / scales[:, None, :]
+        A = np.concatenate([valid[:, :, None].astype(np.float64), Z], axis=2)
+        y = np.where(valid, matrix, 0.0)
+
+        gram = np.einsum('ntk,ntl->nkl', A, A)
+        gram[:, 1:, 1:] += self.ridge * np.eye(len(FACTOR_NAMES))
+        rhs = np.einsum('ntk,nt->nk', A, y)
+        beta = np.einsum('nkl,nl->nk', np.linalg.pinv(gram), rhs)
+
+        coefficients = beta[:, 1:] / scales
+        intercept = beta[:, 0] - (coefficients * means).sum(axis=1)
+
+        # 不足两条有效记录的序列保留启发式模式
+        solved = counts >= 2
+        self.batch_coefficients[solved] = coefficients[solved]
+        self.batch_intercept = np.where(solved, intercept, np.nan)
+        self.batch_factor_means = means
+
+    def predict_batch(self, current_factors: Dict[str, float],
+                      trend_adjustment: np.ndarray) -> Tuple[np.ndarray, List[List[Dict[str, float]]]]:
+        """
+        批量预测
+        trend_adjustment: (序列数 × 期数) 趋势调整
+        返回: (预测值数组, 各序列各期的因素贡献度)
+        """
+        n, steps = trend_adjustment.shape
+        history_weight = self.feature_weights['historical_trend']
+
+        contributions = self._factor_contributions(current_factors)
+        factor_total = sum(contributions.values())
+        total_factor = factor_total + (1 + trend_adjustment) * history_weight
+        predicted = self.batch_baseline[:, None] * total_factor * (1 + trend_adjustment * 0.1)
+
+        linear = np.zeros(n, dtype=bool)
+        if self.batch_intercept is not None:
+            linear = ~np.isnan(self.batch_intercept)
+            x = factors_to_matrix([current_factors])[0]
+            base = self.batch_intercept + self.batch_coefficients @ x
+            predicted = np.where(linear[:, None],
+                                 base[:, None] * (1 + trend_adjustment * 0.1), predicted)
+
+        all_contributions = []
+        for row in range(n):
+            if linear[row]:
+                effects = dict(zip(FACTOR_NAMES, (
+                    self.batch_coefficients[row] * (x - self.batch_factor_means[row])
+                ).tolist()))
+                row_contributions = [
+                    {**effects, 'historical_trend': float(base[row] * trend_adjustment[row, i] * 0.1)}
+                    for i in range(steps)
+                ]
+            else:
+                row_contributions = [
+                    {**contributions,
+                     'historical_trend': (1 + float(trend_adjustment[row, i])) * history_weight}
+                    for i in range(steps)
+                ]
+            all_contributions.append(row_contributions)
+
+        return np.maximum(0, predicted), all_contributions
+
 
 class EnsembleForecaster:
     """
@@ -283,36 +769,167 @@ class EnsembleForecaster:
     组合多个预测模型，提高预测准确性
     """
 
-    def __init__(self):
-        self.ma_predictor = MovingAveragePredictor(window=3)
-        self.es_predictor = ExponentialSmoothingPredictor(alpha=0.3, beta=0.1)
-        self.seasonal_predictor = SeasonalPredictor(season_length=12)
-        self.multi_factor_predictor = MultiFactorPredictor()
+    def __init__(self, ma_window: int = 3, alpha: float = 0.3, beta: float = 0.1,
+                 season_length: int = 12, weights: Optional[Dict[str, float]] = None,
+                 mf_solver: str = 'heuristic', mf_ridge: float = 0.0):
+        self.ma_predictor = MovingAveragePredictor(window=ma_window)
+        self.es_predictor = ExponentialSmoothingPredictor(alpha=alpha, beta=beta)
+        self.seasonal_predictor = SeasonalPredictor(season_length=season_length)
+        self.multi_factor_predictor = MultiFactorPredictor(solver=mf_solver, ridge=mf_ridge)
+
+        # 训练序列与样本内残差（bootstrap 区间使用）
+        self.history_data: List[float] = []
+        self._residuals: Optional[np.ndarray] = None
+
+        # 上次完整拟合后增量更新的观测数
+        self.updates_since_refit = 0
 
         # 各模型权重
-        self.weights = {
+        self.weights = dict(weights) if weights else {
             'moving_average': 0.15,
             'exponential_smoothing': 0.30,
             'seasonal': 0.35,
             'multi_factor': 0.20
         }
 
-    def fit(self, historical_data: List[float],
-            factors: Optional[List[Dict[str, float]]] = None) -> None:
-        """拟合所有子模型"""
+    def get_config(self) -> Dict:
+        """模型配置（不含拟合状态）"""
+        return {
+            'ma_window': self.ma_predictor.window,
+            'alpha': self.es_predictor.alpha,
+            'beta': self.es_predictor.beta,
+            'season_length': self.seasonal_predictor.season_length,
+            'weights': dict(self.weights),
+            'mf_solver': self.multi_factor_predictor.solver,
+            'mf_ridge': self.multi_factor_predictor.ridge
+        }
+
+    def config_key(self) -> Tuple:
+        """可哈希的模型配置，用作模型缓存键的一部分"""
+        config = self.get_config()
+        config['weights'] = tuple(sorted(config['weights'].items()))
+        return tuple(sorted(config.items()))
+
+    def clone(self) -> 'EnsembleForecaster':
+        """创建相同配置的未拟合实例"""
+        return EnsembleForecaster(**self.get_config())
+
+    def fit(self, historical_data: List[float], factors=None) -> None:
+        """拟合所有子模型，factors 为因素字典列表或 (N × 5) 因素矩阵"""
         self.ma_predictor.fit(historical_data)
         self.es_predictor.fit(historical_data)
         self.seasonal_predictor.fit(historical_data)
         self.multi_factor_predictor.fit(historical_data, factors)
+        self.history_data = list(historical_data)
+        self._residuals = None
+        self.updates_since_refit = 0
+
+    def update(self, new_data: List[float]) -> None:
+        """
+        增量更新所有子模型：Holt 水平/趋势、移动平均窗口、季节性累计量 O(新观测数) 推进，
+        多因素预测器只更新基准产量。累计误差由调用方按 updates_since_refit 定期完整重拟合消除
+
+        各子模型的状态按新对象重新绑定而不原地修改，
+        因此可以先 copy() 再更新，正在使用旧模型的预测不受影响
+        """
+        new_data = list(new_data)
+        if not new_data:
+            return
+        self.ma_predictor.update(new_data)
+        self.es_predictor.update(new_data)
+        self.seasonal_predictor.update(new_data)
+        self.multi_factor_predictor.update(new_data)
+        self.history_data = self.history_data + new_data
+        self._residuals = None
+        self.updates_since_refit += len(new_data)
+
+    def copy(self) -> 'EnsembleForecaster':
+        """浅拷贝已拟合的预测器（子模型各自拷贝），用于写时复制的增量更新"""
+        other = copy.copy(self)
+        other.ma_predictor = copy.copy(self.ma_predictor)
+        other.es_predictor = copy.copy(self.es_predictor)
+        other.seasonal_predictor = copy.copy(self.seasonal_predictor)
+        other.multi_factor_predictor = copy.copy(self.multi_factor_predictor)
+        return other
+
+    def residuals(self, max_origins: Optional[int] = None) -> np.ndarray:
+        """
+        样本内一步预测残差（已去均值），首次使用时计算并随模型缓存
+
+        只取最近 max_origins 个起点（默认 FORECAST_RESIDUAL_ORIGINS）：在第一个起点之前的前缀上
+        拟合一次，之后逐期预测一步再以 update() 推进一个观测，内存 O(序列长度)，
+        耗时 O(序列长度 + 起点数)，不随序列长度构造 (起点数 × 序列长度) 的前缀矩阵
+        """
+        if self._residuals is None:
+            data = np.asarray(self.history_data, dtype=np.float64)
+            if len(data) < 3:
+                self._residuals = np.zeros(1)
+            else:
+                max_origins = max_origins or settings.FORECAST_RESIDUAL_ORIGINS
+                origins = np.arange(max(2, len(data) - max_origins), len(data))
+                probe = self.clone()
+                es, seasonal = probe.es_predictor, probe.seasonal_predictor
+                es.fit(data[:origins[0]].tolist())
+                seasonal.fit(data[:origins[0]].tolist())
+                window = probe.ma_predictor.window
+                weights = self.weights
+
+                one_step = np.empty(len(origins))
+                for i, t in enumerate(origins):
+                    # 移动平均的一步预测即前缀最后 window 期的均值（不足 window 期时为全部均值）
+                    ma = data[max(0, t - window):t].mean()
+                    one_step[i] = (
+                        ma * weights['moving_average'] +
+                        es.predict(1)[0] * weights['exponential_smoothing'] +
+                        seasonal.predict(1, t % seasonal.season_length)[0] * weights['seasonal']
+                    )
+                    es.update([data[t]])
+                    seasonal.update([data[t]])
+
+                residuals = data[origins] - one_step
+                self._residuals = residuals - residuals.mean()
+        return self._residuals
+
+    def bootstrap_intervals(self, point: np.ndarray, confidence_level: float = 0.95,
+                            n_paths: int = 1000, seed: Optional[int] = 0
+                            ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        残差自助法 (bootstrap) 预测区间
+
+        重抽样样本内残差生成 n_paths 条预测路径，各期误差按 Holt 模型的方式向后传播
+        （第 j 期误差对第 h 期的影响为 alpha * (1 + beta * (h - j))），
+        整个模拟为一次 (路径数 × 期数) 的矩阵运算，返回各期经验分位数 (下限, 上限)
+        """
+        steps = len(point)
+        residuals = self.residuals()
+        rng = np.random.default_rng(seed)
+        draws = residuals[rng.integers(0, len(residuals), size=(n_paths, steps))]
+
+        alpha, beta = self.es_predictor.alpha, self.es_predictor.beta
+        lag = np.subtract.outer(np.arange(steps), np.arange(steps))
+        propagation = np.where(lag > 0, alpha * (1 + beta * lag), 0.0)
+        np.fill_diagonal(propagation, 1.0)
+
+        paths = point[None, :] + draws @ propagation.T
+        tail = (1 - confidence_level) / 2
+        lower, upper = np.quantile(paths, [tail, 1 - tail], axis=0)
+        return np.maximum(0, lower), upper
 
     def predict(self, steps: int = 3,
                 current_factors: Optional[Dict[str, float]] = None,
-                current_season: int = 0) -> List[ForecastResult]:
+                current_season: int = 0,
+                interval_method: str = 'spread',
+                confidence_level: float = 0.95,
+                n_paths: int = 1000) -> List[ForecastResult]:
         """
         集成预测
         steps: 预测期数
         current_factors: 当前环境因素
         current_season: 当前季节索引（0-11）
+        interval_method: 置信区间计算方式
+            spread    - 各子模型预测的离散程度（1.96 倍标准差）
+            bootstrap - 残差自助法模拟路径的经验分位数，区间水平为 confidence_level
+        n_paths: bootstrap 模拟路径数（受 bootstrap_paths 上限约束）
         """
         # 获取各模型预测
         ma_preds = self.ma_predictor.predict(steps)
@@ -369,8 +986,147 @@ class EnsembleForecaster:
                 contributing_factors=contributions
             ))
 
+        if interval_method == 'bootstrap':
+            point = np.array([r.predicted_value for r in results])
+            lower, upper = self.bootstrap_intervals(
+                point, confidence_level, bootstrap_paths(n_paths, steps)
+            )
+            for result, lo, hi in zip(results, lower, upper):
+                result.confidence_interval = (round(float(lo), 2), round(float(hi), 2))
+                result.confidence_level = confidence_level
+
         return results
 
+    def predict_scenarios(self, steps: int, scenarios: np.ndarray,
+                          current_season: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        向量化评估多组环境因素情景（模型只拟合一次）
+        scenarios: (N × 5) 因素矩阵
+        返回: (预测值, 置信下限, 置信上限)，均为 (N × steps)
+        """
+        ma_preds = np.asarray(self.ma_predictor.predict(steps), dtype=np.float64)
+        es_preds = np.asarray(self.es_predictor.predict(steps), dtype=np.float64)
+        seasonal_preds = np.asarray(self.seasonal_predictor.predict(steps, current_season),
+                                    dtype=np.float64)
+
+        base = (
+            ma_preds * self.weights['moving_average'] +
+            es_preds * self.weights['exponential_smoothing'] +
+            seasonal_preds * self.weights['seasonal']
+        )
+        trend_adj = (es_preds - es_preds[0]) / es_preds[0] if es_preds[0] != 0 else np.zeros(steps)
+        mf_preds = self.multi_factor_predictor.predict_scenarios(scenarios, trend_adj)
+        predicted = base[None, :] + mf_preds * self.weights['multi_factor']
+
+        margin = 1.96 * np.std(np.stack([ma_preds, es_preds, seasonal_preds]), axis=0)
+        return predicted, np.maximum(0, predicted - margin), predicted + margin
+
+    def fit_batch(self, series: List[List[float]], factors: Optional[List] = None) -> None:
+        """
+        批量拟合多条序列（如多种作物、多个地块）
+        所有子模型在 (序列数 × 时间) 矩阵上一次向量化完成
+        factors: 各序列的因素字典列表或 (N × 5) 因素矩阵，无因素的序列为 None
+        """
+        matrix, lengths = to_series_matrix(series)
+        self.batch_size = len(series)
+
+        factor_tensor = None
+        if factors is not None:
+            factor_tensor = np.full(matrix.shape + (len(FACTOR_NAMES),), np.nan)
+            width = matrix.shape[1]
+            for i, rows in enumerate(factors):
+                if rows is not None and len(rows) and len(rows) == lengths[i]:
+                    factor_tensor[i, width - len(rows):] = factor_columns(rows)
+
+        self.ma_predictor.fit_batch(matrix, lengths)
+        self.es_predictor.fit_batch(matrix, lengths)
+        self.seasonal_predictor.fit_batch(matrix, lengths)
+        self.multi_factor_predictor.fit_batch(matrix, lengths, factor_tensor)
+
+    def component_forecasts_batch(self, steps: int = 3, current_season=0) -> Dict[str, np.ndarray]:
+        """
+        批量拟合后各子模型与集成（不含多因素）的原始预测数组
+        current_season 可为每条序列各自的起始季节数组
+        返回: {'moving_average', 'exponential_smoothing', 'seasonal', 'ensemble', 'lower', 'upper'}
+        """
+        ma_preds = self.ma_predictor.predict_batch(steps)
+        es_preds = self.es_predictor.predict_batch(steps)
+        seasonal_preds = self.seasonal_predictor.predict_batch(steps, current_season)
+
+        ensemble = (
+            ma_preds * self.weights['moving_average'] +
+            es_preds * self.weights['exponential_smoothing'] +
+            seasonal_preds * self.weights['seasonal']
+        )
+        margin = 1.96 * np.std(np.stack([ma_preds, es_preds, seasonal_preds]), axis=0)
+
+        return {
+            'moving_average': ma_preds,
+            'exponential_smoothing': es_preds,
+            'seasonal': seasonal_preds,
+            'ensemble': ensemble,
+            'lower': np.maximum(0, ensemble - margin),
+            'upper': ensemble + margin
+        }
+
+    def predict_batch(self, steps: int = 3,
+                      current_factors: Optional[Dict[str, float]] = None,
+                      current_season: int = 0) -> List[List[ForecastResult]]:
+        """批量集成预测，结果与逐条调用 fit/predict 一致"""
+        ma_preds = self.ma_predictor.predict_batch(steps)
+        es_preds = self.es_predictor.predict_batch(steps)
+        seasonal_preds = self.seasonal_predictor.predict_batch(steps, current_season)
+
+        weighted = (
+            ma_preds * self.weights['moving_average'] +
+            es_preds * self.weights['exponential_smoothing'] +
+            seasonal_preds * self.weights['seasonal']
+        )
+
+        contributions = None
+        if current_factors:
+            es_first = es_preds[:, :1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                trend_adj = np.where(es_first != 0, (es_preds - es_first) / es_first, 0.0)
+            mf_preds, contributions = self.multi_factor_predictor.predict_batch(
+                current_factors, trend_adj
+            )
+            weighted = weighted + mf_preds * self.weights['multi_factor']
+
+        # 计算置信区间
+        std_dev = np.std(np.stack([ma_preds, es_preds, seasonal_preds]), axis=0)
+        margin = 1.96 * std_dev
+        lower = np.maximum(0, weighted - margin)
+        upper = weighted + margin
+
+        all_results = []
+        for row in range(weighted.shape[0]):
+            results = []
+            for i in range(steps):
+                value = round(float(weighted[row, i]), 2)
+                if i > 0:
+                    previous = results[i - 1].predicted_value
+                    if value > previous * 1.02:
+                        trend = 'up'
+                    elif value < previous * 0.98:
+                        trend = 'down'
+                    else:
+                        trend = 'stable'
+                else:
+                    trend = 'stable'
+
+                results.append(ForecastResult(
+                    predicted_value=value,
+                    confidence_interval=(round(float(lower[row, i]), 2),
+                                         round(float(upper[row, i]), 2)),
+                    confidence_level=0.85,
+                    trend=trend,
+                    contributing_factors=contributions[row][i] if contributions else {}
+                ))
+            all_results.append(results)
+
+        return all_results
+
 
 # 模拟历史数据生成器
 def generate_mock_historical_data(months: int = 24) -> List[Dict]:
@@ -424,21 +1180,447 @@ def generate_mock_historical_data(months: int = 24) -> List[Dict]:
     return data
 
 
+def build_forecast_response(crop: str, periods: int, results: List[ForecastResult],
+                            data_points: int, weights: Dict[str, float],
+                            interval: Optional[Dict] = None) -> Dict:
+    """构建预测结果字典"""
+    # 构建返回结果
+    forecast_data = []
+    for i, result in enumerate(results):
+        forecast_data.append({
+            'period': i + 1,
+            'predicted_yield': result.predicted_value,
+            'confidence_lower': result.confidence_interval[0],
+            'confidence_upper': result.confidence_interval[1],
+            'confidence_level': result.confidence_level,
+            'trend': result.trend,
+            'factors': result.contributing_factors
+        })
+
+    # 汇总统计
+    total_predicted = sum(r.predicted_value for r in results)
+    avg_confidence = np.mean([r.confidence_level for r in results])
+
+    return {
+        'crop': crop,
+        'forecast_periods': periods,
+        'predictions': forecast_data,
+        'summary': {
+            'total_predicted_yield': round(total_predicted, 2),
+            'average_monthly_yield': round(total_predicted / periods, 2),
+            'overall_confidence': round(avg_confidence, 2),
+            'prediction_range': (
+                round(sum(r.confidence_interval[0] for r in results), 2),
+                round(sum(r.confidence_interval[1] for r in results), 2)
+            )
+        },
+        'algorithm_info': {
+            'method': 'Ensemble (Moving Average + Exponential Smoothing + Seasonal + Multi-Factor)',
+            'weights': weights,
+            'data_points': data_points,
+            'interval': interval or {'method': 'spread'}
+        }
+    }
+
+
+def interval_info(interval_method: str, confidence_level: float,
+                  n_paths: int, periods: int) -> Dict:
+    """置信区间计算方式说明（写入预测结果的 algorithm_info）"""
+    if interval_method != 'bootstrap':
+        return {'method': 'spread'}
+    return {
+        'method': 'bootstrap',
+        'confidence_level': confidence_level,
+        'n_paths': bootstrap_paths(n_paths, periods)
+    }
+
+
+def build_scenario_response(crop: str, periods: int, scenarios: np.ndarray,
+                            predicted: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                            data_points: int) -> Dict:
+    """构建情景评估结果（列式），每个列表按情景顺序排列"""
+    return {
+        'crop': crop,
+        'forecast_periods': periods,
+        'scenario_count': len(scenarios),
+        'factors': {name: scenarios[:, i].tolist() for i, name in enumerate(FACTOR_NAMES)},
+        'predicted_yield': np.round(predicted, 2).tolist(),
+        'confidence_lower': np.round(lower, 2).tolist(),
+        'confidence_upper': np.round(upper, 2).tolist(),
+        'total_predicted_yield': np.round(predicted.sum(axis=1), 2).tolist(),
+        'data_points': data_points
+    }
+
+
+def build_scenario_grid(axes: Dict[str, List[float]]) -> Tuple[np.ndarray, Tuple[int, ...]]:
+    """
+    由各因素取值构建笛卡尔网格
+    axes: {因素: 取值列表}，未给出的因素取默认值
+    返回: ((N × 5) 因素矩阵, 网格形状)，行按 FACTOR_NAMES 顺序的 C 序展开
+    """
+    columns = [np.asarray(axes.get(name, [FACTOR_DEFAULTS[name]]), dtype=np.float64)
+               for name in FACTOR_NAMES]
+    grids = np.meshgrid(*columns, indexing='ij')
+    shape = tuple(len(c) for c in columns)
+    return np.stack([g.ravel() for g in grids], axis=1), shape
+
+
+def build_sweep_response(crop: str, periods: int, axes: Dict[str, List[float]],
+                         shape: Tuple[int, ...], scenarios: np.ndarray,
+                         predicted: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                         top_k: Optional[int], include_periods: bool, data_points: int) -> Dict:
+    """
+    构建网格扫描结果
+    网格点的因素取值可由 axes 与 shape 还原，因此只返回按网格顺序排列的总产量列
+    """
+    totals = predicted.sum(axis=1)
+    result = {
+        'crop': crop,
+        'forecast_periods': periods,
+        'axes': {name: [float(v) for v in axes.get(name, [FACTOR_DEFAULTS[name]])]
+                 for name in FACTOR_NAMES},
+        'grid_shape': list(shape),
+        'scenario_count': len(scenarios),
+        'total_predicted_yield': np.round(totals, 2).tolist(),
+        'data_points': data_points
+    }
+    if include_periods:
+        result['predicted_yield'] = np.round(predicted, 2).tolist()
+
+    if top_k:
+        k = min(top_k, len(totals))
+        # argpartition 取前 k 个，再只对这 k 个排序
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.argsort(-totals[top], kind='stable')]
+        result['top'] = [
+            {
+                'index': int(i),
+                'factors': dict(zip(FACTOR_NAMES, scenarios[i].tolist())),
+                'total_predicted_yield': round(float(totals[i]), 2),
+                'predicted_yield': np.round(predicted[i], 2).tolist(),
+                'confidence_lower': np.round(lower[i], 2).tolist(),
+                'confidence_upper': np.round(upper[i], 2).tolist()
+            }
+            for i in top
+        ]
+    return result
+
+
+def forecast_task(config: Dict, crop: str, periods: int,
+                  current_factors: Optional[Dict[str, float]],
+                  yields: List[float], factors: Optional[np.ndarray],
+                  current_season: int, interval_method: str = 'spread',
+                  confidence_level: float = 0.95, n_paths: int = 1000) -> Dict:
+    """
+    独立的预测任务（可在进程池中执行）
+    每个任务使用自己的预测器实例，不共享任何可变状态
+    """
+    forecaster = EnsembleForecaster(**config)
+    forecaster.fit(yields, factors)
+    results = forecaster.predict(
+        steps=periods,
+        current_factors=current_factors,
+        current_season=current_season,
+        interval_method=interval_method,
+        confidence_level=confidence_level,
+        n_paths=n_paths
+    )
+    return build_forecast_response(
+        crop, periods, results, len(yields), forecaster.weights,
+        interval_info(interval_method, confidence_level, n_paths, periods)
+    )
+
+
+def scenario_task(config: Dict, crop: str, periods: int, scenarios: np.ndarray,
+                  yields: List[float], factors: Optional[np.ndarray],
+                  current_season: int) -> Dict:
+    """独立的情景评估任务（可在进程池中执行）"""
+    forecaster = EnsembleForecaster(**config)
+    forecaster.fit(yields, factors)
+    predicted, lower, upper = forecaster.predict_scenarios(periods, scenarios, current_season)
+    return build_scenario_response(crop, periods, scenarios, predicted, lower, upper, len(yields))
+
+
+def sweep_task(config: Dict, crop: str, periods: int, axes: Dict[str, List[float]],
+               top_k: Optional[int], include_periods: bool,
+               yields: List[float], factors: Optional[np.ndarray],
+               current_season: int) -> Dict:
+    """独立的网格扫描任务（可在进程池中执行）"""
+    forecaster = EnsembleForecaster(**config)
+    forecaster.fit(yields, factors)
+    scenarios, shape = build_scenario_grid(axes)
+    predicted, lower, upper = forecaster.predict_scenarios(periods, scenarios, current_season)
+    return build_sweep_response(crop, periods, axes, shape, scenarios, predicted, lower, upper,
+                                top_k, include_periods, len(yields))
+
+
+def forecast_many_task(config: Dict, crops: List[str], periods: int,
+                       current_factors: Optional[Dict[str, float]],
+                       prepared: List[Tuple[List[float], Optional[np.ndarray]]],
+                       current_season: int) -> Dict[str, Dict]:
+    """独立的多作物批量预测任务（可在进程池中执行）"""
+    forecaster = EnsembleForecaster(**config)
+    forecaster.fit_batch([p[0] for p in prepared], [p[1] for p in prepared])
+    all_results = forecaster.predict_batch(
+        steps=periods,
+        current_factors=current_factors,
+        current_season=current_season
+    )
+    return {
+        crop: build_forecast_response(crop, periods, results, len(prepared[i][0]),
+                                      forecaster.weights)
+        for i, (crop, results) in enumerate(zip(crops, all_results))
+    }
+
+
 # 服务接口
 class ForecastService:
     """产量预测服务"""
 
-    def __init__(self):
-        self.forecaster = EnsembleForecaster()
-        self.historical_data = []
+    def __init__(self, cache_size: int = 64, forecaster_config: Optional[Dict] = None,
+                 tuned_params_path: Optional[str] = None, mock_data: bool = True):
+        # 模型配置模板，实际拟合在按作物缓存的独立实例上进行
+        self.forecaster = EnsembleForecaster(**(forecaster_config or {}))
+        self.history = HistoricalStore()
+        self._mock_history: Optional[HistoricalStore] = None
+        self.mock_data = mock_data      # 无历史数据的作物是否使用模拟数据
+
+        # 历史数据与调优参数在首次使用时加载（导入模块不做任何计算）
+        self.tuned_params_path = tuned_params_path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+        # 已拟合模型缓存: (作物, 整体替换次数, 数据版本, 模型配置) -> (预测器, 数据点数)
+        self.cache_size = cache_size
+        self._model_cache: OrderedDict = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._generation = 0            # 历史数据整体替换的次数
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # 按作物调优的模型参数，覆盖模板中的对应配置
+        self.crop_params: Dict[str, Dict] = {}
+
+    def ensure_initialized(self) -> None:
+        """
+        首次使用时加载调优参数；尚无历史数据（未从数据库加载）且允许模拟数据时载入模拟数据
+        重复调用只做一次标志检查
+        """
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            if self.tuned_params_path:
+                self.load_tuned_params(self.tuned_params_path)
+            if self.mock_data and not len(self.history):
+                mock = self._mock_store()
+                with self._cache_lock:
+                    if not len(self.history):
+                        self.history = mock
+            self._initialized = True
+
+    def _mock_store(self) -> HistoricalStore:
+        """模拟历史数据（只生成一次）"""
+        if self._mock_history is None:
+            self._mock_history = HistoricalStore.from_records(generate_mock_historical_data())
+        return self._mock_history
+
+    def warm_up(self, crops: Optional[List[str]] = None) -> int:
+        """预先拟合各作物模型放入缓存（默认为全部有历史数据的作物），返回拟合的作物数"""
+        self.ensure_initialized()
+        crops = crops if crops is not None else self.history.crops()
+        for crop in crops:
+            self._get_fitted(crop)
+        return len(crops)
+
+    def config_for(self, crop: str) -> Dict:
+        """指定作物使用的模型配置（模板配置 + 调优参数）"""
+        self.ensure_initialized()
+        config = self.forecaster.get_config()
+        params = self.crop_params.get(crop)
+        if params:
+            config.update({k: v for k, v in params.items() if k != 'weights'})
+            config['weights'] = dict(config['weights'], **params.get('weights', {}))
+        return config
+
+    def set_crop_params(self, params: Dict[str, Dict]) -> None:
+        """替换按作物调优的模型参数（配置是缓存键的一部分，旧模型自然淘汰）"""
+        with self._cache_lock:
+            self.crop_params = {crop: dict(p) for crop, p in params.items()}
+
+    def load_tuned_params(self, path: str) -> int:
+        """
+        从调优结果文件加载按作物的模型参数（文件由 app.services.tuning 生成）
+        文件不存在或无法解析时保持默认配置，返回加载的作物数
+        """
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            logger.exception("读取模型调优参数失败: %s", path)
+            return 0
+
+        params = {
+            crop: {k: p[k] for k in ('ma_window', 'alpha', 'beta', 'weights') if k in p}
+            for crop, p in payload.get('crops', {}).items()
+        }
+        self.set_crop_params(params)
+        return len(params)
 
     def load_historical_data(self, data: List[Dict]) -> None:
-        """加载历史数据"""
-        self.historical_data = data
+        """加载历史数据，一次性建立按作物的列式存储（全部已缓存模型失效）"""
+        self.set_history(HistoricalStore.from_records(data))
+
+    def set_history(self, history: HistoricalStore) -> None:
+        """替换历史数据存储（全部已缓存模型失效）"""
+        with self._cache_lock:
+            self.history = history
+            self._generation += 1
+            self._model_cache.clear()
+            for crop in self._versions:
+                self._versions[crop] += 1
+
+    def add_observations(self, records: List[Dict]) -> None:
+        """追加新的产量记录，仅使相关作物的缓存模型失效"""
+        with self._cache_lock:
+            crops = self.history.append(records)
+            for crop in crops:
+                self._versions[crop] = self._versions.get(crop, 0) + 1
+            for key in [k for k in self._model_cache if k[0] in crops]:
+                del self._model_cache[key]
+
+    def ingest_observations(self, records: List[Dict],
+                            revisions: Optional[List[Dict]] = None) -> Dict[str, int]:
+        """
+        追加新的产量记录（可同时修订已有期的记录），并增量更新相关作物已缓存的模型
+
+        新记录均晚于该作物已有数据时，缓存模型写时复制后调用 update()；
+        自上次完整拟合以来的增量观测数超过 FORECAST_REFIT_EVERY 时改为完整重拟合，
+        消除增量更新的累计误差（多因素系数也在此时刷新）；
+        修订已有期、乱序记录或此前使用模拟数据的作物无法增量处理，模型失效后按需重新拟合
+
+        Returns:
+            {'updated': 增量更新的模型数, 'refit': 重拟合的模型数, 'invalidated': 失效的模型数}
+        """
+        result = {'updated': 0, 'refit': 0, 'invalidated': 0}
+        by_crop: Dict[str, List[Dict]] = {}
+        for record in records:
+            by_crop.setdefault(record.get('crop'), []).append(record)
+        revised = {record.get('crop') for record in revisions or []}
+        for crop in revised:
+            by_crop.setdefault(crop, [])
+        if not by_crop:
+            return result
+
+        with self._cache_lock:
+            previous = {}
+            for crop in by_crop:
+                history = self.history.get(crop)
+                if history is not None and len(history):
+                    previous[crop] = (len(history), history.dates[-1])
+            if revisions:
+                self.history.revise(revisions)
+            self.history.append(records)
+
+            pending = []
+            for crop in by_crop:
+                version = self._versions.get(crop, 0)
+                self._versions[crop] = version + 1
+                keys = [k for k in self._model_cache if k[0] == crop]
+                pending.append((crop, version, [(k, self._model_cache.pop(k)) for k in keys]))
+            history = self.history
+            generation = self._generation
+
+        for crop, version, entries in pending:
+            old_len, last_date = previous.get(crop, (0, None))
+            new_dates = np.array([r['date'] for r in by_crop[crop]], dtype='datetime64[D]')
+            in_order = old_len > 0 and crop not in revised and \
+                (len(new_dates) == 0 or new_dates.min() >= last_date)
+            new_yields = history.get(crop).yields[old_len:].tolist()
+
+            for key, (forecaster, data_points) in entries:
+                if key[1:3] != (generation, version) or not in_order:
+                    result['invalidated'] += 1
+                    continue
+
+                if forecaster.updates_since_refit + len(new_yields) > settings.FORECAST_REFIT_EVERY:
+                    updated = forecaster.clone()
+                    yields, factors = self._prepare(crop)
+                    updated.fit(yields, factors)
+                    entry = (updated, len(yields))
+                    result['refit'] += 1
+                else:
+                    updated = forecaster.copy()
+                    updated.update(new_yields)
+                    entry = (updated, data_points + len(new_yields))
+                    result['updated'] += 1
+
+                with self._cache_lock:
+                    # 期间又有新数据到达时放弃，等待下一次按需拟合
+                    if self._versions.get(crop) == version + 1 and self._generation == generation:
+                        new_key = (crop, generation, version + 1, key[3])
+                        self._model_cache[new_key] = entry
+                        self._model_cache.move_to_end(new_key)
+                        while len(self._model_cache) > self.cache_size:
+                            self._model_cache.popitem(last=False)
+
+        return result
+
+    def _get_fitted(self, crop: str) -> Tuple[EnsembleForecaster, int]:
+        """取已拟合的预测器，缓存未命中时拟合并放入缓存（LRU 淘汰）"""
+        self.ensure_initialized()   # 须在取缓存锁之前完成
+        with self._cache_lock:
+            forecaster = EnsembleForecaster(**self.config_for(crop))
+            # 含历史数据整体替换次数：替换前开始的拟合完成后放入的模型不会被之后的请求命中
+            key = (crop, self._generation, self._versions.get(crop, 0), forecaster.config_key())
+            entry = self._model_cache.get(key)
+            if entry is not None:
+                self._model_cache.move_to_end(key)
+                self.cache_hits += 1
+                return entry
+            self.cache_misses += 1
+
+        yields, factors = self._prepare(crop)
+        forecaster.fit(yields, factors)
+        entry = (forecaster, len(yields))
+
+        with self._cache_lock:
+            self._model_cache[key] = entry
+            self._model_cache.move_to_end(key)
+            while len(self._model_cache) > self.cache_size:
+                self._model_cache.popitem(last=False)
+        return entry
+
+    def data_token(self, crop: str) -> str:
+        """
+        作物预测输入的版本标识（历史数据版本、模型配置、当前季节）
+        任一变化后，此前按该标识计算的预测结果即已过期
+        """
+        config_key = EnsembleForecaster(**self.config_for(crop)).config_key()
+        version = (self._generation, self._versions.get(crop, 0), datetime.now().month)
+        return repr((version, config_key))
+
+    def cache_stats(self) -> Dict:
+        total = self.cache_hits + self.cache_misses
+        return {
+            'size': len(self._model_cache),
+            'capacity': self.cache_size,
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': round(self.cache_hits / total, 4) if total else 0.0,
+            'tuned_crops': sorted(self.crop_params)
+        }
 
     def forecast(self, crop: str = '水稻',
                  periods: int = 3,
-                 current_factors: Optional[Dict[str, float]] = None) -> Dict:
+                 current_factors: Optional[Dict[str, float]] = None,
+                 interval_method: str = 'spread',
+                 confidence_level: float = 0.95,
+                 n_paths: Optional[int] = None) -> Dict:
         """
         执行产量预测
 
@@ -446,79 +1628,155 @@ class ForecastService:
             crop: 作物类型
             periods: 预测期数（月）
             current_factors: 当前环境因素
+            interval_method: 置信区间计算方式 spread / bootstrap
+            confidence_level: bootstrap 区间水平
+            n_paths: bootstrap 模拟路径数，默认 FORECAST_BOOTSTRAP_PATHS
 
         Returns:
             预测结果字典
         """
-        # 过滤特定作物的历史数据
-        crop_data = [d for d in self.historical_data if d.get('crop') == crop]
-
-        if not crop_data:
-            # 使用模拟数据
-            self.historical_data = generate_mock_historical_data()
-            crop_data = [d for d in self.historical_data if d.get('crop') == crop]
-
-        # 提取产量序列
-        yields = [d['yield'] for d in sorted(crop_data, key=lambda x: x['date'])]
-
-        # 提取环境因素
-        factors = None
-        if len(crop_data) > 0 and 'temperature' in crop_data[0]:
-            factors = [{k: v for k, v in d.items()
-                       if k in ['temperature', 'rainfall', 'fertilizer', 'soil_ph', 'sunshine']}
-                      for d in crop_data]
-
-        # 拟合模型
-        self.forecaster.fit(yields, factors)
+        # 历史数据未变化时直接复用已拟合的模型
+        forecaster, data_points = self._get_fitted(crop)
 
         # 获取当前月份作为季节索引
         current_season = datetime.now().month - 1
 
         # 执行预测
-        results = self.forecaster.predict(
+        n_paths = n_paths or settings.FORECAST_BOOTSTRAP_PATHS
+        results = forecaster.predict(
             steps=periods,
             current_factors=current_factors,
-            current_season=current_season
+            current_season=current_season,
+            interval_method=interval_method,
+            confidence_level=confidence_level,
+            n_paths=n_paths
         )
 
-        # 构建返回结果
-        forecast_data = []
-        for i, result in enumerate(results):
-            forecast_data.append({
-                'period': i + 1,
-                'predicted_yield': result.predicted_value,
-                'confidence_lower': result.confidence_interval[0],
-                'confidence_upper': result.confidence_interval[1],
-                'confidence_level': result.confidence_level,
-                'trend': result.trend,
-                'factors': result.contributing_factors
-            })
-
-        # 汇总统计
-        total_predicted = sum(r.predicted_value for r in results)
-        avg_confidence = np.mean([r.confidence_level for r in results])
+        return build_forecast_response(
+            crop, periods, results, data_points, forecaster.weights,
+            interval_info(interval_method, confidence_level, n_paths, periods)
+        )
 
-        return {
-            'crop': crop,
-            'forecast_periods': periods,
-            'predictions': forecast_data,
-            'summary': {
-                'total_predicted_yield': round(total_predicted, 2),
-                'average_monthly_yield': round(total_predicted / periods, 2),
-                'overall_confidence': round(avg_confidence, 2),
-                'prediction_range': (
-                    round(sum(r.confidence_interval[0] for r in results), 2),
-                    round(sum(r.confidence_interval[1] for r in results), 2)
-                )
-            },
-            'algorithm_info': {
-                'method': 'Ensemble (Moving Average + Exponential Smoothing + Seasonal + Multi-Factor)',
-                'weights': self.forecaster.weights,
-                'data_points': len(yields)
-            }
-        }
+    def score_scenarios(self, crop: str, periods: int,
+                        scenarios: List[Dict[str, float]]) -> Dict:
+        """
+        批量评估多组环境因素情景
+        模型只拟合一次（命中缓存时不拟合），所有情景在一次矩阵运算中完成
+        """
+        forecaster, data_points = self._get_fitted(crop)
+        matrix = factors_to_matrix(scenarios)
+        predicted, lower, upper = forecaster.predict_scenarios(
+            periods, matrix, datetime.now().month - 1
+        )
+        return build_scenario_response(crop, periods, matrix, predicted, lower, upper, data_points)
+
+    def sweep_scenarios(self, crop: str, periods: int, axes: Dict[str, List[float]],
+                        top_k: Optional[int] = None, include_periods: bool = False) -> Dict:
+        """
+        环境因素网格扫描
+        模型拟合一次，整个笛卡尔网格在一次向量化运算中评估
+        """
+        forecaster, data_points = self._get_fitted(crop)
+        scenarios, shape = build_scenario_grid(axes)
+        predicted, lower, upper = forecaster.predict_scenarios(
+            periods, scenarios, datetime.now().month - 1
+        )
+        return build_sweep_response(crop, periods, axes, shape, scenarios, predicted, lower, upper,
+                                    top_k, include_periods, data_points)
+
+    def forecast_many(self, crops: List[str],
+                      periods: int = 3,
+                      current_factors: Optional[Dict[str, float]] = None) -> Dict[str, Dict]:
+        """
+        多作物批量预测
+        模型配置相同的作物在一次向量化拟合/预测中完成，结果与逐个调用 forecast 一致
+
+        Returns:
+            {作物: 预测结果字典}
+        """
+        results = {}
+        for config, group in self.group_by_config(crops):
+            prepared = [self._prepare(crop) for crop in group]
+            results.update(forecast_many_task(
+                config, group, periods, current_factors,
+                prepared, datetime.now().month - 1
+            ))
+        return {crop: results[crop] for crop in crops}
+
+    def group_by_config(self, crops: List[str]) -> List[Tuple[Dict, List[str]]]:
+        """按模型配置对作物分组，同组作物可共用一次批量拟合"""
+        groups: Dict[Tuple, Tuple[Dict, List[str]]] = {}
+        for crop in crops:
+            config = self.config_for(crop)
+            key = EnsembleForecaster(**config).config_key()
+            groups.setdefault(key, (config, []))[1].append(crop)
+        return list(groups.values())
+
+    def _crop_history(self, crop: str):
+        """取作物的历史数据，无数据且允许模拟数据时使用模拟数据（不覆盖已加载的历史数据）"""
+        self.ensure_initialized()
+        history = self.history.get(crop)
+        if (history is None or not len(history)) and self.mock_data:
+            history = self._mock_store().get(crop)
+        return history
+
+    def history_crops(self) -> List[str]:
+        """有历史数据的作物（尚未从数据库加载时为模拟数据中的作物）"""
+        self.ensure_initialized()
+        history = self.history
+        return [crop for crop in history.crops() if len(history.get(crop))]
+
+    def last_period(self, crop: str) -> Optional[datetime]:
+        """作物历史数据最后一期的起始日（第 k 期预测即其后第 k 个月），无数据时返回 None"""
+        history = self._crop_history(crop)
+        if history is None or not len(history):
+            return None
+        last = history.dates[-1].item()
+        return datetime(last.year, last.month, 1)
+
+    def history_records(self, crop: str) -> List[Dict]:
+        """指定作物的历史产量记录（按日期升序）"""
+        history = self._crop_history(crop)
+        return history.records(crop) if history is not None else []
+
+    def yield_series(self, crops: List[str]) -> Dict[str, List[float]]:
+        """
+        各作物的产量序列（按日期升序），供回测与参数调优使用
+        首次调用可能触发历史数据加载，异步接口中应经执行器调用
+        """
+        return {crop: self._prepare(crop)[0] for crop in crops}
+
+    def model_inputs(self, crops: List[str]) -> Dict[str, Tuple[Dict, List[float], Optional[np.ndarray]]]:
+        """
+        各作物预测任务的输入 {作物: (模型配置, 产量序列, 因素矩阵)}，供进程池执行时在父进程中准备
+        首次调用可能触发历史数据加载，异步接口中应在线程中调用
+        """
+        inputs = {}
+        for crop in crops:
+            yields, factors = self._prepare(crop)
+            inputs[crop] = (self.config_for(crop), yields, factors)
+        return inputs
+
+    def _prepare(self, crop: str) -> Tuple[List[float], Optional[np.ndarray]]:
+        """
+        取指定作物的产量序列与环境因素矩阵（按日期升序）
+        按作物索引直接取列，不扫描、不排序
+        """
+        history = self._crop_history(crop)
+        if history is None:
+            return [], None
+
+        factors = history.factors if history.has_factors else None
+        return history.yields.tolist(), factors
 
 
 # 创建全局服务实例
-forecast_service = ForecastService()
-forecast_service.load_historical_data(generate_mock_historical_data())
+forecast_service = ForecastService(
+    cache_size=settings.FORECAST_CACHE_SIZE,
+    forecaster_config={
+        'mf_solver': settings.FORECAST_MF_SOLVER,
+        'mf_ridge': settings.FORECAST_MF_RIDGE
+    },
+    tuned_params_path=settings.FORECAST_TUNED_PARAMS_PATH,
+    mock_data=settings.MOCK_DATA_ENABLED
+)
@@ -0,0 +1,172 @@
+"""
+预测任务执行模块
+将 CPU 密集的预测计算移出事件循环，在线程池或进程池中执行
+"""
+
+import asyncio
+import json
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+from .forecast import (
+    ForecastService, forecast_service, forecast_task, forecast_many_task,
+    scenario_task, sweep_task, factors_to_matrix
+)
+
+
+class ForecastQueueFull(Exception):
+    """预测任务排队已满"""
+
+
+class ForecastExecutor:
+    """
+    预测执行器
+
+    mode:
+        inline  - 直接在事件循环中计算（仅用于调试/对比）
+        thread  - 线程池执行，复用服务内的已拟合模型缓存
+        process - 进程池执行，父进程准备数据，子进程用独立的预测器实例拟合
+    """
+
+    def __init__(self, service: ForecastService, mode: str = 'thread',
+                 workers: int = 4, max_pending: int = 32):
+        if mode not in ('inline', 'thread', 'process'):
+            raise ValueError(f"不支持的执行模式: {mode}")
+        self.service = service
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool: Optional[Executor] = None
+
+        # 统计计数
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == 'process':
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='forecast'
+                )
+        return self._pool
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ForecastQueueFull("预测任务繁忙，请稍后重试")
+
+        self.pending += 1
+        try:
+            if self.mode == 'inline':
+                return fn(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), partial(fn, *args))
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def forecast(self, crop: str, periods: int = 3,
+                       current_factors: Optional[Dict[str, float]] = None,
+                       interval_method: str = 'spread',
+                       confidence_level: float = 0.95,
+                       n_paths: Optional[int] = None) -> Dict:
+        """执行单作物预测"""
+        if self.mode != 'process':
+            return await self._run(self.service.forecast, crop, periods, current_factors,
+                                   interval_method, confidence_level, n_paths)
+
+        config, yields, factors = (await self._model_inputs([crop]))[crop]
+        return await self._run(
+            forecast_task, config, crop, periods,
+            current_factors, yields, factors, datetime.now().month - 1,
+            interval_method, confidence_level, n_paths or settings.FORECAST_BOOTSTRAP_PATHS
+        )
+
+    async def score_scenarios(self, crop: str, periods: int,
+                              scenarios: List[Dict[str, float]]) -> Dict:
+        """批量评估环境因素情景"""
+        if self.mode != 'process':
+            return await self._run(self.service.score_scenarios, crop, periods, scenarios)
+
+        config, yields, factors = (await self._model_inputs([crop]))[crop]
+        return await self._run(
+            scenario_task, config, crop, periods,
+            factors_to_matrix(scenarios), yields, factors, datetime.now().month - 1
+        )
+
+    async def sweep_scenarios(self, crop: str, periods: int, axes: Dict[str, List[float]],
+                              top_k: Optional[int] = None,
+                              include_periods: bool = False) -> Dict:
+        """环境因素网格扫描"""
+        if self.mode != 'process':
+            return await self._run(self.service.sweep_scenarios, crop, periods, axes,
+                                   top_k, include_periods)
+
+        config, yields, factors = (await self._model_inputs([crop]))[crop]
+        return await self._run(
+            sweep_task, config, crop, periods, axes,
+            top_k, include_periods, yields, factors, datetime.now().month - 1
+        )
+
+    async def forecast_many(self, crops: List[str], periods: int = 3,
+                            current_factors: Optional[Dict[str, float]] = None) -> Dict[str, Dict]:
+        """执行多作物批量预测"""
+        if self.mode != 'process':
+            return await self._run(self.service.forecast_many, crops, periods, current_factors)
+
+        # 模型配置相同的作物共用一次批量拟合
+        groups: Dict[str, Tuple[Dict, List[str]]] = {}
+        inputs = await self._model_inputs(crops)
+        for crop in crops:
+            config = inputs[crop][0]
+            groups.setdefault(json.dumps(config, sort_keys=True), (config, []))[1].append(crop)
+
+        results = {}
+        for config, group in groups.values():
+            prepared = [inputs[crop][1:] for crop in group]
+            results.update(await self._run(
+                forecast_many_task, config, group, periods,
+                current_factors, prepared, datetime.now().month - 1
+            ))
+        return {crop: results[crop] for crop in crops}
+
+    async def _model_inputs(self, crops: List[str]) -> Dict:
+        """在线程中准备进程任务的输入（首次使用可能触发历史数据加载，不在事件循环中执行）"""
+        return await asyncio.to_thread(self.service.model_inputs, crops)
+
+    async def yield_series(self, crops: List[str]) -> Dict[str, List[float]]:
+        """取各作物产量序列（可能触发历史数据加载，不在事件循环中执行）"""
+        if self.mode != 'process':
+            return await self._run(self.service.yield_series, crops)
+        # 进程模式下历史数据只在父进程中，改用线程读取
+        return await asyncio.to_thread(self.service.yield_series, crops)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict:
+        return {
+            'mode': self.mode,
+            'workers': self.workers,
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'rejected': self.rejected
+        }
+
+
+# 创建全局执行器
+forecast_executor = ForecastExecutor(
+    forecast_service,
+    mode=settings.FORECAST_EXECUTOR,
+    workers=settings.FORECAST_WORKERS,
+    max_pending=settings.FORECAST_MAX_PENDING
+)
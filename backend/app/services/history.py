@@ -0,0 +1,191 @@
+"""
+历史产量数据存储模块
+按作物分列存储日期、产量与环境因素 (NumPy 数组)，供预测服务 O(1) 取序列
+"""
+
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+# 环境因素列顺序（与 forecast.FACTOR_NAMES 一致）
+FACTOR_COLUMNS = ['temperature', 'rainfall', 'fertilizer', 'soil_ph', 'sunshine']
+
+
+class CropHistory:
+    """
+    单一作物的列式历史数据，按日期升序
+
+    数组按容量倍增预分配，按时间顺序追加时只写入新行；
+    已有行从不原地修改（乱序追加时重新分配数组），因此取出的切片视图可安全地在锁外使用
+    """
+
+    def __init__(self, capacity: int = 16):
+        self._dates = np.empty(capacity, dtype='datetime64[D]')
+        self._yields = np.empty(capacity, dtype=np.float64)
+        self._factors = np.empty((capacity, len(FACTOR_COLUMNS)), dtype=np.float64)
+        self._size = 0
+        self.has_factors = False      # 是否有记录带环境因素
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self._dates[:self._size]
+
+    @property
+    def yields(self) -> np.ndarray:
+        return self._yields[:self._size]
+
+    @property
+    def factors(self) -> np.ndarray:
+        """(记录数 × 5) 因素矩阵，缺失项为 NaN"""
+        return self._factors[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._dates.nbytes + self._yields.nbytes + self._factors.nbytes
+
+    def records(self, crop: str) -> List[Dict]:
+        """转换回记录字典列表（用于接口返回），日期格式为 YYYY-MM"""
+        months = np.datetime_as_string(self.dates.astype('datetime64[M]'))
+        records = []
+        for i in range(self._size):
+            record = {'date': str(months[i]), 'crop': crop, 'yield': float(self._yields[i])}
+            for j, name in enumerate(FACTOR_COLUMNS):
+                value = self._factors[i, j]
+                if not np.isnan(value):
+                    record[name] = round(float(value), 2)
+            records.append(record)
+        return records
+
+    def has_date(self, date) -> bool:
+        """是否已有该日期的记录"""
+        date = np.datetime64(date, 'D')
+        index = int(np.searchsorted(self.dates, date))
+        return index < self._size and self._dates[index] == date
+
+    def extend(self, dates: np.ndarray, yields: np.ndarray, factors: np.ndarray,
+               has_factors: bool = False) -> None:
+        """追加一批记录（可乱序，追加后整体保持按日期升序，同日期保持追加顺序）"""
+        n = len(dates)
+        if n == 0:
+            return
+        self.has_factors = self.has_factors or has_factors
+        size = self._size
+        needed = size + n
+
+        in_order = (size == 0 or dates.min() >= self._dates[size - 1]) and \
+            bool(np.all(dates[1:] >= dates[:-1]))
+        if in_order and needed <= len(self._dates):
+            self._dates[size:needed] = dates
+            self._yields[size:needed] = yields
+            self._factors[size:needed] = factors
+            self._size = needed
+            return
+
+        all_dates = np.concatenate([self.dates, dates])
+        all_yields = np.concatenate([self.yields, yields])
+        all_factors = np.concatenate([self.factors, factors])
+        if not in_order:
+            order = np.argsort(all_dates, kind='stable')
+            all_dates, all_yields, all_factors = all_dates[order], all_yields[order], all_factors[order]
+
+        capacity = max(needed, 2 * len(self._dates))
+        self._dates = np.empty(capacity, dtype='datetime64[D]')
+        self._yields = np.empty(capacity, dtype=np.float64)
+        self._factors = np.empty((capacity, len(FACTOR_COLUMNS)), dtype=np.float64)
+        self._dates[:needed] = all_dates
+        self._yields[:needed] = all_yields
+        self._factors[:needed] = all_factors
+        self._size = needed
+
+    def revise(self, dates: np.ndarray, yields: np.ndarray, factors: np.ndarray,
+               has_factors: bool = False) -> None:
+        """
+        修订已有日期的记录（产量与环境因素整体替换），日期必须已存在且唯一
+        已有行不原地修改：复制数组后写入，此前取出的切片视图不受影响
+        """
+        if len(dates) == 0:
+            return
+        index = np.searchsorted(self.dates, dates)
+        if np.any(index >= self._size) or np.any(self._dates[np.minimum(index, self._size - 1)] != dates):
+            raise ValueError("修订的日期不在已有记录中")
+        self.has_factors = self.has_factors or has_factors
+        self._dates = self._dates.copy()
+        self._yields = self._yields.copy()
+        self._factors = self._factors.copy()
+        self._yields[index] = yields
+        self._factors[index] = factors
+
+
+def _columns(records: List[Dict]):
+    """将同一作物的记录转换为 (日期, 产量, 因素矩阵, 是否带因素)"""
+    dates = np.array([r['date'] for r in records], dtype='datetime64[D]')
+    yields = np.array([r['yield'] for r in records], dtype=np.float64)
+    factors = np.array([
+        [r.get(name, np.nan) for name in FACTOR_COLUMNS] for r in records
+    ], dtype=np.float64).reshape(-1, len(FACTOR_COLUMNS))
+    has_factors = any('temperature' in r for r in records)
+    return dates, yields, factors, has_factors
+
+
+class HistoricalStore:
+    """按作物索引的列式历史产量数据"""
+
+    def __init__(self):
+        self._crops: Dict[str, CropHistory] = {}
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> 'HistoricalStore':
+        store = cls()
+        store.append(records)
+        return store
+
+    def append(self, records: Iterable[Dict]) -> Set[str]:
+        """
+        追加产量记录（字典需含 date, crop, yield，可含各环境因素）
+        返回涉及的作物集合
+        """
+        by_crop: Dict[str, List[Dict]] = {}
+        for record in records:
+            by_crop.setdefault(record.get('crop'), []).append(record)
+
+        for crop, rows in by_crop.items():
+            history = self._crops.get(crop)
+            if history is None:
+                history = self._crops[crop] = CropHistory(capacity=max(16, len(rows)))
+            history.extend(*_columns(rows))
+        return set(by_crop)
+
+    def revise(self, records: Iterable[Dict]) -> Set[str]:
+        """
+        修订已有期的记录（按作物与日期定位，整体替换产量与环境因素）
+        返回涉及的作物集合
+        """
+        by_crop: Dict[str, List[Dict]] = {}
+        for record in records:
+            by_crop.setdefault(record.get('crop'), []).append(record)
+
+        for crop, rows in by_crop.items():
+            history = self._crops.get(crop)
+            if history is None:
+                raise ValueError(f"作物没有历史数据: {crop}")
+            history.revise(*_columns(rows))
+        return set(by_crop)
+
+    def get(self, crop: str) -> Optional[CropHistory]:
+        return self._crops.get(crop)
+
+    def crops(self) -> List[str]:
+        return list(self._crops)
+
+    def __len__(self) -> int:
+        return sum(len(h) for h in self._crops.values())
+
+    def stats(self) -> Dict:
+        return {
+            'crops': len(self._crops),
+            'records': len(self),
+            'nbytes': sum(h.nbytes for h in self._crops.values())
+        }
@@ -0,0 +1,406 @@
+"""
+传感器数据写入服务模块
+负责网关上报数据的传感器编号解析与批量写入
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.models import Sensor, SensorData, SensorDataDeadLetter
+from .rollup import apply_rollups
+
+logger = logging.getLogger(__name__)
+
+
+class SensorRef(NamedTuple):
+    """传感器编号解析结果"""
+    id: int                 # 数据库主键
+    sensor_id: str          # 传感器编号，如 S001
+    type: Optional[str]
+    location: Optional[str]
+
+
+class SensorIdCache:
+    """
+    传感器编号缓存
+    将字符串编号 (Sensor.sensor_id) 映射为整数主键，
+    未命中的编号按批次一次性查询，热路径上不会逐行 SELECT
+    """
+
+    def __init__(self):
+        self._refs: Dict[str, SensorRef] = {}
+        self._by_pk: Dict[int, SensorRef] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, db: Session, codes: Iterable[str]) -> Dict[str, SensorRef]:
+        """解析一批传感器编号，返回 {编号: SensorRef}，未知编号不在结果中"""
+        wanted = set(codes)
+        with self._lock:
+            found = {code: self._refs[code] for code in wanted if code in self._refs}
+        missing = wanted - found.keys()
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        if missing:
+            rows = db.query(
+                Sensor.id, Sensor.sensor_id, Sensor.type, Sensor.location
+            ).filter(Sensor.sensor_id.in_(missing)).all()
+            loaded = {row.sensor_id: SensorRef(*row) for row in rows}
+            with self._lock:
+                self._refs.update(loaded)
+                self._by_pk.update((ref.id, ref) for ref in loaded.values())
+            found.update(loaded)
+
+        return found
+
+    def get_by_pk(self, pk: int) -> Optional[SensorRef]:
+        """按主键取已缓存的传感器信息"""
+        return self._by_pk.get(pk)
+
+    def invalidate(self, code: Optional[str] = None) -> None:
+        """传感器增删后使缓存失效，code 为空时清空全部"""
+        with self._lock:
+            if code is None:
+                self._refs.clear()
+                self._by_pk.clear()
+            else:
+                ref = self._refs.pop(code, None)
+                if ref is not None:
+                    self._by_pk.pop(ref.id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._refs), 'hits': self.hits, 'misses': self.misses}
+
+
+def to_naive_utc(ts: datetime) -> datetime:
+    """带时区的时间换算为不带时区的 UTC 时间（不带时区的视为已是 UTC）"""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def resolve_readings(db: Session,
+                     readings: List[Tuple[str, float, Optional[datetime]]]
+                     ) -> Tuple[List[Dict], List[str]]:
+    """
+    将 (传感器编号, 数值, 采集时间) 转换为 sensor_data 行
+    采集时间统一为不带时区的 UTC 时间，为空时取服务器时间
+
+    Returns:
+        (可写入的行列表, 未知传感器编号列表)
+    """
+    refs = sensor_cache.resolve(db, (r[0] for r in readings))
+    now = datetime.utcnow()
+
+    rows = []
+    unknown = []
+    for code, value, recorded_at in readings:
+        ref = refs.get(code)
+        if ref is None:
+            unknown.append(code)
+            continue
+        rows.append({
+            'sensor_id': ref.id,
+            'value': value,
+            'recorded_at': to_naive_utc(recorded_at) if recorded_at else now
+        })
+
+    return rows, sorted(set(unknown))
+
+
+# 数据被接收后的回调（实时缓存等内存消费者），在写库之前触发
+_ingest_listeners: List[Callable[[List[Dict]], None]] = []
+
+
+def add_ingest_listener(listener: Callable[[List[Dict]], None]) -> None:
+    """注册数据接收回调"""
+    if listener not in _ingest_listeners:
+        _ingest_listeners.append(listener)
+
+
+def notify_ingest(rows: List[Dict]) -> None:
+    """通知所有回调新接收的数据行，单个回调出错不影响写入"""
+    if not rows:
+        return
+    for listener in _ingest_listeners:
+        try:
+            listener(rows)
+        except Exception:
+            logger.exception("传感器数据回调处理失败: %r", listener)
+
+
+def write_readings(db: Session, rows: List[Dict]) -> int:
+    """
+    批量写入传感器数据
+    使用单条 executemany INSERT，在一个事务内完成，不逐行构造 ORM 对象；
+    分级汇总表在同一事务内增量更新
+    """
+    if not rows:
+        return 0
+    db.execute(insert(SensorData), rows)
+    apply_rollups(db, rows)
+    db.commit()
+    return len(rows)
+
+
+class IngestQueueFull(Exception):
+    """写入队列已满"""
+
+
+class IngestBufferStopped(Exception):
+    """写入队列已停止（服务关闭中），调用方应改为同步写入"""
+
+
+class IngestBuffer:
+    """
+    写后缓冲 (write-behind) 队列
+    汇集并发请求上报的数据，达到批量大小或刷新间隔时由后台线程分组提交，
+    多个请求共用一次事务提交，避免每个请求各自付出一次 fsync
+
+    接口已确认接收的数据不因一次提交失败而丢失：失败的批次按指数退避重试
+    （重试期间后续批次等待，保持提交顺序），重试 max_retries 次仍失败时转存死信表；
+    等待重试的行与队列中的行一并计入容量上限
+
+    stop() 之后 put() 抛出 IngestBufferStopped 而不再重新启动刷新线程，
+    避免关闭后接收的数据留在内存中随进程退出丢失
+    """
+
+    def __init__(self, max_size: int = 100000,
+                 batch_size: int = 5000,
+                 flush_interval: float = 0.5,
+                 max_retries: int = 3,
+                 retry_backoff: float = 0.5,
+                 session_factory: Callable[[], Session] = SessionLocal):
+        """
+        max_size: 队列容量上限，超出后触发背压
+        batch_size: 单次分组提交的最大行数
+        flush_interval: 最长刷新间隔（秒）
+        max_retries: 提交失败后的重试次数
+        retry_backoff: 首次重试等待时间（秒），之后每次加倍
+        """
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.session_factory = session_factory
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        # 提交失败、等待重试的批次: (数据行, 已失败次数, 下次重试时间)
+        self._retry: Optional[Tuple[List[Dict], int, float]] = None
+        # 已失败、尚未提交成功或转存死信表的行数（含正在重试的批次），计入容量
+        self._retry_rows = 0
+
+        # 统计计数（写入方线程与刷新线程都会更新，均在 self._cond 下修改）
+        self.enqueued_rows = 0
+        self.flushed_rows = 0
+        self.retried_rows = 0
+        self.dead_letter_rows = 0
+        self.failed_rows = 0
+        self.rejected_rows = 0
+        self.flush_count = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self) -> None:
+        """启动后台刷新线程（重复调用无副作用，stop() 之后可重新启动）"""
+        with self._cond:
+            self._stopping = False
+            self._ensure_thread()
+
+    def _ensure_thread(self) -> None:
+        """刷新线程未运行时启动（须持有 self._cond）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="sensor-ingest-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, rows: List[Dict], timeout: float = 0) -> None:
+        """
+        将数据行放入队列
+        timeout: 队列已满时最长阻塞等待时间（秒），为 0 时立即抛出 IngestQueueFull
+        已调用 stop() 时抛出 IngestBufferStopped
+        """
+        if not rows:
+            return
+        if len(rows) > self.max_size:
+            raise IngestQueueFull("单批数据超过队列容量")
+
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._stopping:
+                    raise IngestBufferStopped("写入队列已停止")
+                if len(self._queue) + self._retry_rows + len(rows) <= self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected_rows += len(rows)
+                    raise IngestQueueFull("写入队列已满")
+                self._cond.wait(remaining)
+
+            # 尚未调用 start() 时按需启动刷新线程
+            self._ensure_thread()
+
+            self._queue.extend(rows)
+            self.enqueued_rows += len(rows)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def stop(self, timeout: Optional[float] = 10) -> None:
+        """停止后台线程，退出前刷新队列中剩余的全部数据"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def _take_batch(self) -> List[Dict]:
+        count = min(len(self._queue), self.batch_size)
+        return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._retry is not None:
+                    # 先按退避时间重试失败的批次（停止时立即重试）
+                    batch, failures, retry_at = self._retry
+                    while not self._stopping:
+                        remaining = retry_at - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    self._retry = None
+                else:
+                    deadline = time.monotonic() + self.flush_interval
+                    while len(self._queue) < self.batch_size and not self._stopping:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+
+                    if self._stopping and not self._queue:
+                        return
+                    batch = self._take_batch()
+                    failures = 0
+                    # 腾出空间后唤醒被阻塞的写入方
+                    self._cond.notify_all()
+
+            if batch:
+                self._flush(batch, failures)
+
+    def _flush(self, batch: List[Dict], failures: int = 0) -> None:
+        started = time.perf_counter()
+        db = self.session_factory()
+        error = None
+        try:
+            write_readings(db, batch)
+        except Exception as e:
+            db.rollback()
+            error = e
+        finally:
+            db.close()
+
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._cond:
+            self.flush_count += 1
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self.total_flush_ms += elapsed
+            if error is None:
+                self.flushed_rows += len(batch)
+                if failures:
+                    self._retry_rows = 0
+                    self._cond.notify_all()
+                return
+
+            failures += 1
+            if failures <= self.max_retries:
+                delay = self.retry_backoff * 2 ** (failures - 1)
+                self._retry = (batch, failures, time.monotonic() + delay)
+                self._retry_rows = len(batch)
+                self.retried_rows += len(batch)
+            else:
+                # 转存死信表后不再占用内存中的容量
+                self._retry_rows = 0
+                self._cond.notify_all()
+        if failures <= self.max_retries:
+            logger.warning("传感器数据分组提交失败（第 %d 次），%d 条将在 %.1f 秒后重试: %s",
+                           failures, len(batch), delay, error)
+        else:
+            self._dead_letter(batch, failures, error)
+
+    def _dead_letter(self, batch: List[Dict], attempts: int, error: Exception) -> None:
+        """多次重试仍失败的批次转存死信表；死信表也无法写入时记录日志并丢弃"""
+        payload = json.dumps([
+            {'sensor_id': row['sensor_id'], 'value': row['value'],
+             'recorded_at': row['recorded_at'].isoformat()}
+            for row in batch
+        ])
+        db = self.session_factory()
+        try:
+            db.add(SensorDataDeadLetter(rows=payload, row_count=len(batch),
+                                        attempts=attempts, error=str(error)))
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._cond:
+                self.failed_rows += len(batch)
+            logger.exception("传感器数据分组提交失败 %d 次且无法转存死信表，丢弃 %d 条",
+                             attempts, len(batch))
+            return
+        finally:
+            db.close()
+
+        with self._cond:
+            self.dead_letter_rows += len(batch)
+        logger.error("传感器数据分组提交失败 %d 次，%d 条已转存死信表: %s", attempts, len(batch), error)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue),
+                'queue_capacity': self.max_size,
+                'retry_pending_rows': self._retry_rows,
+                'enqueued_rows': self.enqueued_rows,
+                'flushed_rows': self.flushed_rows,
+                'retried_rows': self.retried_rows,
+                'dead_letter_rows': self.dead_letter_rows,
+                'failed_rows': self.failed_rows,
+                'rejected_rows': self.rejected_rows,
+                'flush_count': self.flush_count,
+                'last_flush_ms': round(self.last_flush_ms, 2),
+                'max_flush_ms': round(self.max_flush_ms, 2),
+                'avg_flush_ms': round(self.total_flush_ms / self.flush_count, 2) if self.flush_count else 0.0
+            }
+
+
+# 创建全局实例
+sensor_cache = SensorIdCache()
+ingest_buffer = IngestBuffer(
+    max_size=settings.INGEST_QUEUE_SIZE,
+    batch_size=settings.INGEST_FLUSH_BATCH_SIZE,
+    flush_interval=settings.INGEST_FLUSH_INTERVAL,
+    max_retries=settings.INGEST_MAX_RETRIES,
+    retry_backoff=settings.INGEST_RETRY_BACKOFF
+)
@@ -0,0 +1,337 @@
+"""
+预测结果物化模块
+后台线程按计划（及数据变化时）预计算各作物的产量预测并写入 forecast_snapshots 表，
+接口直接返回最新快照；快照过期时先返回旧结果，再在后台重新计算 (stale-while-revalidate)。
+同一线程按计划（及数据变化时）启动地块级预测任务，结果写入 plot_forecasts 表
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.models import ForecastSnapshot
+from .forecast import ForecastService, forecast_service
+from .plot_forecast import PlotForecastRunner, plot_forecast_runner
+
+logger = logging.getLogger(__name__)
+
+# 预测接口支持的作物，其中有历史数据的作物才预计算
+DEFAULT_CROPS = ['水稻', '玉米', '蔬菜', '小麦']
+
+
+def _json_default(value):
+    # 预测结果中可能含有 NumPy 标量
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+class ForecastMaterializer:
+    """
+    预测结果物化器
+
+    快照保存在内存中供接口读取，并写入 forecast_snapshots 表（重启后立即可用）。
+    快照记录计算时的数据版本标识 (ForecastService.data_token)，
+    历史数据、调优参数或季节变化，或超过 ttl 后即视为过期
+    """
+
+    def __init__(self, service: ForecastService,
+                 periods: Iterable[int] = (3,),
+                 interval: float = 60.0,
+                 ttl: float = 900.0,
+                 plot_runner: Optional[PlotForecastRunner] = None,
+                 plot_interval: float = 3600.0,
+                 session_factory: Callable[[], Session] = SessionLocal):
+        """
+        periods: 定时预计算的预测期数
+        interval: 检查过期快照的间隔（秒）
+        ttl: 快照最长有效期（秒）
+        plot_runner: 地块级预测任务，为 None 时不调度
+        plot_interval: 定时启动地块级预测的间隔（秒），<= 0 时只在数据变化时启动
+        """
+        self.service = service
+        self.periods = list(periods)
+        self.interval = interval
+        self.ttl = ttl
+        self.plot_runner = plot_runner
+        self.plot_interval = plot_interval
+        self.session_factory = session_factory
+
+        # (作物, 预测期数) -> {'data', 'computed_at', 'token'}
+        self._snapshots: Dict[Tuple[str, int], Dict] = {}
+        self._pending: Set[Tuple[str, int]] = set()
+        self._plots_dirty = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        # 统计计数
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.plot_runs = 0
+        self.last_refresh_ms = 0.0
+
+    def start(self) -> None:
+        """启动后台刷新线程（重复调用无副作用）"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="forecast-materializer", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def load(self, db: Optional[Session] = None) -> int:
+        """
+        从 forecast_snapshots 表载入已有快照
+        载入的快照没有数据版本标识，首次读取即返回并触发后台重新计算
+        """
+        own = db is None
+        db = db or self.session_factory()
+        try:
+            rows = db.execute(select(ForecastSnapshot)).scalars().all()
+            loaded = {
+                (row.crop, row.periods): {
+                    'data': json.loads(row.payload),
+                    'computed_at': row.computed_at,
+                    'token': None
+                }
+                for row in rows
+            }
+        finally:
+            if own:
+                db.close()
+
+        with self._cond:
+            for key, snapshot in loaded.items():
+                self._snapshots.setdefault(key, snapshot)
+        return len(loaded)
+
+    def crops(self) -> List[str]:
+        """
+        需要预计算的作物: 预测接口支持且有历史数据的作物
+        （其他作物的快照不会被接口读取；没有历史数据的作物首次请求时按需计算）
+        """
+        available = set(self.service.history_crops())
+        return [crop for crop in DEFAULT_CROPS if crop in available]
+
+    def is_stale(self, crop: str, snapshot: Dict, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.utcnow()
+        if (now - snapshot['computed_at']).total_seconds() > self.ttl:
+            return True
+        return snapshot['token'] != self.service.data_token(crop)
+
+    def get(self, crop: str, periods: int) -> Optional[Dict]:
+        """
+        取快照，过期时加入后台刷新队列（仍返回旧快照）
+
+        Returns:
+            {'data', 'computed_at', 'stale'}，没有快照时返回 None
+        """
+        snapshot = self._snapshots.get((crop, periods))
+        if snapshot is None:
+            self.misses += 1
+            return None
+
+        stale = self.is_stale(crop, snapshot)
+        if stale:
+            self.stale_hits += 1
+            self.request_refresh([(crop, periods)])
+        else:
+            self.hits += 1
+        return {'data': snapshot['data'], 'computed_at': snapshot['computed_at'], 'stale': stale}
+
+    def put(self, crop: str, periods: int, data: Dict, token: str,
+            computed_at: Optional[datetime] = None) -> Dict:
+        """
+        保存一份计算结果（仅内存，按需计算的快照在下次刷新时写库）
+        返回与 get 相同格式的快照
+        """
+        snapshot = {'data': data, 'computed_at': computed_at or datetime.utcnow(), 'token': token}
+        with self._cond:
+            self._snapshots[(crop, periods)] = snapshot
+        return {'data': data, 'computed_at': snapshot['computed_at'], 'stale': False}
+
+    def request_refresh(self, keys: Iterable[Tuple[str, int]]) -> None:
+        """将 (作物, 预测期数) 加入后台刷新队列（已在队列中的不重复计算）"""
+        with self._cond:
+            before = len(self._pending)
+            self._pending.update(keys)
+            if len(self._pending) > before:
+                self._cond.notify_all()
+
+    def request_plot_refresh(self) -> None:
+        """请求后台线程重新运行地块级预测"""
+        if self.plot_runner is None:
+            return
+        with self._cond:
+            self._plots_dirty = True
+            self._cond.notify_all()
+
+    def refresh_stale(self) -> int:
+        """
+        将全部过期快照加入刷新队列并请求重算地块级预测（数据变化后调用），
+        返回加入的快照数量
+        """
+        now = datetime.utcnow()
+        keys = [key for key, snapshot in list(self._snapshots.items())
+                if self.is_stale(key[0], snapshot, now)]
+        self.request_refresh(keys)
+        self.request_plot_refresh()
+        return len(keys)
+
+    def refresh(self, keys: Iterable[Tuple[str, int]], db: Optional[Session] = None) -> int:
+        """
+        重新计算指定快照并写库
+        同一预测期数的作物在一次批量拟合中完成，返回计算的快照数
+        """
+        by_periods: Dict[int, List[str]] = {}
+        for crop, periods in keys:
+            by_periods.setdefault(periods, []).append(crop)
+
+        started = time.perf_counter()
+        rows = []
+        for periods, crops in by_periods.items():
+            # 先取版本标识：计算期间数据又有变化时，新快照仍被判定为过期
+            tokens = {crop: self.service.data_token(crop) for crop in crops}
+            computed_at = datetime.utcnow()
+            results = self.service.forecast_many(crops, periods)
+            for crop in crops:
+                self.put(crop, periods, results[crop], tokens[crop], computed_at)
+                rows.append({
+                    'crop': crop,
+                    'periods': periods,
+                    'payload': json.dumps(results[crop], ensure_ascii=False, default=_json_default),
+                    'computed_at': computed_at
+                })
+
+        if rows:
+            self._save(rows, db)
+        self.refreshed += len(rows)
+        self.last_refresh_ms = (time.perf_counter() - started) * 1000
+        return len(rows)
+
+    def _save(self, rows: List[Dict], db: Optional[Session] = None) -> None:
+        own = db is None
+        db = db or self.session_factory()
+        try:
+            stmt = sqlite_insert(ForecastSnapshot)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['crop', 'periods'],
+                set_={'payload': stmt.excluded.payload, 'computed_at': stmt.excluded.computed_at}
+            )
+            db.execute(stmt, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            if own:
+                db.close()
+
+    def _scheduled_keys(self) -> Set[Tuple[str, int]]:
+        """定时任务需要（重新）计算的快照：缺失或过期的计划快照 + 过期的按需快照"""
+        now = datetime.utcnow()
+        keys = {(crop, periods) for crop in self.crops() for periods in self.periods}
+        keys |= {key for key in self._snapshots if key[0] in DEFAULT_CROPS}
+        return {key for key in keys
+                if key not in self._snapshots or self.is_stale(key[0], self._snapshots[key], now)}
+
+    def _start_plot_run(self) -> bool:
+        """启动地块级预测任务，已在运行时返回 False"""
+        _, started = self.plot_runner.start()
+        if started:
+            self.plot_runs += 1
+        return started
+
+    def _run(self) -> None:
+        next_check = 0.0
+        next_plot_run = 0.0
+        plots_due = False
+        while True:
+            with self._cond:
+                while not self._pending and not self._plots_dirty and not self._stopping:
+                    remaining = next_check - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopping:
+                    return
+                keys = set(self._pending)
+                self._pending.clear()
+                plots_due = plots_due or self._plots_dirty
+                self._plots_dirty = False
+
+            try:
+                if time.monotonic() >= next_check:
+                    keys |= self._scheduled_keys()
+                    next_check = time.monotonic() + self.interval
+                    if self.plot_interval > 0 and time.monotonic() >= next_plot_run:
+                        plots_due = True
+                if keys:
+                    self.refresh(keys)
+            except Exception:
+                self.failed += len(keys)
+                logger.exception("预测结果预计算失败")
+
+            if plots_due and self.plot_runner is not None:
+                # 任务在自身线程中执行；已在运行时保留请求，下次检查时再启动
+                plots_due = not self._start_plot_run()
+                if not plots_due:
+                    next_plot_run = time.monotonic() + self.plot_interval
+
+    def stats(self) -> Dict:
+        return {
+            'snapshots': len(self._snapshots),
+            'pending': len(self._pending),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshed': self.refreshed,
+            'failed': self.failed,
+            'plot_runs': self.plot_runs,
+            'last_refresh_ms': round(self.last_refresh_ms, 2)
+        }
+
+
+def snapshot_info(snapshot: Dict, now: Optional[datetime] = None) -> Dict:
+    """接口返回的快照说明: 计算时间、已过时长、是否已过期（过期时已在后台刷新）"""
+    now = now or datetime.utcnow()
+    return {
+        'computed_at': snapshot['computed_at'].isoformat(),
+        'age_seconds': round((now - snapshot['computed_at']).total_seconds(), 1),
+        'stale': snapshot['stale']
+    }
+
+
+# 创建全局实例
+forecast_materializer = ForecastMaterializer(
+    forecast_service,
+    periods=settings.FORECAST_MATERIALIZE_PERIODS,
+    interval=settings.FORECAST_MATERIALIZE_INTERVAL,
+    ttl=settings.FORECAST_SNAPSHOT_TTL,
+    plot_runner=plot_forecast_runner,
+    plot_interval=settings.PLOT_FORECAST_INTERVAL
+)
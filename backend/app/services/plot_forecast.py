@@ -0,0 +1,325 @@
+"""
+地块级产量预测模块
+为每个地块当前种植中的种植记录建立月度产量序列（来自 yield_records），
+按模型配置分组、分块批量拟合与预测（可在进程池中并行），结果批量写入 plot_forecasts 表
+
+用法（在 backend 目录下）:
+    python -m app.services.plot_forecast --workers 4
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.models import CropRecord, PlotForecast, YieldRecord
+from .forecast import EnsembleForecaster, ForecastService, forecast_service
+
+# 单条 INSERT ... ON CONFLICT 语句写入的行数
+WRITE_BATCH_SIZE = 5000
+
+
+def month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1)
+
+
+def add_months(ts: datetime, months: int) -> datetime:
+    total = ts.year * 12 + ts.month - 1 + months
+    return datetime(total // 12, total % 12 + 1, 1)
+
+
+def build_plot_series(db: Session, min_points: int = 3,
+                      batch_size: int = 5000) -> Tuple[List[Dict], int]:
+    """
+    建立地块级月度产量序列
+
+    每个地块取最近种植的一条种植中记录，同月的多条产量观测合并为一期，
+    第一期到最后一期之间没有观测的月份按 0 补齐，保证序列各期连续（季节位置与预测期正确）。
+    产量观测按 (种植记录, 期) 顺序流式读取
+
+    Returns:
+        ([{'crop_record_id', 'plot_id', 'crop', 'last_period', 'values', 'filled'}],
+         观测期数不足而跳过的记录数)
+    """
+    records = db.execute(
+        select(CropRecord.id, CropRecord.plot_id, CropRecord.crop_name)
+        .where(CropRecord.status == "种植中", CropRecord.plot_id.isnot(None))
+        .order_by(CropRecord.plot_id, CropRecord.planting_date, CropRecord.id)
+    ).all()
+    # 同一地块有多条种植中记录时，后种植的覆盖先种植的
+    current = {plot_id: (record_id, crop) for record_id, plot_id, crop in records}
+    selected = {record_id: (plot_id, crop) for plot_id, (record_id, crop) in current.items()}
+
+    periods: Dict[int, Dict[datetime, float]] = {}
+    stmt = (
+        select(YieldRecord.crop_record_id, YieldRecord.period_start, YieldRecord.yield_value)
+        .join(CropRecord, CropRecord.id == YieldRecord.crop_record_id)
+        .where(CropRecord.status == "种植中")
+        .order_by(YieldRecord.crop_record_id, YieldRecord.period_start)
+    )
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        for record_id, period_start, value in rows:
+            if record_id not in selected:
+                continue
+            acc = periods.setdefault(record_id, {})
+            month = month_start(period_start)
+            acc[month] = acc.get(month, 0.0) + value
+
+    items = []
+    skipped = 0
+    for record_id, (plot_id, crop) in selected.items():
+        acc = periods.get(record_id, {})
+        if len(acc) < min_points:
+            skipped += 1
+            continue
+        first, last = next(iter(acc)), next(reversed(acc))
+        months = (last.year - first.year) * 12 + last.month - first.month + 1
+        values = [acc.get(add_months(first, m), 0.0) for m in range(months)]
+        items.append({
+            'crop_record_id': record_id,
+            'plot_id': plot_id,
+            'crop': crop,
+            'last_period': last,
+            'values': values,
+            'filled': months - len(acc)
+        })
+    return items, skipped
+
+
+def forecast_chunk(config: Dict, series: List[List[float]],
+                   horizon: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    一块序列一次批量拟合与预测（可在进程池中执行）
+    季节索引从各序列末尾之后的位置起算，返回 (预测值, 下限, 上限)，均为 (序列数 × horizon)
+    """
+    forecaster = EnsembleForecaster(**config)
+    forecaster.fit_batch(series)
+    lengths = np.array([len(s) for s in series])
+    forecasts = forecaster.component_forecasts_batch(
+        horizon, lengths % forecaster.seasonal_predictor.season_length
+    )
+    return forecasts['ensemble'], forecasts['lower'], forecasts['upper']
+
+
+def write_plot_forecasts(db: Session, rows: List[Dict],
+                         computed_at: Optional[datetime] = None) -> int:
+    """
+    按 (地块, 期) 批量写入预测结果，已有的期覆盖为本次结果
+    给出 computed_at 时删除此前各次计算留下、本次未覆盖的结果
+    （种植记录已结束、观测不足或已过去的期），返回删除的行数
+    """
+    for i in range(0, len(rows), WRITE_BATCH_SIZE):
+        stmt = sqlite_insert(PlotForecast)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['plot_id', 'period_start'],
+            set_={
+                'crop_record_id': excluded.crop_record_id,
+                'crop': excluded.crop,
+                'predicted_yield': excluded.predicted_yield,
+                'confidence_lower': excluded.confidence_lower,
+                'confidence_upper': excluded.confidence_upper,
+                'computed_at': excluded.computed_at
+            }
+        )
+        db.execute(stmt, rows[i:i + WRITE_BATCH_SIZE])
+    removed = 0
+    if computed_at is not None:
+        removed = db.execute(
+            delete(PlotForecast).where(PlotForecast.computed_at < computed_at)
+        ).rowcount
+    db.commit()
+    return removed
+
+
+def run_plot_forecasts(db: Session, service: ForecastService = forecast_service,
+                       horizon: int = 3, min_points: int = 3,
+                       workers: int = 1, chunk_size: int = 2000) -> Dict:
+    """
+    执行一次地块级预测并写库
+
+    Args:
+        horizon: 预测期数（月）
+        min_points: 参与预测的最少观测期数
+        workers: 进程数，<= 1 时在当前进程执行
+        chunk_size: 每个进程任务包含的序列数
+
+    Returns:
+        运行摘要字典
+    """
+    started = time.perf_counter()
+    items, skipped = build_plot_series(db, min_points)
+    loaded = time.perf_counter()
+
+    # 同一配置（按作物调优的参数）的序列才能共用一次批量拟合
+    configs: Dict[str, Dict] = {}
+    partitions: Dict[str, Tuple[Dict, List[Dict]]] = {}
+    for item in items:
+        if item['crop'] not in configs:
+            configs[item['crop']] = service.config_for(item['crop'])
+        config = configs[item['crop']]
+        key = json.dumps(config, sort_keys=True)
+        partitions.setdefault(key, (config, []))[1].append(item)
+
+    chunks = [
+        (config, group[i:i + chunk_size])
+        for config, group in partitions.values()
+        for i in range(0, len(group), chunk_size)
+    ]
+    tasks = [(config, [item['values'] for item in chunk], horizon) for config, chunk in chunks]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(forecast_chunk, *zip(*tasks)))
+    else:
+        parts = [forecast_chunk(*task) for task in tasks]
+    fitted = time.perf_counter()
+
+    computed_at = datetime.utcnow()
+    rows = []
+    for (_, chunk), (predicted, lower, upper) in zip(chunks, parts):
+        predicted, lower, upper = predicted.round(2), lower.round(2), upper.round(2)
+        for row, item in enumerate(chunk):
+            for step in range(horizon):
+                rows.append({
+                    'plot_id': item['plot_id'],
+                    'crop_record_id': item['crop_record_id'],
+                    'crop': item['crop'],
+                    'period_start': add_months(item['last_period'], step + 1),
+                    'predicted_yield': float(predicted[row, step]),
+                    'confidence_lower': float(lower[row, step]),
+                    'confidence_upper': float(upper[row, step]),
+                    'computed_at': computed_at
+                })
+    removed = write_plot_forecasts(db, rows, computed_at)
+
+    return {
+        'plots': len(items),
+        'skipped': skipped,
+        'gap_filled_periods': sum(item['filled'] for item in items),
+        'removed': removed,
+        'rows': len(rows),
+        'chunks': len(tasks),
+        'horizon': horizon,
+        'computed_at': computed_at.isoformat(),
+        'load_seconds': round(loaded - started, 3),
+        'fit_seconds': round(fitted - loaded, 3),
+        'write_seconds': round(time.perf_counter() - fitted, 3)
+    }
+
+
+def latest_plot_forecast(db: Session, plot_id: int) -> List[Dict]:
+    """
+    地块最近一次计算的各期预测结果（不重新计算），没有结果时返回空列表
+    只返回仍在种植中的种植记录的结果
+    """
+    latest = select(func.max(PlotForecast.computed_at)).where(
+        PlotForecast.plot_id == plot_id
+    ).scalar_subquery()
+    rows = db.execute(
+        select(PlotForecast)
+        .join(CropRecord, CropRecord.id == PlotForecast.crop_record_id)
+        .where(PlotForecast.plot_id == plot_id, PlotForecast.computed_at == latest,
+               CropRecord.status == "种植中")
+        .order_by(PlotForecast.period_start)
+    ).scalars().all()
+    return [
+        {
+            'crop_record_id': row.crop_record_id,
+            'crop': row.crop,
+            'period_start': row.period_start.strftime('%Y-%m'),
+            'predicted_yield': row.predicted_yield,
+            'confidence_lower': row.confidence_lower,
+            'confidence_upper': row.confidence_upper,
+            'computed_at': row.computed_at.isoformat()
+        }
+        for row in rows
+    ]
+
+
+class PlotForecastRunner:
+    """地块级预测任务，在后台线程中执行，同一时刻只运行一次"""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, **params):
+        self.session_factory = session_factory
+        self.params = params
+        self._lock = threading.Lock()
+        self.state = {
+            'status': 'idle',
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+
+    def start(self) -> Tuple[Dict, bool]:
+        """启动一次预测，已在运行时不重复启动，返回 (任务状态, 是否新启动)"""
+        with self._lock:
+            if self.state['status'] == 'running':
+                return dict(self.state), False
+            self.state = {
+                'status': 'running',
+                'started_at': datetime.utcnow().isoformat(),
+                'finished_at': None,
+                'result': None,
+                'error': None
+            }
+        threading.Thread(target=self._run, name="plot-forecast", daemon=True).start()
+        return dict(self.state), True
+
+    def _run(self) -> None:
+        db = self.session_factory()
+        try:
+            self.state['result'] = run_plot_forecasts(db, **self.params)
+            self.state['status'] = 'done'
+        except Exception as e:
+            db.rollback()
+            self.state['error'] = str(e)
+            self.state['status'] = 'failed'
+        finally:
+            db.close()
+        self.state['finished_at'] = datetime.utcnow().isoformat()
+
+    def status(self) -> Dict:
+        return dict(self.state)
+
+
+# 创建全局实例
+plot_forecast_runner = PlotForecastRunner(
+    horizon=settings.PLOT_FORECAST_PERIODS,
+    min_points=settings.PLOT_FORECAST_MIN_POINTS,
+    workers=settings.PLOT_FORECAST_WORKERS,
+    chunk_size=settings.PLOT_FORECAST_CHUNK_SIZE
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="地块级产量预测")
+    parser.add_argument('--horizon', type=int, default=settings.PLOT_FORECAST_PERIODS)
+    parser.add_argument('--min-points', type=int, default=settings.PLOT_FORECAST_MIN_POINTS)
+    parser.add_argument('--workers', type=int, default=settings.PLOT_FORECAST_WORKERS)
+    parser.add_argument('--chunk-size', type=int, default=settings.PLOT_FORECAST_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        summary = run_plot_forecasts(db, horizon=args.horizon, min_points=args.min_points,
+                                     workers=args.workers, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
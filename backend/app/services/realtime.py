@@ -0,0 +1,203 @@
+"""
+实时数据缓存模块
+为每个传感器维护定长环形缓冲区，实时数据与短时间窗口历史直接从内存读取
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.models import Sensor, SensorData
+from .ingest import SensorRef, sensor_cache, add_ingest_listener, to_naive_utc
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(ts: datetime) -> float:
+    """UTC 时间转换为秒级时间戳（带时区的时间先换算为 UTC）"""
+    return (to_naive_utc(ts) - EPOCH).total_seconds()
+
+
+class SensorRingBuffer:
+    """
+    定长环形缓冲区
+    以 NumPy 数组保存最近写入的 capacity 条 (时间戳, 数值)，写满后覆盖最早写入的数据；
+    各批数据可能乱序到达，另外记录时间戳最大的一条作为最新值
+    """
+
+    def __init__(self, capacity: int = 3600):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self._pos = 0       # 下一个写入位置
+        self._count = 0
+        self._latest: Optional[Tuple[float, float]] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def extend(self, times: np.ndarray, values: np.ndarray) -> None:
+        """追加一批数据（批内按时间升序）"""
+        n = len(values)
+        if n == 0:
+            return
+        i = int(np.argmax(times))
+        if self._latest is None or times[i] >= self._latest[0]:
+            self._latest = (float(times[i]), float(values[i]))
+        if n >= self.capacity:
+            times = times[-self.capacity:]
+            values = values[-self.capacity:]
+            n = self.capacity
+
+        idx = (self._pos + np.arange(n)) % self.capacity
+        self.times[idx] = times
+        self.values[idx] = values
+        self._pos = (self._pos + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        """时间戳最大的一条 (时间戳, 数值)（不一定是最后写入的一条）"""
+        return self._latest
+
+    def oldest_time(self) -> Optional[float]:
+        if self._count == 0:
+            return None
+        return self.times[(self._pos - self._count) % self.capacity]
+
+    def is_full(self) -> bool:
+        return self._count == self.capacity
+
+    def window(self, since: float) -> Tuple[np.ndarray, np.ndarray]:
+        """返回时间戳不早于 since 的数据（按时间升序）"""
+        if self._count == 0:
+            return np.empty(0), np.empty(0)
+        start = (self._pos - self._count) % self.capacity
+        idx = (start + np.arange(self._count)) % self.capacity
+        times = self.times[idx]
+        mask = times >= since
+        return times[mask], self.values[idx][mask]
+
+
+class RealtimeStore:
+    """按传感器主键组织的环形缓冲区集合"""
+
+    def __init__(self, capacity: int = 3600):
+        self.capacity = capacity
+        self._buffers: Dict[int, SensorRingBuffer] = {}
+        self._refs: Dict[int, SensorRef] = {}
+        self._lock = threading.Lock()
+
+    def record(self, rows: List[Dict]) -> None:
+        """写入一批已解析的数据行（作为数据接收回调注册）"""
+        grouped: Dict[int, List[Tuple[float, float]]] = {}
+        for row in rows:
+            grouped.setdefault(row['sensor_id'], []).append(
+                (to_epoch(row['recorded_at']), row['value'])
+            )
+
+        with self._lock:
+            for pk, points in grouped.items():
+                buffer = self._buffers.get(pk)
+                if buffer is None:
+                    ref = sensor_cache.get_by_pk(pk)
+                    if ref is None:
+                        continue
+                    buffer = self._buffers[pk] = SensorRingBuffer(self.capacity)
+                    self._refs[pk] = ref
+                points.sort()
+                arr = np.asarray(points, dtype=np.float64)
+                buffer.extend(arr[:, 0], arr[:, 1])
+
+    def forget(self, pk: int) -> None:
+        """传感器删除后丢弃其缓冲区"""
+        with self._lock:
+            self._buffers.pop(pk, None)
+            self._refs.pop(pk, None)
+
+    def latest_by_type(self) -> Dict[str, List[Tuple[SensorRef, float, float]]]:
+        """各类型传感器的最新值 {类型: [(传感器, 时间戳, 数值)]}，O(传感器数)"""
+        result: Dict[str, List[Tuple[SensorRef, float, float]]] = {}
+        with self._lock:
+            for pk, buffer in self._buffers.items():
+                latest = buffer.latest()
+                if latest is None:
+                    continue
+                ref = self._refs[pk]
+                result.setdefault(ref.type, []).append((ref, latest[0], latest[1]))
+        return result
+
+    def window_history(self, sensor_type: str, seconds: int = 3600,
+                       step: int = 60, now: datetime = None) -> Optional[List[Dict]]:
+        """
+        从缓冲区计算某类传感器最近 seconds 秒的分桶曲线
+        缓冲区未覆盖整个窗口时返回 None，由调用方回退到汇总表
+        """
+        now = to_epoch(now or datetime.utcnow())
+        start = (now // step) * step - step * (seconds // step - 1)
+
+        chunks_t, chunks_v = [], []
+        with self._lock:
+            for pk, buffer in self._buffers.items():
+                if self._refs[pk].type != sensor_type:
+                    continue
+                if buffer.is_full() and buffer.oldest_time() > start:
+                    return None
+                t, v = buffer.window(start)
+                chunks_t.append(t)
+                chunks_v.append(v)
+
+        if not chunks_t:
+            return None
+        times = np.concatenate(chunks_t)
+        values = np.concatenate(chunks_v)
+        if len(values) == 0:
+            return None
+
+        n_buckets = seconds // step
+        idx = np.clip(((times - start) // step).astype(np.int64), 0, n_buckets - 1)
+        counts = np.bincount(idx, minlength=n_buckets)
+        sums = np.bincount(idx, weights=values, minlength=n_buckets)
+        mins = np.full(n_buckets, np.inf)
+        maxs = np.full(n_buckets, -np.inf)
+        np.minimum.at(mins, idx, values)
+        np.maximum.at(maxs, idx, values)
+
+        data = []
+        for b in np.nonzero(counts)[0]:
+            data.append({
+                'timestamp': (EPOCH + timedelta(seconds=float(start + b * step))).isoformat(),
+                'value': round(sums[b] / counts[b], 2),
+                'min': round(mins[b], 2),
+                'max': round(maxs[b], 2),
+                'count': int(counts[b])
+            })
+        return data
+
+    def warm_from_db(self, db: Session) -> None:
+        """启动时从数据库加载每个传感器最近的数据"""
+        for sensor in db.query(Sensor).all():
+            rows = db.query(SensorData.recorded_at, SensorData.value).filter(
+                SensorData.sensor_id == sensor.id
+            ).order_by(SensorData.recorded_at.desc()).limit(self.capacity).all()
+            if not rows:
+                continue
+
+            ref = SensorRef(sensor.id, sensor.sensor_id, sensor.type, sensor.location)
+            buffer = SensorRingBuffer(self.capacity)
+            rows.reverse()
+            buffer.extend(
+                np.array([to_epoch(r.recorded_at) for r in rows]),
+                np.array([r.value for r in rows], dtype=np.float64)
+            )
+            with self._lock:
+                self._buffers[sensor.id] = buffer
+                self._refs[sensor.id] = ref
+
+
+# 创建全局实例
+realtime_store = RealtimeStore(capacity=settings.REALTIME_BUFFER_SIZE)
+add_ingest_listener(realtime_store.record)
@@ -0,0 +1,309 @@
+"""
+层级预测协调模块
+地块 → 作物 → 农场三级预测的协调：地块级预测（plot_forecasts 表）、
+作物级预测（ForecastService）与农场合计各自独立得到，合计关系并不成立；
+两级预测按预测期起始日对齐后，按自下而上、自上而下（按预测比例分摊）或 MinT (WLS) 方法得到各级一致的预测
+
+三级层级的求和矩阵 S 只由 "地块 -> 作物" 的分组向量表示，
+所有运算为分组求和 (np.bincount) 与 Sherman–Morrison 秩一修正，复杂度 O(地块数 × 期数)，
+不构造任何稠密矩阵
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models.models import PlotForecast
+from .forecast import ForecastService
+from .plot_forecast import add_months, month_start
+
+METHODS = ['bottom_up', 'top_down', 'mint']
+MINT_WEIGHTS = ['structural', 'variance']
+
+# 由 95% 区间宽度换算标准差
+Z_95 = 1.96
+
+# 地块预测之和与作物级预测之比超出 [1/该值, 该值] 时视为两级严重不一致
+INCOHERENCE_RATIO = 2.0
+
+
+def group_sum(groups: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """按分组求和: values 为 (n,) 或 (n × H)，返回 (n_groups,) 或 (n_groups × H)"""
+    if values.ndim == 1:
+        return np.bincount(groups, weights=values, minlength=n_groups)
+    return np.stack([np.bincount(groups, weights=values[:, h], minlength=n_groups)
+                     for h in range(values.shape[1])], axis=1)
+
+
+def bottom_up(leaf: np.ndarray, groups: np.ndarray,
+              n_groups: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """自下而上：地块预测不变，作物与农场为其合计"""
+    group = group_sum(groups, leaf, n_groups)
+    return leaf, group, group.sum(axis=0)
+
+
+def top_down(leaf: np.ndarray, groups: np.ndarray, n_groups: int,
+             top: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    自上而下：农场合计预测按各地块预测值的比例分摊（预测比例法）
+    某期地块预测合计为 0 时平均分摊
+    """
+    total = leaf.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(total > 0, leaf / total, 1.0 / len(leaf))
+    reconciled = share * top
+    return bottom_up(reconciled, groups, n_groups)
+
+
+def mint_wls(leaf: np.ndarray, groups: np.ndarray, group_base: np.ndarray, top: np.ndarray,
+             leaf_var: np.ndarray, group_var: np.ndarray,
+             top_var: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    MinT (WLS) 协调: b = (Sᵀ W⁻¹ S)⁻¹ Sᵀ W⁻¹ ŷ，各级预测 = S b，W 为对角方差矩阵
+
+    Sᵀ W⁻¹ S = diag(1/v_地块) + Σ_作物 (1/v_作物) 1_g 1_gᵀ + (1/v_农场) 1 1ᵀ，
+    前两项按作物分块，每块为对角阵加秩一矩阵；再加整体的秩一项。
+    两次 Sherman–Morrison 即可求解，方差均为 (节点 × 期) 数组，每期独立求解
+    """
+    n_groups = len(group_base)
+    a_group = 1.0 / group_var               # (K × H)
+    a_top = 1.0 / top_var                   # (H,)
+
+    # 右端项 Sᵀ W⁻¹ ŷ
+    rhs = leaf / leaf_var + (group_base * a_group)[groups] + (top * a_top)[None, :]
+
+    def solve_blocks(r: np.ndarray) -> np.ndarray:
+        # (D + Σ_g c_g 1_g 1_gᵀ)⁻¹ r，D⁻¹ = diag(v_地块)，逐作物块 Sherman–Morrison
+        dr = leaf_var * r
+        block_dr = group_sum(groups, dr, n_groups)
+        block_d = group_sum(groups, leaf_var, n_groups)
+        coef = a_group * block_dr / (1 + a_group * block_d)
+        return dr - leaf_var * coef[groups]
+
+    m_rhs = solve_blocks(rhs)
+    m_ones = solve_blocks(np.ones_like(rhs))
+    # 整体秩一项 (1/v_农场) 1 1ᵀ
+    coef = a_top * m_rhs.sum(axis=0) / (1 + a_top * m_ones.sum(axis=0))
+    reconciled = m_rhs - m_ones * coef[None, :]
+    return bottom_up(reconciled, groups, n_groups)
+
+
+def interval_variance(lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """由 95% 区间宽度近似预测方差（设下限，避免区间宽度为 0 的节点权重无穷大）"""
+    var = ((np.asarray(upper) - np.asarray(lower)) / (2 * Z_95)) ** 2
+    return np.maximum(var, 1e-6 * max(float(var.max(initial=0.0)), 1.0))
+
+
+def reconcile(leaf: np.ndarray, groups: np.ndarray, group_base: np.ndarray, top: np.ndarray,
+              method: str = 'mint', weights: str = 'variance',
+              leaf_var: Optional[np.ndarray] = None,
+              group_var: Optional[np.ndarray] = None,
+              top_var: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    协调三级预测
+
+    Args:
+        leaf: (地块数 × 期数) 地块级预测
+        groups: (地块数,) 各地块所属作物的编号 0..K-1
+        group_base: (K × 期数) 作物级预测
+        top: (期数,) 农场合计预测
+        method: bottom_up / top_down / mint
+        weights: mint 的方差权重 structural（按节点下的地块数）/ variance（各预测的方差）
+
+    Returns:
+        (地块, 作物, 农场) 协调后的预测，满足逐级求和关系
+    """
+    n_groups = len(group_base)
+    if method == 'bottom_up':
+        return bottom_up(leaf, groups, n_groups)
+    if method == 'top_down':
+        return top_down(leaf, groups, n_groups, top)
+    if method != 'mint':
+        raise ValueError(f"不支持的协调方法: {method}")
+
+    if weights == 'structural':
+        counts = np.bincount(groups, minlength=n_groups).astype(np.float64)
+        leaf_var = np.ones_like(leaf)
+        group_var = np.repeat(counts[:, None], leaf.shape[1], axis=1)
+        top_var = np.full(leaf.shape[1], float(len(leaf)))
+    elif weights != 'variance' or leaf_var is None or group_var is None or top_var is None:
+        raise ValueError(f"不支持的权重: {weights}")
+    return mint_wls(leaf, groups, group_base, top, leaf_var, group_var, top_var)
+
+
+def load_plot_forecasts(db: Session) -> Optional[Dict]:
+    """
+    读取最近一次地块级预测任务的结果（按地块、期排序）
+    没有结果时返回 None
+    """
+    latest = db.execute(select(func.max(PlotForecast.computed_at))).scalar()
+    if latest is None:
+        return None
+
+    rows = db.execute(
+        select(PlotForecast.plot_id, PlotForecast.crop, PlotForecast.period_start,
+               PlotForecast.predicted_yield, PlotForecast.confidence_lower,
+               PlotForecast.confidence_upper)
+        .where(PlotForecast.computed_at == latest)
+        .order_by(PlotForecast.plot_id, PlotForecast.period_start)
+    ).all()
+    return {'computed_at': latest, 'rows': rows}
+
+
+def align_plot_forecasts(rows: List, window: List[datetime]) -> Dict:
+    """
+    将地块级预测按预测期起始日对齐到 window 各期，排列为 (地块 × 期) 矩阵
+    未覆盖 window 全部各期的地块不参与协调（列入 excluded）
+    """
+    column = {period: j for j, period in enumerate(window)}
+    values: Dict[int, np.ndarray] = {}
+    covered: Dict[int, int] = {}
+    crops: Dict[int, str] = {}
+    for plot_id, crop, period_start, predicted, lower, upper in rows:
+        crops[plot_id] = crop
+        j = column.get(month_start(period_start))
+        if j is None:
+            continue
+        if plot_id not in values:
+            values[plot_id] = np.zeros((len(window), 3))
+            covered[plot_id] = 0
+        values[plot_id][j] = (predicted, lower, upper)
+        covered[plot_id] += 1
+
+    plot_ids = sorted(p for p in values if covered[p] == len(window))
+    excluded = sorted(set(crops) - set(plot_ids))
+    matrix = np.array([values[p] for p in plot_ids]).reshape(len(plot_ids), len(window), 3)
+    return {
+        'plot_ids': np.array(plot_ids, dtype=np.int64),
+        'crops': [crops[p] for p in plot_ids],
+        'excluded': excluded,
+        'predicted': matrix[:, :, 0],
+        'lower': matrix[:, :, 1],
+        'upper': matrix[:, :, 2]
+    }
+
+
+def coherence_ratio(plots_sum: np.ndarray, base: np.ndarray) -> np.ndarray:
+    """地块预测之和与作物级预测之比（作物级预测为 0 时记为 inf，两者均为 0 时为 1）"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(base > 0, plots_sum / base, np.where(plots_sum > 0, np.inf, 1.0))
+    return ratio
+
+
+def reconcile_forecasts(db: Session, service: ForecastService, periods: int = 3,
+                        method: str = 'mint', weights: str = 'variance',
+                        include_plots: bool = False) -> Optional[Dict]:
+    """
+    读取地块级预测，取各作物的作物级预测，农场合计预测取作物级预测之和，协调后返回各级结果
+
+    两级预测按预测期起始日对齐：作物级第 k 期为该作物历史数据最后一期之后第 k 个月，
+    地块级各期为 plot_forecasts 中的 period_start。只协调各作物与地块预测都覆盖的各期，
+    其余各期列入 dropped_periods；地块预测之和与作物级预测相差超过 INCOHERENCE_RATIO 倍的
+    作物标记为 incoherent 并给出警告。没有地块级预测时返回 None
+    """
+    plots = load_plot_forecasts(db)
+    if plots is None:
+        return None
+
+    crop_names = sorted({row[1] for row in plots['rows']})
+    crop_periods = {}
+    for crop in crop_names:
+        last = service.last_period(crop)
+        crop_periods[crop] = [add_months(last, k + 1) for k in range(periods)] if last else []
+    plot_periods = {month_start(row[2]) for row in plots['rows']}
+
+    window = set(plot_periods)
+    for crop in crop_names:
+        window &= set(crop_periods[crop])
+    window = sorted(window)
+
+    def months(values) -> List[str]:
+        return sorted({v.strftime('%Y-%m') for v in values})
+
+    result = {
+        'method': method,
+        'weights': weights if method == 'mint' else None,
+        'periods': len(window),
+        'period_starts': months(window),
+        'plot_forecasts_computed_at': plots['computed_at'].isoformat(),
+        'computed_at': datetime.utcnow().isoformat(),
+        'dropped_periods': {
+            'plots': months(plot_periods - set(window)),
+            'crops': {crop: months(set(crop_periods[crop]) - set(window)) for crop in crop_names}
+        },
+        'warnings': []
+    }
+    if not window:
+        result['warnings'].append("地块级预测与作物级预测没有共同的预测期，未进行协调")
+        result.update(farm=None, crops={}, excluded_plots=0)
+        return result
+
+    aligned = align_plot_forecasts(plots['rows'], window)
+    result['excluded_plots'] = len(aligned['excluded'])
+    if aligned['excluded']:
+        result['warnings'].append(f"{len(aligned['excluded'])} 个地块的预测未覆盖全部协调期，未参与协调")
+    crop_names = sorted(set(aligned['crops']))
+    if not crop_names:
+        result['warnings'].append("没有覆盖全部协调期的地块预测，未进行协调")
+        result.update(farm=None, crops={})
+        return result
+
+    crop_index = {crop: k for k, crop in enumerate(crop_names)}
+    groups = np.array([crop_index[c] for c in aligned['crops']], dtype=np.int64)
+    # 作物级结果按各期起始日取出与 window 对应的各期
+    offsets = [[crop_periods[crop].index(period) for period in window] for crop in crop_names]
+    crop_results = service.forecast_many(crop_names, periods)
+
+    def crop_matrix(field: str) -> np.ndarray:
+        return np.array([
+            [crop_results[crop]['predictions'][j][field] for j in offsets[k]]
+            for k, crop in enumerate(crop_names)
+        ], dtype=np.float64)
+
+    group_base = crop_matrix('predicted_yield')
+    group_lower = crop_matrix('confidence_lower')
+    group_upper = crop_matrix('confidence_upper')
+    top = group_base.sum(axis=0)
+
+    leaf_var = interval_variance(aligned['lower'], aligned['upper'])
+    group_var = interval_variance(group_lower, group_upper)
+    leaf, group, total = reconcile(
+        aligned['predicted'], groups, group_base, top, method, weights,
+        leaf_var=leaf_var, group_var=group_var, top_var=group_var.sum(axis=0)
+    )
+
+    def rounded(values: np.ndarray) -> List[float]:
+        return np.round(values, 2).tolist()
+
+    plots_sum = group_sum(groups, aligned['predicted'], len(crop_names))
+    ratio = coherence_ratio(plots_sum, group_base)
+    crops = {}
+    for k, crop in enumerate(crop_names):
+        incoherent = bool(np.any((ratio[k] > INCOHERENCE_RATIO) | (ratio[k] < 1 / INCOHERENCE_RATIO)))
+        if incoherent:
+            result['warnings'].append(f"{crop}: 地块预测之和与作物级预测严重不一致，协调结果仅供参考")
+        crops[crop] = {
+            'plots': int(np.sum(groups == k)),
+            'base': rounded(group_base[k]),
+            'plots_sum': rounded(plots_sum[k]),
+            'coherence_ratio': rounded(np.minimum(ratio[k], 1e6)),
+            'incoherent': incoherent,
+            'reconciled': rounded(group[k])
+        }
+    result['farm'] = {'base': rounded(top), 'reconciled': rounded(total)}
+    result['crops'] = crops
+    if include_plots:
+        result['plots'] = [
+            {
+                'plot_id': int(plot_id),
+                'crop': crop_names[groups[i]],
+                'base': rounded(aligned['predicted'][i]),
+                'reconciled': rounded(leaf[i])
+            }
+            for i, plot_id in enumerate(aligned['plot_ids'])
+        ]
+        result['excluded_plot_ids'] = aligned['excluded']
+    return result
@@ -0,0 +1,139 @@
+"""
+传感器数据汇总服务模块
+按 1m/1h/1d 粒度增量维护每个传感器的 min/max/mean/count/last
+"""
+
+from typing import Dict, List, Tuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models.models import Sensor, SensorRollup
+
+# 汇总粒度
+BUCKETS = {
+    '1m': timedelta(minutes=1),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1)
+}
+
+# 时间范围 -> (满足该范围的最粗粒度, 点数)
+RANGE_BUCKETS = {
+    '1h': ('1m', 60),
+    '24h': ('1h', 24),
+    '7d': ('1d', 7),
+    '30d': ('1d', 30)
+}
+
+
+def bucket_start(ts: datetime, bucket: str) -> datetime:
+    """将时间截断到所在汇总桶的起点"""
+    if bucket == '1m':
+        return ts.replace(second=0, microsecond=0)
+    if bucket == '1h':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def aggregate_rows(rows: List[Dict]) -> List[Dict]:
+    """先在内存中把一批数据按 (传感器, 粒度, 桶) 聚合，再整体写库"""
+    acc: Dict[Tuple[int, str, datetime], List] = {}
+
+    for row in rows:
+        value = row['value']
+        ts = row['recorded_at']
+        for bucket in BUCKETS:
+            key = (row['sensor_id'], bucket, bucket_start(ts, bucket))
+            agg = acc.get(key)
+            if agg is None:
+                acc[key] = [value, value, value, 1, value, ts]
+                continue
+            if value < agg[0]:
+                agg[0] = value
+            if value > agg[1]:
+                agg[1] = value
+            agg[2] += value
+            agg[3] += 1
+            if ts >= agg[5]:
+                agg[4] = value
+                agg[5] = ts
+
+    return [
+        {
+            'sensor_id': sensor_id,
+            'bucket': bucket,
+            'bucket_start': start,
+            'min_value': agg[0],
+            'max_value': agg[1],
+            'sum_value': agg[2],
+            'count': agg[3],
+            'last_value': agg[4],
+            'last_at': agg[5]
+        }
+        for (sensor_id, bucket, start), agg in acc.items()
+    ]
+
+
+def apply_rollups(db: Session, rows: List[Dict]) -> int:
+    """
+    将一批原始数据合并进汇总表（与原始数据写入处于同一事务，不提交）
+    使用 INSERT ... ON CONFLICT DO UPDATE 增量更新已有的桶
+    """
+    rollups = aggregate_rows(rows)
+    if not rollups:
+        return 0
+
+    stmt = sqlite_insert(SensorRollup)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['sensor_id', 'bucket', 'bucket_start'],
+        set_={
+            'min_value': func.min(SensorRollup.min_value, excluded.min_value),
+            'max_value': func.max(SensorRollup.max_value, excluded.max_value),
+            'sum_value': SensorRollup.sum_value + excluded.sum_value,
+            'count': SensorRollup.count + excluded.count,
+            'last_value': case(
+                (excluded.last_at >= SensorRollup.last_at, excluded.last_value),
+                else_=SensorRollup.last_value
+            ),
+            'last_at': func.max(SensorRollup.last_at, excluded.last_at)
+        }
+    )
+    db.execute(stmt, rollups)
+    return len(rollups)
+
+
+def query_history(db: Session, sensor_type: str, time_range: str,
+                  now: datetime = None) -> List[Dict]:
+    """
+    从汇总表读取某类传感器的历史曲线
+    按 time_range 选用最粗的可用粒度，30 天曲线只需读取 30 个桶
+    """
+    bucket, points = RANGE_BUCKETS.get(time_range, RANGE_BUCKETS['30d'])
+    now = now or datetime.utcnow()
+    start = bucket_start(now, bucket) - BUCKETS[bucket] * (points - 1)
+
+    rows = db.query(
+        SensorRollup.bucket_start,
+        func.min(SensorRollup.min_value),
+        func.max(SensorRollup.max_value),
+        func.sum(SensorRollup.sum_value),
+        func.sum(SensorRollup.count)
+    ).join(Sensor, Sensor.id == SensorRollup.sensor_id).filter(
+        Sensor.type == sensor_type,
+        SensorRollup.bucket == bucket,
+        SensorRollup.bucket_start >= start
+    ).group_by(SensorRollup.bucket_start).order_by(SensorRollup.bucket_start).all()
+
+    return [
+        {
+            'timestamp': ts.isoformat(),
+            'value': round(total / count, 2),
+            'min': round(low, 2),
+            'max': round(high, 2),
+            'count': count
+        }
+        for ts, low, high, total, count in rows if count
+    ]
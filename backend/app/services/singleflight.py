@@ -0,0 +1,66 @@
+"""
+并发请求合并模块 (single-flight)
+同一时刻键相同的多个请求只执行一次计算，其余请求等待并共享同一结果
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+def factors_key(factors: Optional[Dict[str, Optional[float]]]) -> Optional[tuple]:
+    """环境因素字典 -> 规范化的可哈希键（按名称排序，忽略未给出的项，数值统一为 float）"""
+    if not factors:
+        return None
+    return tuple(sorted((name, float(value)) for name, value in factors.items() if value is not None))
+
+
+class SingleFlight:
+    """
+    异步请求合并
+
+    首个请求将计算包装为任务登记在飞行表中，之后到达的相同键请求直接等待该任务；
+    任务完成即移出飞行表，之后的请求重新计算（不做结果缓存）。
+    等待方使用 asyncio.shield，发起请求的客户端断开不会取消其他请求共享的计算
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+        # 统计计数
+        self.calls = 0          # 全部调用次数
+        self.executions = 0     # 实际执行的计算次数
+        self.collapsed = 0      # 合并到已有计算上的调用次数
+        self.failures = 0       # 以异常结束的计算次数
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 fn() 或等待键相同的进行中计算，返回（共享的）结果"""
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.collapsed += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            self.failures += 1
+
+    def stats(self) -> Dict:
+        return {
+            'inflight': len(self._inflight),
+            'calls': self.calls,
+            'executions': self.executions,
+            'collapsed': self.collapsed,
+            'failures': self.failures,
+            'collapse_rate': round(self.collapsed / self.calls, 4) if self.calls else 0.0
+        }
+
+
+# 创建全局实例（预测路由共用）
+forecast_flights = SingleFlight()
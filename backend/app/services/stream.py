@@ -0,0 +1,122 @@
+"""
+实时数据推送模块
+单个 asyncio 分发中心将新接收的传感器数据推送给所有订阅者（SSE）
+"""
+
+import asyncio
+import threading
+from typing import Dict, List, Optional, Set
+
+from ..config import settings
+from .ingest import sensor_cache, add_ingest_listener
+
+
+class Subscriber:
+    """推送订阅者，队列有界，消费过慢时被分发中心断开"""
+
+    def __init__(self, queue_size: int,
+                 types: Optional[Set[str]] = None,
+                 locations: Optional[Set[str]] = None):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.types = types
+        self.locations = locations
+        self.dropped = False
+
+    def matches(self, event: Dict) -> bool:
+        if self.types and event['type'] not in self.types:
+            return False
+        if self.locations and event['location'] not in self.locations:
+            return False
+        return True
+
+
+class StreamHub:
+    """
+    推送分发中心
+    数据接收回调可能运行在线程池中，统一通过 call_soon_threadsafe 切回事件循环分发；
+    每次接收的一批数据作为一条消息，过滤后放入各订阅者队列，队列满的订阅者直接断开，
+    不会阻塞发布方
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: List[Subscriber] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.published_events = 0
+        self.delivered_messages = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self, types: Optional[Set[str]] = None,
+                  locations: Optional[Set[str]] = None) -> Subscriber:
+        """在事件循环中调用，创建订阅"""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self.queue_size, types, locations)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def publish(self, rows: List[Dict]) -> None:
+        """发布一批已解析的数据行（作为数据接收回调注册，线程安全）"""
+        loop = self._loop
+        if not self._subscribers or loop is None or loop.is_closed():
+            return
+
+        events = []
+        for row in rows:
+            ref = sensor_cache.get_by_pk(row['sensor_id'])
+            if ref is None:
+                continue
+            events.append({
+                'sensor_id': ref.sensor_id,
+                'type': ref.type,
+                'location': ref.location,
+                'value': row['value'],
+                'recorded_at': row['recorded_at'].isoformat()
+            })
+        if events:
+            loop.call_soon_threadsafe(self._fanout, events)
+
+    def _fanout(self, events: List[Dict]) -> None:
+        self.published_events += len(events)
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            matched = [e for e in events if subscriber.matches(e)]
+            if not matched:
+                continue
+            try:
+                subscriber.queue.put_nowait(matched)
+                self.delivered_messages += 1
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber) -> None:
+        """断开过慢的订阅者：清空其队列并放入结束标记"""
+        self.unsubscribe(subscriber)
+        subscriber.dropped = True
+        self.dropped_subscribers += 1
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def stats(self) -> Dict:
+        return {
+            'subscribers': len(self._subscribers),
+            'published_events': self.published_events,
+            'delivered_messages': self.delivered_messages,
+            'dropped_subscribers': self.dropped_subscribers
+        }
+
+
+# 创建全局实例
+stream_hub = StreamHub(queue_size=settings.STREAM_QUEUE_SIZE)
+add_ingest_listener(stream_hub.publish)
@@ -0,0 +1,230 @@
+"""
+预测模型参数调优模块
+按作物在样本外（滚动起点）误差上搜索移动平均窗口与 Holt 平滑系数，
+并拟合非负的集成权重，结果保存为 JSON 供预测服务启动时加载
+
+用法（在 backend 目录下）:
+    python -m app.services.tuning --crops 水稻,玉米,蔬菜 --horizon 3
+"""
+
+import argparse
+import itertools
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..config import settings
+from .backtest import make_folds
+from .forecast import EnsembleForecaster, MovingAveragePredictor, to_series_matrix
+
+# 默认搜索网格
+ALPHA_GRID = np.round(np.arange(0.05, 1.0, 0.05), 2).tolist()
+BETA_GRID = np.round(np.arange(0.0, 0.55, 0.05), 2).tolist()
+WINDOW_GRID = list(range(2, 13))
+
+# 参与权重拟合的子模型（多因素预测器依赖预测期的环境因素，保留原权重）
+WEIGHTED_COMPONENTS = ['moving_average', 'exponential_smoothing', 'seasonal']
+
+
+def holt_grid_errors(series: Sequence[float], alphas: np.ndarray, betas: np.ndarray,
+                     horizon: int, min_train: int) -> np.ndarray:
+    """
+    对一组 (alpha, beta) 同时执行 Holt 递推，返回每组参数的样本外 MAE
+
+    递推只遍历一次序列：处理到第 t 个点之前的状态即为在前 t 个点上拟合的结果，
+    在该状态上预测 t 之后的 horizon 期并与实际值比较（与 ExponentialSmoothingPredictor
+    的 fit/predict 规则一致）
+    """
+    values = np.asarray(series, dtype=np.float64)
+    n = len(values)
+    alphas = np.asarray(alphas, dtype=np.float64)
+    betas = np.asarray(betas, dtype=np.float64)
+
+    level = np.full(len(alphas), values[0])
+    trend = np.full(len(alphas), values[1] - values[0])
+    abs_sum = np.zeros(len(alphas))
+    count = 0
+
+    for t in range(1, n):
+        if t >= max(min_train, 2):
+            h = np.arange(1, min(horizon, n - t) + 1)
+            pred = np.maximum(0, level[:, None] + h[None, :] * trend[:, None])
+            abs_sum += np.abs(pred - values[t:t + len(h)]).sum(axis=1)
+            count += len(h)
+
+        new_level = alphas * values[t] + (1 - alphas) * (level + trend)
+        trend = betas * (new_level - level) + (1 - betas) * trend
+        level = new_level
+
+    return abs_sum / max(count, 1)
+
+
+def ma_window_errors(series: List[float], windows: Sequence[int],
+                     horizon: int, min_train: int) -> np.ndarray:
+    """各移动平均窗口的样本外 MAE，每个窗口在全部滚动折上批量预测"""
+    prefixes, actual, _ = make_folds(series, horizon, min_train)
+    matrix, lengths = to_series_matrix(prefixes)
+    observed = ~np.isnan(actual)
+
+    errors = np.zeros(len(windows))
+    for i, window in enumerate(windows):
+        predictor = MovingAveragePredictor(window=window)
+        predictor.fit_batch(matrix, lengths)
+        pred = predictor.predict_batch(horizon)
+        errors[i] = np.abs(pred - actual)[observed].mean()
+    return errors
+
+
+def nnls(A: np.ndarray, b: np.ndarray, total: Optional[float] = None) -> np.ndarray:
+    """
+    非负最小二乘 min ||A w - b||, w >= 0（可选约束 sum(w) = total）
+
+    子模型只有几个，直接枚举所有支撑集：在每个支撑集上解（等式约束的）最小二乘，
+    取可行解中残差最小者即为最优解
+    """
+    k = A.shape[1]
+    # 统一缩放，避免产量量级导致 KKT 方程组病态（不改变最优解）
+    scale = float(np.abs(A).max()) or 1.0
+    A, b = A / scale, b / scale
+
+    best, best_loss = np.zeros(k), np.inf
+    if total is not None and k:
+        best = np.full(k, total / k)
+        best_loss = float(np.sum((A @ best - b) ** 2))
+
+    for size in range(1, k + 1):
+        for support in itertools.combinations(range(k), size):
+            cols = list(support)
+            sub = A[:, cols]
+            if total is None:
+                w_sub = np.linalg.lstsq(sub, b, rcond=None)[0]
+            else:
+                # KKT 方程组: [2AᵀA 1; 1ᵀ 0] [w; λ] = [2Aᵀb; total]
+                kkt = np.zeros((size + 1, size + 1))
+                kkt[:size, :size] = 2 * sub.T @ sub
+                kkt[:size, size] = 1
+                kkt[size, :size] = 1
+                rhs = np.append(2 * sub.T @ b, total)
+                w_sub = np.linalg.lstsq(kkt, rhs, rcond=None)[0][:size]
+            if np.any(w_sub < -1e-12):
+                continue
+
+            w = np.zeros(k)
+            w[cols] = np.maximum(w_sub, 0)
+            loss = float(np.sum((A @ w - b) ** 2))
+            if loss < best_loss:
+                best, best_loss = w, loss
+
+    return best
+
+
+def _ensemble_errors(series: List[float], config: Dict, horizon: int, min_train: int):
+    """在全部滚动折上批量拟合集成模型，返回 (各子模型预测, 实际值, 观测掩码)"""
+    prefixes, actual, origins = make_folds(series, horizon, min_train)
+    forecaster = EnsembleForecaster(**config)
+    forecaster.fit_batch(prefixes)
+    season_length = forecaster.seasonal_predictor.season_length
+    forecasts = forecaster.component_forecasts_batch(horizon, origins % season_length)
+    return forecasts, actual, ~np.isnan(actual)
+
+
+def tune_series(series: List[float], horizon: int = 3, min_train: int = 6,
+                base_config: Optional[Dict] = None,
+                alphas: Sequence[float] = ALPHA_GRID, betas: Sequence[float] = BETA_GRID,
+                windows: Sequence[int] = WINDOW_GRID) -> Dict:
+    """
+    调优单条序列的模型参数
+
+    Returns:
+        {'ma_window', 'alpha', 'beta', 'weights', 'metrics'}
+    """
+    base_config = base_config or EnsembleForecaster().get_config()
+    min_train = max(2, min(min_train, len(series) - 1))
+    if len(series) < 3:
+        raise ValueError("序列过短，无法调优")
+
+    # Holt: 全部 (alpha, beta) 组合一次递推
+    grid_a, grid_b = np.meshgrid(np.asarray(alphas, dtype=np.float64),
+                                 np.asarray(betas, dtype=np.float64), indexing='ij')
+    holt_mae = holt_grid_errors(series, grid_a.ravel(), grid_b.ravel(), horizon, min_train)
+    best = int(np.argmin(holt_mae))
+    alpha, beta = float(grid_a.ravel()[best]), float(grid_b.ravel()[best])
+
+    ma_mae = ma_window_errors(series, windows, horizon, min_train)
+    window = int(windows[int(np.argmin(ma_mae))])
+
+    config = dict(base_config, ma_window=window, alpha=alpha, beta=beta)
+    forecasts, actual, observed = _ensemble_errors(series, config, horizon, min_train)
+    baseline, _, _ = _ensemble_errors(series, base_config, horizon, min_train)
+
+    # 非负权重，保持各权重之和不变（多因素预测器的份额不参与拟合）
+    weights = dict(base_config['weights'])
+    total = sum(weights[c] for c in WEIGHTED_COMPONENTS)
+    A = np.column_stack([forecasts[c][observed] for c in WEIGHTED_COMPONENTS])
+    fitted = nnls(A, actual[observed], total=total)
+    weights.update({c: round(float(w), 4) for c, w in zip(WEIGHTED_COMPONENTS, fitted)})
+
+    tuned_ensemble = A @ np.array([weights[c] for c in WEIGHTED_COMPONENTS])
+    return {
+        'ma_window': window,
+        'alpha': alpha,
+        'beta': beta,
+        'weights': weights,
+        'metrics': {
+            'folds': int(observed.any(axis=1).sum()),
+            'baseline_mae': round(float(np.abs(baseline['ensemble'] - actual)[observed].mean()), 2),
+            'tuned_mae': round(float(np.abs(tuned_ensemble - actual[observed]).mean()), 2),
+            'holt_mae': round(float(holt_mae[best]), 2),
+            'ma_mae': round(float(ma_mae.min()), 2)
+        }
+    }
+
+
+def tune_crops(series_by_crop: Dict[str, List[float]], horizon: int = 3, min_train: int = 6,
+               base_config: Optional[Dict] = None) -> Dict[str, Dict]:
+    """按作物分别调优，序列过短的作物跳过"""
+    results = {}
+    for crop, series in series_by_crop.items():
+        try:
+            results[crop] = tune_series(series, horizon, min_train, base_config)
+        except ValueError:
+            continue
+    return results
+
+
+def save_tuned_params(results: Dict[str, Dict], path: str, horizon: int) -> None:
+    """保存调优结果（先写临时文件再替换，避免读到半个文件）"""
+    payload = {
+        'updated_at': datetime.now().isoformat(),
+        'horizon': horizon,
+        'crops': results
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按作物调优预测模型参数")
+    parser.add_argument('--crops', default='水稻,玉米,蔬菜,小麦')
+    parser.add_argument('--horizon', type=int, default=3)
+    parser.add_argument('--min-train', type=int, default=6)
+    parser.add_argument('--output', default=settings.FORECAST_TUNED_PARAMS_PATH)
+    args = parser.parse_args()
+
+    from .forecast import forecast_service
+    series = forecast_service.yield_series(args.crops.split(','))
+    results = tune_crops(series, args.horizon, args.min_train,
+                         forecast_service.forecaster.get_config())
+    save_tuned_params(results, args.output, args.horizon)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
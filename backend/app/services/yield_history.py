@@ -0,0 +1,181 @@
+"""
+产量历史加载模块
+从 yield_records 表按期流式读取产量观测，同一作物同一期的多条观测（各地块）合并为一期
+（产量求和、环境因素取平均），装入预测服务的历史数据存储；
+记录已加载的最大主键（高水位），刷新时只读取其后新增的行
+"""
+
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.models import YieldRecord
+from .forecast import ForecastService, forecast_service
+from .history import FACTOR_COLUMNS, HistoricalStore
+
+# 按 (作物, 期) 汇总：产量求和，环境因素取平均（忽略缺失值），附带该期的最大主键
+_AGGREGATES = (
+    YieldRecord.crop,
+    YieldRecord.period_start,
+    func.sum(YieldRecord.yield_value).label('yield_value'),
+    *(func.avg(getattr(YieldRecord, name)).label(name) for name in FACTOR_COLUMNS),
+    func.max(YieldRecord.id).label('id')
+)
+
+# 增量加载时按 (作物, 期) 重新汇总，单条查询的期数上限
+_PERIOD_BATCH_SIZE = 500
+
+
+def row_to_record(row) -> Dict:
+    """汇总行 -> 预测服务使用的记录字典（缺失的环境因素不出现在字典中）"""
+    record = {'date': row.period_start, 'crop': row.crop, 'yield': row.yield_value}
+    for name in FACTOR_COLUMNS:
+        value = getattr(row, name)
+        if value is not None:
+            record[name] = value
+    return record
+
+
+class YieldHistoryLoader:
+    """产量历史加载器"""
+
+    def __init__(self, service: ForecastService,
+                 session_factory: Callable[[], Session] = SessionLocal,
+                 batch_size: int = 5000):
+        self.service = service
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.high_water_mark = 0        # 已加载的最大 yield_records.id
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.full_loads = 0
+        self.incremental_loads = 0
+        self.rows_loaded = 0
+
+    def _stream(self, db: Session) -> Iterator[List]:
+        """按期汇总后分批读取，结果集由游标流式返回，不一次性载入内存"""
+        stmt = (
+            select(*_AGGREGATES)
+            .group_by(YieldRecord.period_start, YieldRecord.crop)
+            .order_by(YieldRecord.period_start, YieldRecord.crop)
+        )
+        result = db.execute(stmt.execution_options(yield_per=self.batch_size))
+        for partition in result.partitions():
+            yield partition
+
+    def _new_periods(self, db: Session, after_id: int) -> Tuple[Set[Tuple[str, datetime]], int, int]:
+        """高水位之后新增的行涉及的 (作物, 期)，返回 (期集合, 新增行数, 新的最大主键)"""
+        stmt = (
+            select(YieldRecord.crop, YieldRecord.period_start,
+                   func.count(YieldRecord.id), func.max(YieldRecord.id))
+            .where(YieldRecord.id > after_id)
+            .group_by(YieldRecord.crop, YieldRecord.period_start)
+        )
+        periods = set()
+        count = 0
+        high = after_id
+        for crop, period_start, rows, max_id in db.execute(stmt):
+            periods.add((crop, period_start))
+            count += rows
+            high = max(high, max_id)
+        return periods, count, high
+
+    def _aggregate(self, db: Session, periods: Iterable[Tuple[str, datetime]]) -> Iterator[List]:
+        """按 (作物, 期) 重新汇总全部观测（含此前已加载的行）"""
+        periods = sorted(periods, key=lambda p: (p[1], p[0]))
+        for i in range(0, len(periods), _PERIOD_BATCH_SIZE):
+            chunk = periods[i:i + _PERIOD_BATCH_SIZE]
+            stmt = (
+                select(*_AGGREGATES)
+                .where(tuple_(YieldRecord.crop, YieldRecord.period_start).in_(chunk))
+                .group_by(YieldRecord.period_start, YieldRecord.crop)
+                .order_by(YieldRecord.period_start, YieldRecord.crop)
+            )
+            yield db.execute(stmt).all()
+
+    def load_full(self, db: Optional[Session] = None) -> int:
+        """
+        全量加载，替换预测服务的历史数据
+        表为空时保持现有数据（模拟数据）不变，返回加载的观测行数
+        """
+        with self._lock:
+            own = db is None
+            db = db or self.session_factory()
+            try:
+                count = db.execute(select(func.count(YieldRecord.id))).scalar() or 0
+                store = HistoricalStore()
+                high = 0
+                for rows in self._stream(db):
+                    store.append(row_to_record(row) for row in rows)
+                    high = max(high, max(row.id for row in rows))
+            finally:
+                if own:
+                    db.close()
+
+            if count:
+                self.service.set_history(store)
+            self.high_water_mark = high
+            self.full_loads += 1
+            self.rows_loaded += count
+            return count
+
+    def load_incremental(self, db: Optional[Session] = None) -> Dict[str, int]:
+        """
+        只加载高水位之后新增的行，并增量更新已缓存的模型
+
+        新增行所在的 (作物, 期) 按全部观测重新汇总：已加载过的期修订为新的合计，
+        新的期追加到序列末尾
+        """
+        with self._lock:
+            own = db is None
+            db = db or self.session_factory()
+            result = {'mode': 'incremental', 'rows': 0, 'updated': 0, 'refit': 0, 'invalidated': 0}
+            try:
+                periods, count, high = self._new_periods(db, self.high_water_mark)
+                records, revisions = [], []
+                for rows in self._aggregate(db, periods):
+                    for row in rows:
+                        history = self.service.history.get(row.crop)
+                        known = history is not None and history.has_date(row.period_start)
+                        (revisions if known else records).append(row_to_record(row))
+            finally:
+                if own:
+                    db.close()
+
+            if records or revisions:
+                stats = self.service.ingest_observations(records, revisions)
+                for key, value in stats.items():
+                    result[key] += value
+            result['rows'] = count
+            result['periods'] = len(periods)
+            result['revised'] = len(revisions)
+            self.high_water_mark = high
+            self.incremental_loads += 1
+            self.rows_loaded += count
+            return result
+
+    def refresh(self, db: Optional[Session] = None) -> Dict:
+        """
+        尚未从表中加载过数据时全量加载（替换模拟数据），之后增量加载
+        """
+        if not self.high_water_mark:
+            return {'mode': 'full', 'rows': self.load_full(db)}
+        return self.load_incremental(db)
+
+    def stats(self) -> Dict:
+        return {
+            'high_water_mark': self.high_water_mark,
+            'full_loads': self.full_loads,
+            'incremental_loads': self.incremental_loads,
+            'rows_loaded': self.rows_loaded
+        }
+
+
+# 创建全局实例
+yield_loader = YieldHistoryLoader(forecast_service, batch_size=settings.YIELD_LOAD_BATCH_SIZE)
@@ -0,0 +1,56 @@
+"""
+bootstrap 预测区间基准
+
+按作物测量 EnsembleForecaster.predict 在 spread 与 bootstrap (1k / 10k 路径) 模式下的
+单次耗时，并给出区间宽度与首次计算样本内残差的开销。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_bootstrap_intervals.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.forecast import forecast_service  # noqa: E402
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    periods = 3
+    for crop in ('水稻', '玉米', '蔬菜'):
+        yields, factors = forecast_service._prepare(crop)
+        forecaster = forecast_service.forecaster.clone()
+        forecaster.fit(yields, factors)
+
+        residual_ms = timed(lambda: (setattr(forecaster, '_residuals', None),
+                                     forecaster.residuals()), 20)
+        forecaster.residuals()
+
+        spread_ms = timed(lambda: forecaster.predict(periods, current_season=5), 50)
+        print(f"{crop}: n={len(yields)} residuals {residual_ms:.2f}ms  spread {spread_ms:.3f}ms")
+
+        for n_paths in (1000, 10000):
+            ms = timed(lambda: forecaster.predict(
+                periods, current_season=5, interval_method='bootstrap', n_paths=n_paths
+            ), 20)
+            results = forecaster.predict(periods, current_season=5,
+                                         interval_method='bootstrap', n_paths=n_paths)
+            width = np.mean([r.confidence_interval[1] - r.confidence_interval[0] for r in results])
+            print(f"    bootstrap {n_paths:>6} paths: {ms:7.3f}ms  mean width {width:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
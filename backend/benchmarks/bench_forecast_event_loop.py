@@ -0,0 +1,91 @@
+"""
+预测负载下的事件循环延迟基准
+
+在并发预测请求压力下，测量事件循环的调度延迟（心跳协程的超时量），
+对比 inline / thread / process 三种执行模式。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_forecast_event_loop.py --concurrency 16 --points 3000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.forecast import ForecastService  # noqa: E402
+from app.services.forecast_executor import ForecastExecutor  # noqa: E402
+
+
+def build_history(points: int):
+    """生成较长的月度历史，使单次拟合足够耗时"""
+    rng = np.random.default_rng(0)
+    data = []
+    for crop, base in (('水稻', 2200), ('玉米', 1800), ('蔬菜', 800)):
+        for i in range(points):
+            data.append({
+                'date': f"{1000 + i // 12:04d}-{i % 12 + 1:02d}",
+                'crop': crop,
+                'yield': float(base * (1 + 0.3 * np.sin(i * np.pi / 6)) + rng.normal(0, 50))
+            })
+    return data
+
+
+async def heartbeat(samples, interval, stop):
+    """每 interval 秒唤醒一次，记录实际唤醒相对预期的延迟（毫秒）"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - started - interval) * 1000)
+
+
+async def run_mode(mode, history, concurrency, rounds, workers):
+    # 关闭模型缓存，每次请求都完整拟合
+    service = ForecastService(cache_size=0)
+    service.load_historical_data(history)
+    executor = ForecastExecutor(service, mode=mode, workers=workers, max_pending=concurrency)
+
+    samples = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(samples, 0.005, stop))
+
+    crops = ['水稻', '玉米', '蔬菜']
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*[
+            executor.forecast(crops[i % len(crops)], 3) for i in range(concurrency)
+        ])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await beat
+    executor.shutdown()
+
+    lag = np.array(samples) if samples else np.zeros(1)
+    print(f"{mode:>8}: {rounds * concurrency / elapsed:8.1f} forecasts/s  "
+          f"loop lag p50={np.percentile(lag, 50):7.2f}ms "
+          f"p99={np.percentile(lag, 99):7.2f}ms max={lag.max():7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--points', type=int, default=3000, help='每种作物的历史月数')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', default='inline,thread,process')
+    args = parser.parse_args()
+
+    history = build_history(args.points)
+    for mode in args.modes.split(','):
+        asyncio.run(run_mode(mode, history, args.concurrency, args.rounds, args.workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+地块级预测基准
+
+在临时 SQLite 库中生成 N 个地块（每个地块一条种植中记录、若干月产量观测），
+分别以单进程与多进程执行一次 run_plot_forecasts，给出读取、拟合与写库耗时。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_plot_forecast.py --plots 5000 --months 36 --workers 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_plot_forecast_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.models import CropRecord, Plot, YieldRecord  # noqa: E402
+from app.services.backtest import synthetic_series  # noqa: E402
+from app.services.plot_forecast import add_months, month_start, run_plot_forecasts  # noqa: E402
+
+
+def seed(plots: int, months: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    series = synthetic_series(plots, months)
+    start = add_months(month_start(datetime.utcnow()), -months)
+
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(Plot, [
+            {'id': i + 1, 'name': f'地块{i + 1}', 'area': 5, 'status': '种植中'} for i in range(plots)
+        ])
+        db.bulk_insert_mappings(CropRecord, [
+            {'id': i + 1, 'plot_id': i + 1, 'crop_name': crop, 'status': '种植中'}
+            for i, (crop, _) in enumerate(series)
+        ])
+        db.bulk_insert_mappings(YieldRecord, [
+            {'crop_record_id': i + 1, 'plot_id': i + 1, 'crop': crop,
+             'period_start': add_months(start, m), 'yield_value': value}
+            for i, (crop, values) in enumerate(series) for m, value in enumerate(values)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="地块级预测基准")
+    parser.add_argument('--plots', type=int, default=5000)
+    parser.add_argument('--months', type=int, default=36)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    seed(args.plots, args.months)
+    print(f"seeded {args.plots} plots × {args.months} months in {time.perf_counter() - started:.1f}s")
+
+    for workers in sorted({1, args.workers}):
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            summary = run_plot_forecasts(db, workers=workers, chunk_size=args.chunk_size)
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        print(f"workers={workers}: {elapsed:.2f}s  plots {summary['plots']}  rows {summary['rows']}  "
+              f"load {summary['load_seconds']}s  fit {summary['fit_seconds']}s  "
+              f"write {summary['write_seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
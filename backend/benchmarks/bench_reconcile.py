@@ -0,0 +1,70 @@
+"""
+层级预测协调基准
+
+在模拟的地块 → 作物 → 农场层级上测量三种协调方法的耗时（地块数 1 万 ~ 10 万），
+并在小规模层级上与稠密矩阵的 MinT 公式 S (SᵀW⁻¹S)⁻¹ SᵀW⁻¹ ŷ 对比误差。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_reconcile.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.reconcile import reconcile  # noqa: E402
+
+
+def hierarchy(n: int, n_groups: int, horizon: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    groups = rng.integers(0, n_groups, n)
+    groups[:n_groups] = np.arange(n_groups)
+    leaf = rng.uniform(50, 150, (n, horizon))
+    group_base = np.stack([leaf[groups == k].sum(axis=0) for k in range(n_groups)])
+    group_base *= rng.uniform(0.8, 1.2, (n_groups, 1))
+    top = group_base.sum(axis=0) * 1.05
+    leaf_var = rng.uniform(1, 10, (n, horizon))
+    group_var = rng.uniform(5, 50, (n_groups, horizon))
+    top_var = group_var.sum(axis=0)
+    return leaf, groups, group_base, top, leaf_var, group_var, top_var
+
+
+def dense_error(n: int = 200, n_groups: int = 6, horizon: int = 3) -> float:
+    leaf, groups, group_base, top, leaf_var, group_var, top_var = hierarchy(n, n_groups, horizon)
+    got = reconcile(leaf, groups, group_base, top, 'mint', 'variance', leaf_var, group_var, top_var)
+
+    S = np.vstack([np.ones((1, n)),
+                   (groups[None, :] == np.arange(n_groups)[:, None]).astype(float),
+                   np.eye(n)])
+    error = 0.0
+    for h in range(horizon):
+        w_inv = np.diag(1 / np.r_[top_var[h], group_var[:, h], leaf_var[:, h]])
+        y = np.r_[top[h], group_base[:, h], leaf[:, h]]
+        expected = S @ np.linalg.solve(S.T @ w_inv @ S, S.T @ w_inv @ y)
+        actual = np.r_[got[2][h], got[1][:, h], got[0][:, h]]
+        error = max(error, float(np.abs(expected - actual).max()))
+    return error
+
+
+def main():
+    print(f"dense MinT max abs error (200 plots): {dense_error():.2e}")
+    for n in (10000, 50000, 100000):
+        leaf, groups, group_base, top, leaf_var, group_var, top_var = hierarchy(n, 20, 3)
+        timings = []
+        for method, weights in (('bottom_up', None), ('top_down', None),
+                                ('mint', 'structural'), ('mint', 'variance')):
+            started = time.perf_counter()
+            plots, crops, farm = reconcile(leaf, groups, group_base, top, method, weights or 'variance',
+                                           leaf_var, group_var, top_var)
+            elapsed = (time.perf_counter() - started) * 1000
+            assert np.allclose(crops.sum(axis=0), farm)
+            timings.append(f"{method}{'/' + weights if weights else ''} {elapsed:6.1f}ms")
+        print(f"{n:>6} plots: " + "  ".join(timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+SeasonalPredictor.fit 基准
+
+在月度 (12)、周度 (52)、日度 (365) 周期上比较原逐窗口循环实现与向量化实现的耗时，
+二者的等价性由 tests/test_forecast.py 校验。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_seasonal_fit.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.forecast import SeasonalPredictor  # noqa: E402
+from tests.test_forecast import reference_fit  # noqa: E402
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+
+    for season_length, years in ((12, 20), (52, 10), (365, 10)):
+        n = season_length * years
+        t = np.arange(n)
+        data = list(1000 + 300 * np.sin(2 * np.pi * t / season_length) + rng.normal(0, 30, n))
+        predictor = SeasonalPredictor(season_length=season_length)
+        repeat = 20 if n < 1000 else 3
+        new_ms = timed(lambda: predictor.fit(data), repeat)
+        ref_ms = timed(lambda: reference_fit(data, season_length), repeat)
+        print(f"season_length={season_length:>3} n={n:>5}: "
+              f"reference {ref_ms:8.2f}ms  vectorized {new_ms:6.2f}ms  ({ref_ms / new_ms:5.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
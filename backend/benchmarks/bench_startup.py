@@ -0,0 +1,97 @@
+"""
+冷启动基准
+
+在全新的子进程中分别测量:
+  - import main 的耗时（导入阶段不应建表、生成模拟数据或拟合模型）
+  - 应用启动（lifespan）耗时
+  - 首次 / 第二次 /api/forecast/predict 请求延迟（关闭后台预热与预计算，首次请求包含按需初始化与拟合）
+
+每项取多次运行的最小值；给出阈值时超出即以非零状态退出，可放在 CI 中防止回退。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_startup.py --runs 5 --max-import-ms 1500 --max-first-request-ms 500
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中执行，结果以一行 JSON 输出
+PROBE = r'''
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.services.forecast import forecast_service
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    initialized_at_import = forecast_service._initialized
+    t0 = time.perf_counter()
+    first = client.get("/api/forecast/predict", params={"crop": "水稻", "periods": 3})
+    t1 = time.perf_counter()
+    client.get("/api/forecast/predict", params={"crop": "水稻", "periods": 3})
+    t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "lifespan_ms": (ready - imported) * 1000,
+    "first_request_ms": (t1 - t0) * 1000,
+    "second_request_ms": (t2 - t1) * 1000,
+    "status": first.status_code,
+    "initialized_before_request": initialized_at_import
+}))
+'''
+
+
+def run_probe(workdir: str) -> dict:
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+               FORECAST_WARMUP="false", FORECAST_MATERIALIZE="false")
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动与首次请求延迟基准")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-import-ms', type=float, default=None)
+    parser.add_argument('--max-first-request-ms', type=float, default=None)
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            runs.append(run_probe(workdir))
+
+    best = {key: min(r[key] for r in runs)
+            for key in ('import_ms', 'lifespan_ms', 'first_request_ms', 'second_request_ms')}
+    for key, value in best.items():
+        print(f"{key:>18}: {value:8.1f}ms")
+
+    failures = []
+    if any(r['status'] != 200 for r in runs):
+        failures.append("预测请求失败")
+    if any(r['initialized_before_request'] for r in runs):
+        failures.append("预测服务在首次请求前已初始化（导入或启动阶段不应加载数据）")
+    if args.max_import_ms is not None and best['import_ms'] > args.max_import_ms:
+        failures.append(f"导入耗时 {best['import_ms']:.1f}ms 超过 {args.max_import_ms}ms")
+    if args.max_first_request_ms is not None and best['first_request_ms'] > args.max_first_request_ms:
+        failures.append(
+            f"首次请求 {best['first_request_ms']:.1f}ms 超过 {args.max_first_request_ms}ms"
+        )
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,80 @@
+from contextlib import asynccontextmanager
+import logging
+import os
+import threading
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import os
 
 from app.config import settings
-from app.database import engine, Base
+from app.database import engine, Base, SessionLocal
 from app.api import sensors, plots, disease, analysis, forecast
+from app.services.ingest import ingest_buffer
+from app.services.realtime import realtime_store
+from app.services.alerts import alert_engine
+from app.services.forecast import forecast_service
+from app.services.forecast_executor import forecast_executor
+from app.services.yield_history import yield_loader
+from app.services.materialize import forecast_materializer
+from app.services.admission import AdmissionMiddleware, admission_controller
+
+logger = logging.getLogger(__name__)
+
+
+def warm_sensor_state():
+    # 从数据库预热实时数据缓冲区并加载告警规则
+    db = SessionLocal()
+    try:
+        realtime_store.warm_from_db(db)
+        alert_engine.load(db)
+    finally:
+        db.close()
+
+
+def warm_forecast_models():
+    # 后台预先拟合各作物模型，失败不影响服务（首次请求时按需拟合）
+    try:
+        forecast_service.warm_up()
+    except Exception:
+        logger.exception("预测模型预热失败")
+
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 创建数据库表与上传目录（在启动阶段而非导入时执行）
+    Base.metadata.create_all(bind=engine)
+    os.makedirs("uploads/disease", exist_ok=True)
+
+    ingest_buffer.start()
+    warm_sensor_state()
+    # 从 yield_records 表加载产量历史（表为空时首次预测使用模拟数据）
+    yield_loader.refresh()
+    if settings.FORECAST_WARMUP:
+        threading.Thread(target=warm_forecast_models, name="forecast-warmup", daemon=True).start()
+    if settings.FORECAST_MATERIALIZE:
+        # 先载入上次保存的预测快照，再由后台线程刷新
+        forecast_materializer.load()
+        forecast_materializer.start()
+
+    yield
+
+    forecast_materializer.stop()
+    # 退出前将写后队列中的数据全部落库
+    ingest_buffer.stop()
+    forecast_executor.shutdown()
 
-# 创建上传目录
-os.makedirs("uploads/disease", exist_ok=True)
 
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
-    description="智慧农业管理系统后端API"
+    description="智慧农业管理系统后端API",
+    lifespan=lifespan
 )
 
+# 准入控制：限制 CPU 密集接口的并发，过载时返回 503 而不拖慢其他接口
+# （先于 CORS 注册，503 响应同样带有 CORS 头）
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -49,6 +106,15 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/api/admission")
+def admission_stats():
+    """各路由类别的并发、排队与拒绝统计"""
+    return {
+        "success": True,
+        "data": admission_controller.stats()
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
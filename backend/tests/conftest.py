@@ -0,0 +1,49 @@
+"""
+测试公共配置
+数据库指向临时 SQLite 文件，关闭后台预热与预计算，避免测试之间互相影响
+"""
+
+import os
+import sys
+import tempfile
+
+WORKDIR = tempfile.mkdtemp(prefix="smart_agriculture_test_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ["FORECAST_WARMUP"] = "false"
+os.environ["FORECAST_MATERIALIZE"] = "false"
+os.environ["FORECAST_TUNED_PARAMS_PATH"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """每个测试使用全新的表"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """启用生命周期的测试客户端；传感器数据同步写库，便于断言"""
+    from fastapi.testclient import TestClient
+
+    import main
+    from app.config import settings
+    from app.services.ingest import sensor_cache
+    from app.services.realtime import realtime_store
+
+    monkeypatch.setattr(settings, 'INGEST_WRITE_BEHIND', False)
+    sensor_cache.invalidate()
+    for pk in list(realtime_store._buffers):
+        realtime_store.forget(pk)
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected, ConcurrencyLimiter
+
+
+async def hold(limiter, release: asyncio.Event, elapsed: float = 0.0):
+    await limiter.acquire()
+    try:
+        await release.wait()
+    finally:
+        limiter.release(elapsed)
+
+
+def test_queue_full_is_shed_and_waiters_admitted_in_order():
+    limiter = ConcurrencyLimiter('analytics', max_concurrent=1, max_queue=2, queue_timeout=5)
+    order = []
+
+    async def waiter(name):
+        await limiter.acquire()
+        order.append(name)
+        limiter.release(0.0)
+
+    async def main():
+        release = asyncio.Event()
+        running = asyncio.ensure_future(hold(limiter, release))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(waiter(n)) for n in ('a', 'b')]
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        assert rejected.value.reason == "等待队列已满"
+        assert rejected.value.retry_after >= 1
+
+        release.set()
+        await asyncio.gather(running, *waiters)
+
+    asyncio.run(main())
+    assert order == ['a', 'b']
+    stats = limiter.stats()
+    assert (stats['active'], stats['queue_depth']) == (0, 0)
+    assert (stats['admitted'], stats['queued'], stats['shed_queue_full']) == (3, 2, 1)
+    assert stats['max_queue_depth'] == 2
+
+
+def test_expected_wait_over_deadline_is_shed_without_queueing():
+    limiter = ConcurrencyLimiter('forecast', max_concurrent=2, max_queue=10, queue_timeout=1.0)
+    # 最近请求平均耗时 3 秒：排在第 1 位也要等 3 秒，超过 1 秒期限
+    limiter._avg_service = 3.0
+
+    async def main():
+        release = asyncio.Event()
+        running = [asyncio.ensure_future(hold(limiter, release, 3.0)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        release.set()
+        await asyncio.gather(*running)
+        return rejected.value
+
+    rejected = asyncio.run(main())
+    assert rejected.reason == "预计等待时间超过期限"
+    assert rejected.retry_after == 3
+    assert limiter.shed_deadline == 1 and limiter.queued == 0
+
+
+def test_queue_timeout_releases_position():
+    limiter = ConcurrencyLimiter('analytics', max_concurrent=1, max_queue=4, queue_timeout=0.02)
+
+    async def main():
+        release = asyncio.Event()
+        running = asyncio.ensure_future(hold(limiter, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        assert limiter.stats()['queue_depth'] == 0
+        release.set()
+        await running
+        # 超时者退出队列后，名额可被后来的请求直接取得
+        await limiter.acquire()
+        limiter.release(0.0)
+        return rejected.value
+
+    assert asyncio.run(main()).reason == "排队等待超时"
+    assert limiter.shed_timeout == 1
+    assert limiter.stats()['active'] == 0
+
+
+def test_controller_routes_only_controlled_paths():
+    analytics = ConcurrencyLimiter('analytics', 1, 1, 1.0)
+    forecast = ConcurrencyLimiter('forecast', 1, 1, 1.0)
+    controller = AdmissionController([analytics, forecast])
+
+    assert controller.limiter_for('GET', '/api/forecast/compare') is analytics
+    assert controller.limiter_for('POST', '/api/forecast/backtest') is analytics
+    assert controller.limiter_for('GET', '/api/forecast/backtest/abc') is None
+    assert controller.limiter_for('GET', '/api/forecast/predict') is forecast
+    assert controller.limiter_for('POST', '/api/sensors/data/batch') is None
+
+    controller.enabled = False
+    assert controller.limiter_for('GET', '/api/forecast/compare') is None
+
+
+def test_middleware_returns_503_with_retry_after_when_shed():
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+
+    from app.services.admission import AdmissionMiddleware
+
+    limiter = ConcurrencyLimiter('analytics', max_concurrent=1, max_queue=0, queue_timeout=1.0)
+    app = Starlette(routes=[Route('/api/forecast/compare', lambda request: PlainTextResponse('ok'))])
+    app.add_middleware(AdmissionMiddleware, controller=AdmissionController([limiter]))
+
+    with TestClient(app) as client:
+        assert client.get('/api/forecast/compare').text == 'ok'
+
+        limiter._active = limiter.max_concurrent     # 名额全部占用，队列长度为 0
+        response = client.get('/api/forecast/compare')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert '等待队列已满' in response.json()['detail']
+    assert limiter.shed_queue_full == 1
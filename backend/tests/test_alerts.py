@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+
+from app.models.models import AlertRule, Sensor
+from app.services import alerts
+from app.services.alerts import AlertEngine
+from app.services.ingest import sensor_cache
+
+
+@pytest.fixture
+def engine(db, monkeypatch):
+    db.add(Sensor(id=1, name='温度', sensor_id='S001', type='temperature', location='A'))
+    db.add(AlertRule(id=1, name='高温', sensor_type='temperature', condition='gt',
+                     threshold=30.0, enabled=True))
+    db.commit()
+    sensor_cache.invalidate()
+    sensor_cache.resolve(db, ['S001'])
+
+    clock = {'now': 1000.0}
+    monkeypatch.setattr(alerts.time, 'time', lambda: clock['now'])
+    engine = AlertEngine(hysteresis=0.1, cooldown=60)
+    engine.load(db)
+    engine.clock = clock
+    return engine
+
+
+def feed(engine, *values):
+    rows = [{'sensor_id': 1, 'value': v, 'recorded_at': datetime(2025, 6, 1)} for v in values]
+    return [(e['status'], e['value']) for e in engine.evaluate(rows)]
+
+
+def test_hysteresis_requires_value_to_clear_margin(engine):
+    assert feed(engine, 31.0) == [('firing', 31.0)]
+    # 阈值 30，迟滞 10%：回落到 27 以下才解除
+    assert feed(engine, 29.0, 28.0, 31.0) == []
+    assert feed(engine, 26.5) == [('resolved', 26.5)]
+    assert engine.active_alerts() == []
+
+
+def test_suppressed_trigger_does_not_emit_unpaired_resolved(engine):
+    assert feed(engine, 31.0, 20.0) == [('firing', 31.0), ('resolved', 20.0)]
+
+    engine.clock['now'] += 10
+    # 冷却期内再次越限：不触发，也不进入告警状态
+    assert feed(engine, 32.0) == []
+    assert engine.active_alerts() == []
+    assert feed(engine, 20.0) == []
+    assert engine.suppressed == 1
+
+    engine.clock['now'] += 60
+    assert feed(engine, 33.0) == [('firing', 33.0)]
+    assert feed(engine, 20.0) == [('resolved', 20.0)]
+    assert engine.fired == engine.resolved == 2
+
+
+def test_condition_held_through_cooldown_fires_after_it_ends(engine):
+    feed(engine, 31.0, 20.0)
+    engine.clock['now'] += 30
+    assert feed(engine, 35.0) == []
+    engine.clock['now'] += 31
+    assert feed(engine, 35.0) == [('firing', 35.0)]
@@ -0,0 +1,93 @@
+import numpy as np
+
+from app.services import backtest
+from app.services.backtest import make_folds, evaluate_chunk, run_backtest, synthetic_series
+from app.services.forecast import EnsembleForecaster
+
+# 集成只由三个子模型组成，常数前缀上各模型与集成都预测 10，区间宽度为 0
+FLAT_CONFIG = dict(EnsembleForecaster().get_config(), weights={
+    'moving_average': 0.5, 'exponential_smoothing': 0.25, 'seasonal': 0.25, 'multi_factor': 0.0
+})
+
+
+def without_timing(report):
+    return {k: v for k, v in report.items() if k != 'elapsed_seconds'}
+
+
+def test_make_folds_pads_actuals_past_series_end():
+    prefixes, actual, origins = make_folds([1.0, 2.0, 3.0, 4.0, 5.0], horizon=3, min_train=2)
+
+    assert prefixes == [[1.0, 2.0], [1.0, 2.0, 3.0], [1.0, 2.0, 3.0, 4.0]]
+    assert origins.tolist() == [2, 3, 4]
+    np.testing.assert_array_equal(actual, [
+        [3.0, 4.0, 5.0],
+        [4.0, 5.0, np.nan],
+        [5.0, np.nan, np.nan],
+    ])
+
+    prefixes, actual, origins = make_folds([1.0, 2.0, 3.0, 4.0, 5.0], horizon=2, min_train=1, step=2)
+    assert origins.tolist() == [1, 3]
+    assert make_folds([1.0, 2.0], horizon=2, min_train=3)[0] == []
+
+
+def test_metrics_match_hand_computed_values():
+    # 起点 3/4/5 的预测均为 10，实际值 [10,10] / [10,20] / [20,NaN]
+    report = run_backtest([('a', [10.0] * 5 + [20.0])], horizon=2, min_train=3, config=FLAT_CONFIG)
+    metrics = report['groups']['a']
+
+    assert metrics['folds'] == [3, 2]
+    for p in backtest.PREDICTORS:
+        assert metrics['mae'][p] == [round(10 / 3, 2), 5.0]
+        assert metrics['mape'][p] == [round(50 / 3, 2), 25.0]
+    assert metrics['coverage'] == [round(2 / 3, 4), 0.5]
+    assert report['overall'] == metrics
+
+
+def test_nan_padding_is_excluded_from_counts():
+    stats = evaluate_chunk([('a', [10.0] * 5 + [20.0])], horizon=3, min_train=3, step=1, config=FLAT_CONFIG)['a']
+
+    assert stats['count'].tolist() == [3, 2, 1]
+    # 第 3 步只有起点 3 有实际值 (20)，NaN 处不计入误差
+    assert stats['abs']['ensemble'].tolist() == [10.0, 10.0, 10.0]
+    assert stats['ape_count'].tolist() == [3, 2, 1]
+
+
+def test_zero_actuals_are_skipped_in_mape_only():
+    stats = evaluate_chunk([('a', [10.0] * 4 + [0.0])], horizon=1, min_train=4, step=1, config=FLAT_CONFIG)['a']
+    assert stats['count'].tolist() == [1]
+    assert stats['ape_count'].tolist() == [0]
+    assert stats['abs']['ensemble'].tolist() == [10.0]
+
+
+def test_parallel_report_matches_serial():
+    series = synthetic_series(12, 36, seed=5)
+    serial = run_backtest(series, horizon=3, min_train=12, workers=1, chunk_size=3)
+    parallel = run_backtest(series, horizon=3, min_train=12, workers=2, chunk_size=3)
+
+    assert without_timing(parallel) == without_timing(serial)
+    assert serial['series'] == 12
+
+
+def test_group_configs_partition_batch_fits(monkeypatch):
+    series = synthetic_series(4, 36, seed=9)
+    series = [('水稻', series[0][1]), ('玉米', series[1][1]), ('水稻', series[2][1]), ('小麦', series[3][1])]
+    tuned = dict(EnsembleForecaster().get_config(), ma_window=6)
+
+    calls = []
+    original = backtest.evaluate_chunk
+
+    def record(items, horizon, min_train, step, config):
+        calls.append((sorted({key for key, _ in items}), config['ma_window']))
+        return original(items, horizon, min_train, step, config)
+
+    monkeypatch.setattr(backtest, 'evaluate_chunk', record)
+    report = run_backtest(series, horizon=2, min_train=12, group_configs={'玉米': tuned})
+
+    # 调优配置的作物单独成批，其余作物共用默认配置
+    assert sorted(calls) == [(['小麦', '水稻'], 3), (['玉米'], 6)]
+    assert report['groups']['玉米']['config'] == tuned
+    assert 'config' not in report['groups']['水稻']
+
+    monkeypatch.setattr(backtest, 'evaluate_chunk', original)
+    alone = run_backtest([series[1]], horizon=2, min_train=12, config=tuned)
+    assert {k: v for k, v in report['groups']['玉米'].items() if k != 'config'} == alone['groups']['玉米']
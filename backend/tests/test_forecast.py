@@ -0,0 +1,299 @@
+import numpy as np
+import pytest
+
+from app.services.backtest import synthetic_series
+from app.services.forecast import (
+    EnsembleForecaster, MultiFactorPredictor, SeasonalPredictor, FACTOR_NAMES,
+    generate_mock_historical_data, to_series_matrix
+)
+
+
+def prefix_residuals(forecaster: EnsembleForecaster, data: np.ndarray, origins: np.ndarray) -> np.ndarray:
+    """参照实现：在每个前缀上批量拟合后取一步预测残差"""
+    probe = forecaster.clone()
+    probe.fit_batch([data[:t].tolist() for t in origins])
+    season_length = probe.seasonal_predictor.season_length
+    one_step = probe.component_forecasts_batch(1, origins % season_length)['ensemble'][:, 0]
+    residuals = data[origins] - one_step
+    return residuals - residuals.mean()
+
+
+@pytest.fixture
+def series():
+    return np.asarray(synthetic_series(1, 60, seed=3)[0][1], dtype=np.float64)
+
+
+def test_residuals_match_prefix_refits(series):
+    forecaster = EnsembleForecaster()
+    forecaster.fit(series.tolist())
+
+    expected = prefix_residuals(forecaster, series, np.arange(2, len(series)))
+    np.testing.assert_allclose(forecaster.residuals(max_origins=len(series)), expected, atol=1e-8)
+
+
+def test_residuals_are_capped_to_recent_origins(series):
+    forecaster = EnsembleForecaster()
+    forecaster.fit(series.tolist())
+
+    residuals = forecaster.residuals(max_origins=24)
+
+    assert len(residuals) == 24
+    raw = prefix_residuals(forecaster, series, np.arange(len(series) - 24, len(series)))
+    np.testing.assert_allclose(residuals, raw, atol=1e-8)
+
+
+def test_residuals_on_long_series_stay_bounded():
+    data = np.abs(np.random.default_rng(0).normal(1000, 100, 50000))
+    forecaster = EnsembleForecaster()
+    forecaster.fit(data.tolist())
+
+    residuals = forecaster.residuals(max_origins=240)
+
+    assert residuals.shape == (240,)
+    assert np.isfinite(residuals).all()
+
+
+def test_backtest_endpoint_reads_series_off_event_loop(client, monkeypatch):
+    import threading
+
+    from app.api import forecast as forecast_api
+    from app.services.forecast import forecast_service
+
+    seen = {}
+    original = forecast_service.yield_series
+
+    def yield_series(crops):
+        seen['thread'] = threading.current_thread().name
+        return original(crops)
+
+    def submit(series, **params):
+        seen['series'] = series
+        return {'job_id': 'test', 'status': 'running'}
+
+    monkeypatch.setattr(forecast_service, 'yield_series', yield_series)
+    monkeypatch.setattr(forecast_api.backtest_jobs, 'submit', submit)
+    monkeypatch.setattr(forecast_api.forecast_executor, 'mode', 'thread')
+
+    response = client.post('/api/forecast/backtest', json={'crops': ['水稻', '玉米']})
+    assert response.status_code == 200
+    assert [crop for crop, _ in seen['series']] == ['水稻', '玉米']
+    assert all(len(values) > 0 for _, values in seen['series'])
+    assert seen['thread'].startswith('forecast')
+
+
+FACTORS = {'temperature': 27.0, 'rainfall': 120.0, 'fertilizer': 55.0, 'soil_ph': 6.8, 'sunshine': 7.5}
+
+
+def values_of(results):
+    return [(r.predicted_value, r.confidence_interval, r.trend) for r in results]
+
+
+@pytest.mark.parametrize('current_factors', [None, FACTORS])
+def test_predict_batch_matches_scalar_fit(current_factors):
+    # 长度不同的序列：批量矩阵左侧补齐，结果应与逐条拟合一致
+    series = [values for _, values in synthetic_series(6, 48, seed=11)]
+    series = [values[:length] for values, length in zip(series, [48, 36, 25, 13, 7, 4])]
+
+    batch = EnsembleForecaster()
+    batch.fit_batch(series)
+    batched = batch.predict_batch(6, current_factors, current_season=5)
+
+    for values, results in zip(series, batched):
+        scalar = EnsembleForecaster()
+        scalar.fit(values)
+        expected = scalar.predict(6, current_factors, current_season=5)
+        assert values_of(results) == values_of(expected)
+
+
+def test_incremental_update_matches_full_fit(series):
+    split = 30
+    incremental = EnsembleForecaster()
+    incremental.fit(series[:split].tolist())
+    for value in series[split:]:
+        incremental.update([value])
+
+    full = EnsembleForecaster()
+    full.fit(series.tolist())
+
+    assert incremental.updates_since_refit == len(series) - split
+    for steps, season in [(1, 0), (6, 7)]:
+        np.testing.assert_allclose(incremental.ma_predictor.predict(steps), full.ma_predictor.predict(steps))
+        np.testing.assert_allclose(incremental.es_predictor.predict(steps), full.es_predictor.predict(steps))
+        np.testing.assert_allclose(incremental.seasonal_predictor.predict(steps, season),
+                                   full.seasonal_predictor.predict(steps, season))
+    assert values_of(incremental.predict(6)) == values_of(full.predict(6))
+
+
+def test_update_does_not_touch_copied_model(series):
+    model = EnsembleForecaster()
+    model.fit(series[:30].tolist())
+    before = values_of(model.predict(3))
+
+    updated = model.copy()
+    updated.update(series[30:40].tolist())
+
+    assert values_of(model.predict(3)) == before
+    assert len(model.history_data) == 30
+    assert len(updated.history_data) == 40
+
+
+def reference_fit(data, season_length):
+    """原季节性拟合实现（逐窗口 np.mean + Python 列表），作为等价性参照"""
+    if len(data) < season_length:
+        return [1.0] * season_length, (np.mean(data) if data else 0)
+
+    ma_values = []
+    half_period = season_length // 2
+    for i in range(half_period, len(data) - half_period):
+        window = data[i - half_period:i + half_period + 1]
+        ma_values.append(np.mean(window))
+
+    seasonal_ratios = [[] for _ in range(season_length)]
+    for i, ma in enumerate(ma_values):
+        actual_idx = i + half_period
+        if actual_idx < len(data):
+            season_idx = actual_idx % season_length
+            ratio = data[actual_idx] / ma if ma != 0 else 1
+            seasonal_ratios[season_idx].append(ratio)
+
+    seasonal_indices = []
+    for ratios in seasonal_ratios:
+        if ratios:
+            filtered = [r for r in ratios if 0.5 < r < 2.0]
+            seasonal_indices.append(np.mean(filtered) if filtered else 1.0)
+        else:
+            seasonal_indices.append(1.0)
+
+    avg_index = np.mean(seasonal_indices)
+    seasonal_indices = [idx / avg_index for idx in seasonal_indices]
+    avg_trend = np.mean(data) / avg_index if avg_index != 0 else np.mean(data)
+    return seasonal_indices, avg_trend
+
+
+def assert_seasonal_fit_matches(data, season_length):
+    predictor = SeasonalPredictor(season_length=season_length)
+    predictor.fit(data)
+    indices, avg_trend = reference_fit(data, season_length)
+    np.testing.assert_allclose(predictor.seasonal_indices, indices, rtol=1e-9)
+    assert np.isclose(predictor.avg_trend, avg_trend, rtol=1e-9)
+
+
+@pytest.mark.parametrize('crop', ['水稻', '玉米', '蔬菜', '小麦'])
+def test_seasonal_fit_matches_reference_on_mock_history(crop):
+    history = generate_mock_historical_data()
+    assert_seasonal_fit_matches([d['yield'] for d in history if d['crop'] == crop], 12)
+
+
+@pytest.mark.parametrize('season_length', [4, 12, 52, 365])
+@pytest.mark.parametrize('extra', ['empty', 'single', 'short', 'exact', 'plus_one', 'several'])
+def test_seasonal_fit_matches_reference(season_length, extra):
+    # 覆盖不足一个周期、恰好一个周期和多个周期的情况
+    n = {'empty': 0, 'single': 1, 'short': season_length - 1, 'exact': season_length,
+         'plus_one': season_length + 1, 'several': 3 * season_length + 5}[extra]
+    rng = np.random.default_rng(season_length * 100 + n)
+    data = list(rng.uniform(100, 2000, size=n) * (1 + 0.5 * np.sin(np.arange(n))))
+    assert_seasonal_fit_matches(data, season_length)
+
+
+def test_seasonal_fit_handles_zero_windows():
+    data = [0.0] * 12 + [100.0, 0.0, 200.0] * 8
+    assert_seasonal_fit_matches(data, 12)
+
+
+def factor_series(seed: int, lengths):
+    """长度不一的产量序列与对应的 (长度 × 5) 因素矩阵，产量与因素线性相关并带噪声"""
+    rng = np.random.default_rng(seed)
+    center = np.array([25.0, 150.0, 50.0, 6.5, 8.0])
+    spread = np.array([4.0, 40.0, 12.0, 0.5, 1.5])
+    true_coefficients = np.array([40.0, 0.8, 6.0, -90.0, 25.0])
+    series, factors = [], []
+    for n in lengths:
+        X = center + spread * rng.standard_normal((n, 5))
+        y = 800 + X @ true_coefficients + rng.normal(0, 20, n)
+        series.append(y.tolist())
+        factors.append(X)
+    return series, factors
+
+
+def factor_tensor_for(series, factors):
+    matrix, lengths = to_series_matrix(series)
+    tensor = np.full(matrix.shape + (len(FACTOR_NAMES),), np.nan)
+    for i, X in enumerate(factors):
+        tensor[i, matrix.shape[1] - len(X):] = X
+    return matrix, lengths, tensor
+
+
+@pytest.mark.parametrize('ridge', [0.0, 2.5])
+def test_batched_least_squares_matches_per_series_fit(ridge):
+    series, factors = factor_series(1, [40, 24, 12, 7])
+    matrix, lengths, tensor = factor_tensor_for(series, factors)
+
+    batch = MultiFactorPredictor(solver='lstsq', ridge=ridge)
+    batch.fit_batch(matrix, lengths, tensor)
+
+    for i, (y, X) in enumerate(zip(series, factors)):
+        scalar = MultiFactorPredictor(solver='lstsq', ridge=ridge)
+        scalar.fit(y, X)
+        np.testing.assert_allclose(batch.batch_coefficients[i],
+                                   [scalar.coefficients[name] for name in FACTOR_NAMES], rtol=1e-7)
+        assert np.isclose(batch.batch_intercept[i], scalar.intercept, rtol=1e-7)
+        np.testing.assert_allclose(batch.batch_factor_means[i], X.mean(axis=0))
+
+
+def test_unpenalized_fit_is_ordinary_least_squares():
+    [y], [X] = factor_series(2, [30])
+    predictor = MultiFactorPredictor(solver='lstsq')
+    predictor.fit(y, X)
+
+    beta, *_ = np.linalg.lstsq(np.column_stack([np.ones(len(y)), X]), y, rcond=None)
+    assert np.isclose(predictor.intercept, beta[0], rtol=1e-7)
+    np.testing.assert_allclose([predictor.coefficients[name] for name in FACTOR_NAMES], beta[1:], rtol=1e-7)
+
+
+def test_ridge_shrinks_standardized_coefficients():
+    [y], [X] = factor_series(3, [20])
+    Z = (X - X.mean(axis=0)) / X.std(axis=0)
+    ridge = 5.0
+    # 截距不惩罚：标准化后的系数为 (ZᵀZ + λI)⁻¹ Zᵀ(y - ȳ)
+    expected = np.linalg.solve(Z.T @ Z + ridge * np.eye(5), Z.T @ (np.asarray(y) - np.mean(y)))
+
+    predictor = MultiFactorPredictor(solver='lstsq', ridge=ridge)
+    predictor.fit(y, X)
+    coefficients = np.array([predictor.coefficients[name] for name in FACTOR_NAMES])
+    np.testing.assert_allclose(coefficients * X.std(axis=0), expected, rtol=1e-7)
+
+    unpenalized = MultiFactorPredictor(solver='lstsq')
+    unpenalized.fit(y, X)
+    ols = np.array([unpenalized.coefficients[name] for name in FACTOR_NAMES]) * X.std(axis=0)
+    assert np.linalg.norm(expected) < np.linalg.norm(ols)
+
+
+def test_batch_series_with_one_record_keeps_heuristic_mode():
+    series, factors = factor_series(4, [12, 1])
+    matrix, lengths, tensor = factor_tensor_for(series, factors)
+    batch = MultiFactorPredictor(solver='lstsq')
+    batch.fit_batch(matrix, lengths, tensor)
+
+    assert not np.isnan(batch.batch_intercept[0])
+    assert np.isnan(batch.batch_intercept[1])
+
+
+@pytest.mark.parametrize('solver', ['heuristic', 'lstsq'])
+def test_predict_scenarios_rows_match_scalar_predict(solver):
+    [y], [X] = factor_series(5, [36])
+    predictor = MultiFactorPredictor(solver=solver, ridge=1.0)
+    predictor.fit(y, X)
+
+    rng = np.random.default_rng(6)
+    scenarios = np.column_stack([
+        rng.uniform(5, 40, 50), rng.uniform(0, 400, 50), rng.uniform(0, 120, 50),
+        rng.uniform(4.5, 8.5, 50), rng.uniform(0, 14, 50)
+    ])
+    trend = np.array([0.0, 0.04, -0.03])
+    scored = predictor.predict_scenarios(scenarios, trend)
+
+    assert scored.shape == (50, 3)
+    for row, scenario in zip(scored, scenarios):
+        current = dict(zip(FACTOR_NAMES, scenario.tolist()))
+        expected = [predictor.predict(current, t)[0] for t in trend]
+        np.testing.assert_allclose(row, expected, rtol=1e-10, atol=1e-9)
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.forecast import ForecastService
+from app.services.forecast_executor import ForecastExecutor, ForecastQueueFull, forecast_executor
+
+
+@pytest.fixture
+def process_executor():
+    executor = ForecastExecutor(ForecastService(), mode='process', workers=1)
+    yield executor
+    executor.shutdown()
+
+
+def test_process_mode_prepares_inputs_off_event_loop(process_executor, monkeypatch):
+    service = process_executor.service
+    threads = []
+    original = service.model_inputs
+
+    def model_inputs(crops):
+        threads.append(threading.current_thread())
+        return original(crops)
+
+    monkeypatch.setattr(service, 'model_inputs', model_inputs)
+
+    async def main():
+        loop_thread = threading.current_thread()
+        single = await process_executor.forecast('水稻', periods=3)
+        many = await process_executor.forecast_many(['玉米', '水稻'], periods=3)
+        sweep = await process_executor.sweep_scenarios('水稻', 2, {'temperature': [20.0, 25.0]})
+        return loop_thread, single, many, sweep
+
+    loop_thread, single, many, sweep = asyncio.run(main())
+
+    assert len(threads) == 3
+    assert all(t is not loop_thread for t in threads)
+    assert list(many) == ['玉米', '水稻']
+    assert many['水稻']['predictions'] == single['predictions']
+    assert sweep['scenario_count'] == 2
+
+    thread_mode = ForecastExecutor(service, mode='thread', workers=1)
+    try:
+        expected = asyncio.run(thread_mode.forecast('水稻', periods=3))
+    finally:
+        thread_mode.shutdown()
+    assert single['predictions'] == expected['predictions']
+
+
+def test_run_rejects_when_pending_limit_reached():
+    executor = ForecastExecutor(ForecastService(), mode='inline', max_pending=0)
+
+    with pytest.raises(ForecastQueueFull):
+        asyncio.run(executor.forecast('水稻', periods=3))
+    assert executor.stats()['rejected'] == 1
+    assert executor.pending == 0
+
+
+@pytest.mark.parametrize('body', [
+    {'crop': '水稻', 'periods': 3, 'factors': {'temperature': 25.0}},
+    {'crop': '水稻', 'periods': 3, 'scenarios': [{'temperature': 22.0}, {'temperature': 28.0}]},
+])
+def test_queue_full_maps_to_503(client, monkeypatch, body):
+    monkeypatch.setattr(forecast_executor, 'max_pending', 0)
+
+    response = client.post('/api/forecast/predict', json=body)
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert response.json()['detail'] == '预测任务繁忙，请稍后重试'
@@ -0,0 +1,152 @@
+import threading
+
+import pytest
+
+from app.services import forecast
+from app.services.forecast import ForecastService
+
+
+def records(crop, values, start_year=2020):
+    return [
+        {'date': f'{start_year + i // 12}-{i % 12 + 1:02d}-01', 'crop': crop, 'yield': v}
+        for i, v in enumerate(values)
+    ]
+
+
+@pytest.fixture
+def no_mock(monkeypatch):
+    def fail():
+        raise AssertionError("不应生成模拟数据")
+
+    monkeypatch.setattr(forecast, 'generate_mock_historical_data', fail)
+
+
+def test_loaded_history_skips_mock_generation(no_mock):
+    service = ForecastService()
+    service.load_historical_data(records('水稻', [1000.0 + i for i in range(24)]))
+
+    service.ensure_initialized()
+    assert service.history_crops() == ['水稻']
+    assert len(service.history_records('水稻')) == 24
+
+
+def test_mock_data_disabled_leaves_history_empty(no_mock):
+    service = ForecastService(mock_data=False)
+
+    assert service.history_crops() == []
+    assert service.history_records('玉米') == []
+    assert service.yield_series(['玉米']) == {'玉米': []}
+
+
+def test_mock_data_fills_crops_without_history():
+    service = ForecastService()
+    service.load_historical_data(records('水稻', [1000.0] * 12))
+
+    assert len(service.history_records('水稻')) == 12
+    assert service.history_records('玉米')[0]['crop'] == '玉米'
+
+
+def test_history_route_reads_off_event_loop(client, monkeypatch):
+    seen = {}
+    original = forecast.forecast_service.history_records
+
+    def history_records(crop):
+        seen['thread'] = threading.current_thread()
+        return original(crop)
+
+    monkeypatch.setattr(forecast.forecast_service, 'history_records', history_records)
+    response = client.get('/api/forecast/history/水稻')
+
+    assert response.status_code == 200
+    # asyncio.to_thread 使用事件循环的默认线程池
+    assert seen['thread'].name.startswith('asyncio_')
+
+
+def crop_history(*crops):
+    return [r for crop in crops for r in records(crop, [1000.0 + 10 * i for i in range(24)])]
+
+
+def test_model_cache_hits_and_misses():
+    service = ForecastService(cache_size=8)
+    service.load_historical_data(crop_history('水稻', '玉米'))
+
+    first = service.forecast('水稻', periods=3)
+    assert service.cache_stats()['misses'] == 1 and service.cache_stats()['hits'] == 0
+
+    assert service.forecast('水稻', periods=6)['predictions'][:3] == first['predictions']
+    service.forecast('玉米', periods=3)
+    stats = service.cache_stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 2)
+    assert stats['hit_rate'] == round(1 / 3, 4)
+
+
+def test_cache_is_lru_bounded():
+    service = ForecastService(cache_size=2)
+    service.load_historical_data(crop_history('水稻', '玉米', '小麦'))
+
+    for crop in ('水稻', '玉米', '水稻', '小麦', '水稻', '玉米'):
+        service._get_fitted(crop)
+    stats = service.cache_stats()
+    # 水稻 最近使用过，被淘汰的是 玉米，之后再次请求 玉米 未命中
+    assert (stats['hits'], stats['misses'], stats['size']) == (2, 4, 2)
+
+
+def test_load_historical_data_invalidates_every_crop():
+    service = ForecastService()
+    service.load_historical_data(crop_history('水稻', '玉米'))
+    before = service.forecast('水稻', periods=3)
+    service._get_fitted('玉米')
+    token = service.data_token('水稻')
+
+    service.load_historical_data(records('水稻', [2000.0 + 10 * i for i in range(24)]) + crop_history('玉米'))
+    assert service.cache_stats()['size'] == 0
+    assert service.data_token('水稻') != token
+
+    after = service.forecast('水稻', periods=3)
+    assert after['predictions'] != before['predictions']
+    assert service.cache_stats()['misses'] == 3
+
+
+def test_add_observations_invalidates_only_that_crop():
+    service = ForecastService()
+    service.load_historical_data(crop_history('水稻', '玉米'))
+    service._get_fitted('水稻')
+    service._get_fitted('玉米')
+
+    service.add_observations(records('水稻', [3000.0], start_year=2030))
+    service._get_fitted('玉米')
+    forecaster, data_points = service._get_fitted('水稻')
+
+    assert data_points == 25
+    assert (service.cache_stats()['hits'], service.cache_stats()['misses']) == (1, 3)
+
+
+def test_model_fitted_across_history_replacement_is_not_served(monkeypatch):
+    service = ForecastService()
+    service.load_historical_data(crop_history('水稻'))
+    original = service._prepare
+
+    def replace_during_fit(crop):
+        prepared = original(crop)
+        monkeypatch.setattr(service, '_prepare', original)
+        # 拟合期间历史数据被整体替换
+        service.load_historical_data(records('水稻', [5000.0] * 30))
+        return prepared
+
+    monkeypatch.setattr(service, '_prepare', replace_during_fit)
+    _, stale_points = service._get_fitted('水稻')
+    _, data_points = service._get_fitted('水稻')
+
+    assert stale_points == 24
+    assert data_points == 30
+
+
+def test_tuned_params_change_cache_key():
+    service = ForecastService()
+    service.load_historical_data(crop_history('水稻'))
+    service._get_fitted('水稻')
+
+    service.set_crop_params({'水稻': {'alpha': 0.6}})
+    forecaster, _ = service._get_fitted('水稻')
+    assert forecaster.es_predictor.alpha == 0.6
+    assert service.cache_stats()['misses'] == 2
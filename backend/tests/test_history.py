@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from app.services.history import FACTOR_COLUMNS, CropHistory
+
+
+def columns(dates, yields):
+    dates = np.array(dates, dtype='datetime64[D]')
+    yields = np.array(yields, dtype=np.float64)
+    factors = np.full((len(dates), len(FACTOR_COLUMNS)), np.nan)
+    factors[:, 0] = yields / 100
+    return dates, yields, factors
+
+
+def test_in_order_extend_appends_without_reallocating():
+    history = CropHistory(capacity=8)
+    history.extend(*columns(['2024-01-01', '2024-02-01'], [1.0, 2.0]))
+    buffer = history._yields
+    history.extend(*columns(['2024-02-01', '2024-03-01'], [3.0, 4.0]))
+
+    assert history._yields is buffer
+    assert history.yields.tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_out_of_order_extend_sorts_stably_and_keeps_old_views():
+    history = CropHistory(capacity=8)
+    history.extend(*columns(['2024-01-01', '2024-03-01', '2024-05-01'], [1.0, 3.0, 5.0]))
+    dates_view, yields_view, factors_view = history.dates, history.yields, history.factors
+
+    history.extend(*columns(['2024-04-01', '2024-03-01', '2024-02-01'], [4.0, 30.0, 2.0]))
+
+    assert [str(d) for d in history.dates] == [
+        '2024-01-01', '2024-02-01', '2024-03-01', '2024-03-01', '2024-04-01', '2024-05-01'
+    ]
+    # 同日期保持追加顺序，因素随行移动
+    assert history.yields.tolist() == [1.0, 2.0, 3.0, 30.0, 4.0, 5.0]
+    assert history.factors[:, 0].tolist() == [0.01, 0.02, 0.03, 0.3, 0.04, 0.05]
+    # 乱序追加重新分配数组，此前取出的视图不变
+    assert [str(d) for d in dates_view] == ['2024-01-01', '2024-03-01', '2024-05-01']
+    assert yields_view.tolist() == [1.0, 3.0, 5.0]
+    assert factors_view[:, 0].tolist() == [0.01, 0.03, 0.05]
+
+
+def test_extend_grows_capacity():
+    history = CropHistory(capacity=2)
+    for i in range(5):
+        history.extend(*columns([f'2024-0{i + 1}-01'], [float(i)]))
+    assert len(history) == 5
+    assert history.yields.tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+def test_revise_copies_arrays_and_leaves_old_views_unchanged():
+    history = CropHistory()
+    history.extend(*columns(['2024-01-01', '2024-02-01', '2024-03-01'], [1.0, 2.0, 3.0]))
+    yields_view, factors_view = history.yields, history.factors
+
+    history.revise(*columns(['2024-03-01', '2024-01-01'], [30.0, 10.0]), has_factors=True)
+
+    assert history.yields.tolist() == [10.0, 2.0, 30.0]
+    assert history.factors[:, 0].tolist() == [0.1, 0.02, 0.3]
+    assert history.has_factors
+    assert not np.shares_memory(history.yields, yields_view)
+    assert yields_view.tolist() == [1.0, 2.0, 3.0]
+    assert factors_view[:, 0].tolist() == [0.01, 0.02, 0.03]
+
+
+@pytest.mark.parametrize('dates', [['2024-02-15'], ['2024-04-01'], ['2023-12-01']])
+def test_revise_unknown_date_raises(dates):
+    history = CropHistory()
+    history.extend(*columns(['2024-01-01', '2024-02-01', '2024-03-01'], [1.0, 2.0, 3.0]))
+
+    with pytest.raises(ValueError):
+        history.revise(*columns(dates, [9.0]))
+    assert history.yields.tolist() == [1.0, 2.0, 3.0]
+
+
+def test_has_date():
+    history = CropHistory()
+    assert not history.has_date('2024-01-01')
+    history.extend(*columns(['2024-01-01', '2024-03-01'], [1.0, 3.0]))
+
+    assert history.has_date('2024-01-01')
+    assert history.has_date('2024-03-01')
+    assert not history.has_date('2024-02-01')
+    assert not history.has_date('2024-04-01')
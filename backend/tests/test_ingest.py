@@ -0,0 +1,173 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import SessionLocal
+from app.models.models import SensorData, SensorDataDeadLetter
+from app.models.schemas import SensorReadingIn
+from app.services.ingest import IngestBuffer, IngestBufferStopped, IngestQueueFull, ingest_buffer
+
+
+def create_sensor(client, sensor_type: str = 'temperature') -> str:
+    response = client.post('/api/sensors', json={'name': '测试', 'type': sensor_type, 'location': 'A'})
+    assert response.status_code == 200
+    return response.json()['sensor_id']
+
+
+def test_reading_schema_normalizes_to_naive_utc():
+    reading = SensorReadingIn(sensor_id='S001', value=1, recorded_at='2025-06-01T08:00:30+08:00')
+    assert reading.recorded_at == datetime(2025, 6, 1, 0, 0, 30)
+    assert reading.recorded_at.tzinfo is None
+
+    naive = SensorReadingIn(sensor_id='S001', value=1, recorded_at='2025-06-01T08:00:30')
+    assert naive.recorded_at == datetime(2025, 6, 1, 8, 0, 30)
+
+
+def test_batch_stores_tz_aware_readings_as_utc(client, db):
+    code = create_sensor(client)
+    response = client.post('/api/sensors/data/batch', json={'readings': [
+        {'sensor_id': code, 'value': 21.5, 'recorded_at': '2025-06-01T08:00:30+08:00'},
+        {'sensor_id': code, 'value': 22.5, 'recorded_at': '2025-06-01T00:01:30Z'},
+        {'sensor_id': 'S999', 'value': 1.0}
+    ]})
+
+    assert response.status_code == 200
+    assert response.json()['accepted'] == 2
+    assert response.json()['unknown_sensors'] == ['S999']
+    stored = sorted(r.recorded_at for r in db.query(SensorData).all())
+    assert stored == [datetime(2025, 6, 1, 0, 0, 30), datetime(2025, 6, 1, 0, 1, 30)]
+
+
+class FlakySession:
+    """前 failures 次写入 sensor_data 时抛出异常的会话"""
+
+    def __init__(self, session, state):
+        self._session = session
+        self._state = state
+
+    def execute(self, statement, *args, **kwargs):
+        if self._state['failures'] > 0 and 'sensor_data' in str(statement):
+            self._state['failures'] -= 1
+            raise RuntimeError('database is locked')
+        return self._session.execute(statement, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+def make_buffer(failures: int, max_retries: int = 3, **params) -> IngestBuffer:
+    state = {'failures': failures}
+    return IngestBuffer(session_factory=lambda: FlakySession(SessionLocal(), state),
+                        max_retries=max_retries, retry_backoff=0.01, **params)
+
+
+def readings(count: int, sensor_pk: int = 1):
+    start = datetime(2025, 6, 1)
+    return [{'sensor_id': sensor_pk, 'value': float(i), 'recorded_at': start + timedelta(seconds=i)}
+            for i in range(count)]
+
+
+def test_concurrent_puts_are_group_committed(db):
+    buffer = make_buffer(0, batch_size=500, flush_interval=0.05)
+    threads = [threading.Thread(target=buffer.put, args=(readings(100, pk),)) for pk in range(1, 11)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    buffer.stop()
+
+    stats = buffer.stats()
+    assert stats['flushed_rows'] == stats['enqueued_rows'] == 1000
+    assert stats['flush_count'] < 10
+    assert db.query(SensorData).count() == 1000
+
+
+def test_failed_flush_is_retried_without_losing_rows(db):
+    buffer = make_buffer(2, batch_size=50, flush_interval=0.01)
+    buffer.put(readings(120))
+    buffer.stop()
+
+    stats = buffer.stats()
+    assert stats['flushed_rows'] == 120
+    assert stats['retried_rows'] > 0 and stats['failed_rows'] == 0
+    # 重试保持提交顺序
+    assert [r.value for r in db.query(SensorData).order_by(SensorData.id)] == [float(i) for i in range(120)]
+
+
+def test_exhausted_retries_spill_to_dead_letter_table(db):
+    buffer = make_buffer(100, max_retries=2, batch_size=50, flush_interval=0.01)
+    buffer.put(readings(30))
+    buffer.stop()
+
+    stats = buffer.stats()
+    assert stats['flushed_rows'] == 0
+    assert stats['dead_letter_rows'] == 30 and stats['failed_rows'] == 0
+    letter = db.query(SensorDataDeadLetter).one()
+    assert letter.row_count == 30 and letter.attempts == 3
+    assert json.loads(letter.rows)[0] == {'sensor_id': 1, 'value': 0.0, 'recorded_at': '2025-06-01T00:00:00'}
+
+
+def test_queue_full_rejects_and_counts(db):
+    buffer = make_buffer(0, max_size=10, batch_size=1000, flush_interval=5)
+    buffer.put(readings(8))
+    with pytest.raises(IngestQueueFull):
+        buffer.put(readings(5))
+    buffer.stop()
+    assert buffer.stats()['rejected_rows'] == 5
+    assert buffer.stats()['flushed_rows'] == 8
+
+
+def test_put_after_stop_does_not_restart_flusher(db):
+    buffer = make_buffer(0, batch_size=50, flush_interval=0.01)
+    buffer.put(readings(10))
+    buffer.stop()
+
+    with pytest.raises(IngestBufferStopped):
+        buffer.put(readings(5))
+    assert buffer._thread is None
+    assert buffer.stats()['enqueued_rows'] == 10
+
+    # 显式 start() 后可重新接收
+    buffer.start()
+    buffer.put(readings(5))
+    buffer.stop()
+    assert db.query(SensorData).count() == 15
+
+
+def test_rows_awaiting_retry_count_toward_capacity(db):
+    buffer = make_buffer(1, max_size=10, batch_size=5, flush_interval=0.01)
+    buffer.retry_backoff = 0.3
+    buffer.put(readings(5))
+
+    deadline = time.monotonic() + 2
+    while buffer.stats()['retry_pending_rows'] != 5:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+    assert buffer.stats()['queue_depth'] == 0
+
+    with pytest.raises(IngestQueueFull):
+        buffer.put(readings(6, sensor_pk=2))
+    buffer.put(readings(5, sensor_pk=2))
+    buffer.stop()
+
+    stats = buffer.stats()
+    assert stats['retry_pending_rows'] == 0
+    assert stats['flushed_rows'] == 10 and stats['rejected_rows'] == 6
+
+
+def test_batch_endpoint_writes_directly_after_buffer_stopped(client, db, monkeypatch):
+    code = create_sensor(client)
+    monkeypatch.setattr('app.config.settings.INGEST_WRITE_BEHIND', True)
+    ingest_buffer.stop()
+
+    response = client.post('/api/sensors/data/batch', json={'readings': [
+        {'sensor_id': code, 'value': 21.5, 'recorded_at': '2025-06-01T08:00:30'}
+    ]})
+    assert response.status_code == 200
+    assert response.json()['accepted'] == 1
+    assert response.json()['queued'] is False
+    assert db.query(SensorData).count() == 1
+    assert ingest_buffer._thread is None
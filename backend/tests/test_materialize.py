@@ -0,0 +1,100 @@
+import time
+import warnings
+
+from app.services.forecast import ForecastService
+from app.services.materialize import ForecastMaterializer
+
+
+def make_service(crops):
+    service = ForecastService()
+    service.load_historical_data([
+        {'date': f'2024-{m:02d}', 'crop': crop, 'yield': 100.0 + m}
+        for crop in crops for m in range(1, 13)
+    ])
+    return service
+
+
+def test_only_served_crops_with_history_are_materialized(db):
+    service = make_service(['水稻', '玉米', '花生'])
+    materializer = ForecastMaterializer(service, periods=(3,), session_factory=lambda: db)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        assert materializer.crops() == ['水稻', '玉米']
+        keys = materializer._scheduled_keys()
+    assert keys == {('水稻', 3), ('玉米', 3)}
+
+    assert materializer.refresh(keys, db) == 2
+    assert materializer.get('水稻', 3)['stale'] is False
+    assert materializer._scheduled_keys() == set()
+
+
+def test_snapshot_goes_stale_when_history_changes(db):
+    service = make_service(['水稻'])
+    materializer = ForecastMaterializer(service, periods=(3,), session_factory=lambda: db)
+    materializer.refresh([('水稻', 3)], db)
+
+    service.add_observations([{'date': '2025-01', 'crop': '水稻', 'yield': 500.0}])
+
+    assert materializer.get('水稻', 3)['stale'] is True
+    assert ('水稻', 3) in materializer._scheduled_keys()
+
+
+class FakePlotRunner:
+    """记录启动次数的地块级预测任务，running 为 True 时拒绝启动"""
+
+    def __init__(self):
+        self.starts = 0
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return {'status': 'running'}, False
+        self.starts += 1
+        return {'status': 'running'}, True
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_plot_forecasts_run_on_schedule_and_on_data_change(db):
+    service = make_service(['水稻'])
+    runner = FakePlotRunner()
+    materializer = ForecastMaterializer(service, periods=(3,), interval=60, plot_runner=runner,
+                                        plot_interval=3600, session_factory=lambda: db)
+    materializer.start()
+    try:
+        # 启动后的首次检查即运行一次
+        wait_for(lambda: runner.starts == 1)
+        assert materializer.get('水稻', 3) is not None
+
+        service.add_observations([{'date': '2025-01', 'crop': '水稻', 'yield': 500.0}])
+        materializer.refresh_stale()
+        wait_for(lambda: runner.starts == 2)
+    finally:
+        materializer.stop()
+    assert materializer.stats()['plot_runs'] == 2
+
+
+def test_plot_refresh_requested_while_running_is_retried(db):
+    service = make_service(['水稻'])
+    runner = FakePlotRunner()
+    runner.running = True
+    materializer = ForecastMaterializer(service, periods=(3,), interval=0.02, plot_runner=runner,
+                                        plot_interval=0, session_factory=lambda: db)
+    materializer.start()
+    try:
+        materializer.request_plot_refresh()
+        time.sleep(0.05)
+        assert runner.starts == 0
+        runner.running = False
+        wait_for(lambda: runner.starts == 1)
+        # plot_interval <= 0：此后只在数据变化时再运行
+        time.sleep(0.05)
+        assert runner.starts == 1
+    finally:
+        materializer.stop()
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import numpy as np
+
+from app.models.models import CropRecord, Plot, PlotForecast, YieldRecord
+from app.services.forecast import EnsembleForecaster, ForecastService
+from app.services.plot_forecast import (
+    add_months, build_plot_series, forecast_chunk, latest_plot_forecast, run_plot_forecasts
+)
+
+START = datetime(2024, 1, 1)
+
+
+def seed(db, plot_id: int, months, value: float = 100.0, status: str = '种植中'):
+    db.add(Plot(id=plot_id, name=f'地块{plot_id}', area=5, status='种植中'))
+    db.add(CropRecord(id=plot_id, plot_id=plot_id, crop_name='水稻', status=status))
+    db.bulk_insert_mappings(YieldRecord, [
+        {'crop_record_id': plot_id, 'plot_id': plot_id, 'crop': '水稻',
+         'period_start': add_months(START, m), 'yield_value': value + m}
+        for m in months
+    ])
+    db.commit()
+
+
+def test_series_with_gaps_are_filled_with_zero(db):
+    seed(db, 1, [0, 1, 4, 5])
+
+    items, skipped = build_plot_series(db)
+
+    assert skipped == 0
+    assert items[0]['values'] == [100.0, 101.0, 0.0, 0.0, 104.0, 105.0]
+    assert items[0]['filled'] == 2
+    assert items[0]['last_period'] == add_months(START, 5)
+
+
+def test_chunk_forecasts_match_scalar_forecasts(db):
+    series = [[100.0 + 10 * np.sin(m / 2) + p for m in range(30)] for p in range(5)]
+    config = ForecastService().config_for('水稻')
+
+    predicted, lower, upper = forecast_chunk(config, series, 3)
+
+    for row, values in enumerate(series):
+        forecaster = EnsembleForecaster(**config)
+        forecaster.fit(values)
+        expected = forecaster.predict(3, current_season=len(values) % 12)
+        np.testing.assert_allclose(predicted[row], [r.predicted_value for r in expected], atol=0.01)
+
+
+def test_forecasts_of_ended_records_are_removed(db):
+    seed(db, 1, range(12))
+    seed(db, 2, range(12))
+    service = ForecastService()
+    run_plot_forecasts(db, service, horizon=3)
+    assert len(latest_plot_forecast(db, 2)) == 3
+
+    record = db.get(CropRecord, 2)
+    record.status = '已收获'
+    db.commit()
+    # 下次运行之前接口即不再返回已结束种植记录的预测
+    assert latest_plot_forecast(db, 2) == []
+
+    summary = run_plot_forecasts(db, service, horizon=3)
+
+    assert summary['plots'] == 1 and summary['removed'] == 3
+    assert {row.plot_id for row in db.query(PlotForecast).all()} == {1}
+    assert [p['period_start'] for p in latest_plot_forecast(db, 1)] == ['2025-01', '2025-02', '2025-03']
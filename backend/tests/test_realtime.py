@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.services.ingest import sensor_cache
+from app.services.realtime import SensorRingBuffer, realtime_store, to_epoch
+
+
+def test_to_epoch_accepts_tz_aware_timestamps():
+    naive = datetime(2025, 6, 1, 0, 0, 30)
+    aware = datetime(2025, 6, 1, 0, 0, 30, tzinfo=timezone.utc)
+    assert to_epoch(aware) == to_epoch(naive)
+
+
+def test_latest_is_newest_timestamp_not_last_written():
+    buffer = SensorRingBuffer(capacity=4)
+    buffer.extend(np.array([10.0, 20.0]), np.array([1.0, 2.0]))
+    # 迟到的旧数据
+    buffer.extend(np.array([5.0, 15.0]), np.array([0.5, 1.5]))
+    assert buffer.latest() == (20.0, 2.0)
+
+    buffer.extend(np.array([30.0]), np.array([3.0]))
+    assert buffer.latest() == (30.0, 3.0)
+
+
+def test_ring_buffer_keeps_last_capacity_rows():
+    buffer = SensorRingBuffer(capacity=3)
+    buffer.extend(np.arange(5, dtype=float), np.arange(5, dtype=float) * 10)
+    times, values = buffer.window(0)
+    assert times.tolist() == [2.0, 3.0, 4.0]
+    assert values.tolist() == [20.0, 30.0, 40.0]
+
+
+def test_realtime_endpoint_serves_tz_aware_batch(client):
+    code = client.post('/api/sensors', json={'name': '温度', 'type': 'temperature',
+                                             'location': 'A'}).json()['sensor_id']
+    client.post('/api/sensors/data/batch', json={'readings': [
+        {'sensor_id': code, 'value': 30.0, 'recorded_at': '2025-06-01T08:10:00+08:00'},
+        {'sensor_id': code, 'value': 20.0, 'recorded_at': '2025-06-01T00:05:00Z'},
+    ]})
+
+    latest = realtime_store.latest_by_type()['temperature']
+    assert [(ref.sensor_id, value) for ref, _, value in latest] == [(code, 30.0)]
+    temperature = next(item for item in client.get('/api/sensors/realtime').json()
+                       if item['type'] == 'temperature')
+    assert temperature['value'] == 30.0
+
+
+def test_record_accepts_tz_aware_rows(client, db):
+    code = client.post('/api/sensors', json={'name': '湿度', 'type': 'humidity',
+                                             'location': 'A'}).json()['sensor_id']
+    pk = sensor_cache.resolve(db, [code])[code].id
+
+    # 不经过接口校验的写入方（带时区的时间）
+    realtime_store.record([
+        {'sensor_id': pk, 'value': 55.0,
+         'recorded_at': datetime(2025, 6, 1, 0, 0, tzinfo=timezone.utc)}
+    ])
+
+    latest = realtime_store.latest_by_type()['humidity']
+    assert latest[0][1:] == (to_epoch(datetime(2025, 6, 1)), 55.0)
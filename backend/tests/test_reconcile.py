@@ -0,0 +1,117 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.models.models import CropRecord, Plot, YieldRecord
+from app.services.forecast import ForecastService
+from app.services.plot_forecast import add_months, run_plot_forecasts
+from app.services.reconcile import reconcile, reconcile_forecasts
+from app.services.yield_history import YieldHistoryLoader
+
+
+def coherent_hierarchy(n: int = 40, n_groups: int = 4, horizon: int = 3, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    groups = np.arange(n) % n_groups
+    leaf = rng.uniform(50, 150, (n, horizon))
+    group_base = np.stack([leaf[groups == k].sum(axis=0) for k in range(n_groups)])
+    return leaf, groups, group_base, group_base.sum(axis=0), rng
+
+
+@pytest.mark.parametrize('method, weights', [
+    ('bottom_up', 'variance'), ('top_down', 'variance'),
+    ('mint', 'structural'), ('mint', 'variance')
+])
+def test_coherent_inputs_are_unchanged(method, weights):
+    leaf, groups, group_base, top, rng = coherent_hierarchy()
+    variances = (rng.uniform(1, 10, leaf.shape), rng.uniform(5, 50, group_base.shape),
+                 rng.uniform(50, 100, top.shape))
+
+    plots, crops, farm = reconcile(leaf, groups, group_base, top, method, weights, *variances)
+
+    np.testing.assert_allclose(plots, leaf)
+    np.testing.assert_allclose(crops, group_base)
+    np.testing.assert_allclose(farm, top)
+
+
+def test_mint_matches_dense_formula_and_sums_up():
+    leaf, groups, group_base, top, rng = coherent_hierarchy(n=30, n_groups=3, horizon=2)
+    group_base = group_base * rng.uniform(0.8, 1.2, (3, 1))
+    leaf_var, group_var = rng.uniform(1, 10, leaf.shape), rng.uniform(5, 50, group_base.shape)
+    top_var = group_var.sum(axis=0)
+
+    plots, crops, farm = reconcile(leaf, groups, group_base, top, 'mint', 'variance',
+                                   leaf_var, group_var, top_var)
+
+    S = np.vstack([np.ones((1, 30)), (groups[None, :] == np.arange(3)[:, None]).astype(float),
+                   np.eye(30)])
+    for h in range(2):
+        w_inv = np.diag(1 / np.r_[top_var[h], group_var[:, h], leaf_var[:, h]])
+        y = np.r_[top[h], group_base[:, h], leaf[:, h]]
+        expected = S @ np.linalg.solve(S.T @ w_inv @ S, S.T @ w_inv @ y)
+        np.testing.assert_allclose(np.r_[farm[h], crops[:, h], plots[:, h]], expected)
+    np.testing.assert_allclose(crops.sum(axis=0), farm)
+
+
+def seed_plots(db, values, months: int = 24, lag=()):
+    """每个地块一条种植中记录，产量为常数序列；lag 中的地块少报最后一期"""
+    start = datetime(2024, 1, 1)
+    for i, value in enumerate(values):
+        db.add(Plot(id=i + 1, name=f'地块{i + 1}', area=5, status='种植中'))
+        db.add(CropRecord(id=i + 1, plot_id=i + 1, crop_name='水稻', status='种植中'))
+        db.bulk_insert_mappings(YieldRecord, [
+            {'crop_record_id': i + 1, 'plot_id': i + 1, 'crop': '水稻',
+             'period_start': add_months(start, m), 'yield_value': value}
+            for m in range(months - (1 if i in lag else 0))
+        ])
+    db.commit()
+
+
+def test_reconcile_forecasts_is_coherent_on_consistent_inputs(db):
+    values = [100.0, 150.0, 200.0, 250.0, 300.0]
+    seed_plots(db, values)
+    service = ForecastService()
+    YieldHistoryLoader(service, session_factory=lambda: db).refresh(db)
+    run_plot_forecasts(db, service, horizon=3)
+
+    result = reconcile_forecasts(db, service, periods=3, method='mint')
+
+    assert result['period_starts'] == ['2026-01', '2026-02', '2026-03']
+    assert result['warnings'] == []
+    rice = result['crops']['水稻']
+    assert rice['plots'] == len(values)
+    np.testing.assert_allclose(rice['plots_sum'], rice['base'], rtol=1e-3)
+    np.testing.assert_allclose(rice['reconciled'], rice['base'], rtol=1e-3)
+    np.testing.assert_allclose(rice['coherence_ratio'], 1.0, rtol=1e-3)
+    np.testing.assert_allclose(result['farm']['reconciled'], rice['base'], rtol=1e-3)
+
+
+def test_reconcile_forecasts_aligns_on_period_start(db):
+    # 地块 1 少报最后一期：其预测期比作物级早一个月，不参与协调
+    seed_plots(db, [100.0, 200.0, 300.0], lag={0})
+    service = ForecastService()
+    YieldHistoryLoader(service, session_factory=lambda: db).refresh(db)
+    run_plot_forecasts(db, service, horizon=3)
+
+    result = reconcile_forecasts(db, service, periods=3, method='bottom_up', include_plots=True)
+
+    assert result['period_starts'] == ['2026-01', '2026-02', '2026-03']
+    assert result['dropped_periods']['plots'] == ['2025-12']
+    assert result['excluded_plot_ids'] == [1]
+    assert [p['plot_id'] for p in result['plots']] == [2, 3]
+    assert result['crops']['水稻']['incoherent'] is False
+
+
+def test_reconcile_forecasts_flags_gross_incoherence(db):
+    seed_plots(db, [100.0, 200.0])
+    service = ForecastService()
+    YieldHistoryLoader(service, session_factory=lambda: db).refresh(db)
+    run_plot_forecasts(db, service, horizon=3)
+    # 作物级历史放大 10 倍，地块预测之和只有作物级预测的十分之一
+    service.history.get('水稻')._yields *= 10
+    service.set_history(service.history)
+
+    result = reconcile_forecasts(db, service, periods=3)
+
+    assert result['crops']['水稻']['incoherent'] is True
+    assert result['warnings']
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+from app.models.models import Sensor, SensorRollup
+from app.services.rollup import apply_rollups, query_history
+
+
+@pytest.fixture
+def sensor(db):
+    db.add(Sensor(id=1, name='温度', sensor_id='S001', type='temperature', location='A'))
+    db.commit()
+    return 1
+
+
+def rows(*points):
+    return [{'sensor_id': 1, 'value': v, 'recorded_at': ts} for ts, v in points]
+
+
+def bucket(db, name):
+    return db.query(SensorRollup).filter(SensorRollup.bucket == name).order_by(SensorRollup.bucket_start).all()
+
+
+def test_batches_merge_into_existing_buckets(db, sensor):
+    assert apply_rollups(db, rows(
+        (datetime(2025, 6, 1, 10, 0, 5), 20.0),
+        (datetime(2025, 6, 1, 10, 0, 40), 24.0),
+        (datetime(2025, 6, 1, 10, 1, 10), 22.0),
+    )) == 2 + 1 + 1
+    db.commit()
+
+    # 第二批：更早的一条不应覆盖 last，且与已有的桶合并而不是新增
+    apply_rollups(db, rows(
+        (datetime(2025, 6, 1, 10, 0, 1), 18.0),
+        (datetime(2025, 6, 1, 10, 1, 50), 30.0),
+    ))
+    db.commit()
+
+    minutes = bucket(db, '1m')
+    assert [(r.min_value, r.max_value, r.sum_value, r.count, r.last_value) for r in minutes] == [
+        (18.0, 24.0, 62.0, 3, 24.0),
+        (22.0, 30.0, 52.0, 2, 30.0),
+    ]
+    [hour] = bucket(db, '1h')
+    assert (hour.min_value, hour.max_value, hour.sum_value, hour.count) == (18.0, 30.0, 114.0, 5)
+    assert (hour.last_value, hour.last_at) == (30.0, datetime(2025, 6, 1, 10, 1, 50))
+    assert len(bucket(db, '1d')) == 1
+
+
+def test_out_of_order_batch_keeps_newest_last_value(db, sensor):
+    apply_rollups(db, rows((datetime(2025, 6, 1, 10, 30), 25.0)))
+    apply_rollups(db, rows((datetime(2025, 6, 1, 10, 5), 10.0)))
+    db.commit()
+
+    [hour] = bucket(db, '1h')
+    assert (hour.last_value, hour.last_at) == (25.0, datetime(2025, 6, 1, 10, 30))
+
+
+def test_history_reads_rollups(db, sensor):
+    apply_rollups(db, rows(
+        (datetime(2025, 6, 1, 9, 15), 10.0),
+        (datetime(2025, 6, 1, 10, 15), 20.0),
+        (datetime(2025, 6, 1, 10, 45), 30.0),
+    ))
+    db.commit()
+
+    history = query_history(db, 'temperature', '24h', now=datetime(2025, 6, 1, 11, 0))
+    assert [(p['value'], p['min'], p['max'], p['count']) for p in history] == [
+        (10.0, 10.0, 10.0, 1),
+        (25.0, 20.0, 30.0, 2),
+    ]
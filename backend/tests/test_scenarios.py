@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.forecast import FACTOR_DEFAULTS
+
+
+def sweep(client, **body):
+    return client.post('/api/forecast/scenarios', json=dict({'crop': '水稻', 'periods': 2}, **body))
+
+
+def test_ranges_include_stop_and_values_form_grid(client):
+    response = sweep(client,
+                     ranges={'temperature': {'start': 20, 'stop': 22, 'step': 0.5}},
+                     values={'rainfall': [100, 150, 200]},
+                     include_periods=True)
+    assert response.status_code == 200
+    data = response.json()['data']
+
+    assert data['axes']['temperature'] == [20.0, 20.5, 21.0, 21.5, 22.0]
+    assert data['axes']['rainfall'] == [100.0, 150.0, 200.0]
+    assert data['axes']['sunshine'] == [FACTOR_DEFAULTS['sunshine']]
+    assert data['grid_shape'] == [5, 3, 1, 1, 1]
+    assert data['scenario_count'] == 15
+    assert len(data['total_predicted_yield']) == 15
+    assert np.allclose(np.asarray(data['predicted_yield']).sum(axis=1),
+                       data['total_predicted_yield'], atol=0.05)
+
+
+def test_step_that_does_not_divide_range_stops_before_stop(client):
+    data = sweep(client, ranges={'soil_ph': {'start': 6.0, 'stop': 7.0, 'step': 0.3}}).json()['data']
+    assert data['axes']['soil_ph'] == [6.0, 6.3, 6.6, 6.9]
+
+
+def test_top_k_orders_best_scenarios(client):
+    data = sweep(client, values={'fertilizer': [20, 40, 60, 80]}, top_k=2).json()['data']
+    totals = data['total_predicted_yield']
+
+    assert len(data['top']) == 2
+    assert [t['index'] for t in data['top']] == list(np.argsort(totals)[::-1][:2])
+    best = data['top'][0]
+    assert best['total_predicted_yield'] == max(totals)
+    assert best['factors']['fertilizer'] == data['axes']['fertilizer'][best['index']]
+    assert len(best['predicted_yield']) == len(best['confidence_lower']) == 2
+
+
+@pytest.mark.parametrize('ranges', [
+    {'temperature': {'start': 0, 'stop': 1e12, 'step': 1e-3}},
+    {'temperature': {'start': 0, 'stop': 1e6, 'step': 1}},
+    {'temperature': {'start': 0, 'stop': 1e300, 'step': 1e-300}},
+])
+def test_oversized_grid_is_rejected_before_building_axes(client, monkeypatch, ranges):
+    def fail(*args, **kwargs):
+        raise AssertionError("不应构建超限的网格")
+
+    monkeypatch.setattr(np, 'arange', fail)
+    response = sweep(client, ranges=ranges)
+    assert response.status_code == 400
+    assert '超过上限' in response.json()['detail']
+
+
+def test_cap_counts_product_of_all_axes(client, monkeypatch):
+    monkeypatch.setattr(settings, 'FORECAST_SCENARIO_MAX_POINTS', 20)
+    ok = sweep(client, ranges={'temperature': {'start': 20, 'stop': 23, 'step': 1}},
+               values={'rainfall': [100, 150, 200, 250, 300]})
+    assert ok.status_code == 200
+    assert ok.json()['data']['scenario_count'] == 20
+
+    over = sweep(client, ranges={'temperature': {'start': 20, 'stop': 24, 'step': 1}},
+                 values={'rainfall': [100, 150, 200, 250, 300]})
+    assert over.status_code == 400
+    assert over.json()['detail'] == "情景数 25 超过上限 20"
+
+
+@pytest.mark.parametrize('step', [0, -1])
+def test_non_positive_step_is_rejected(client, step):
+    response = sweep(client, ranges={'temperature': {'start': 20, 'stop': 30, 'step': step}})
+    assert response.status_code == 400
+    assert '步长' in response.json()['detail']
+
+
+def test_invalid_factor_and_range_are_rejected(client):
+    assert sweep(client, values={'humidity': [1, 2]}).status_code == 400
+    assert sweep(client, ranges={'temperature': {'start': 30, 'stop': 20, 'step': 1}}).status_code == 400
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.models import Sensor, SensorData
+
+T0 = datetime(2025, 6, 1, 8, 0, 0)
+
+
+@pytest.fixture
+def sensor(db):
+    db.add(Sensor(id=1, name='温度', sensor_id='S001', type='temperature', location='A'))
+    db.add(Sensor(id=2, name='湿度', sensor_id='S002', type='humidity', location='A'))
+    # 每个时间点 3 条数据，分页边界会落在相同 recorded_at 的行之间
+    rows = [SensorData(sensor_id=1, value=float(i), recorded_at=T0 + timedelta(seconds=i // 3))
+            for i in range(12)]
+    rows.append(SensorData(sensor_id=2, value=99.0, recorded_at=T0))
+    db.add_all(rows)
+    db.commit()
+    return 1
+
+
+def pages(client, limit, **params):
+    result, cursor = [], None
+    while True:
+        query = dict(params, limit=limit)
+        if cursor:
+            query['cursor'] = cursor
+        response = client.get('/api/sensors/1/data', params=query)
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body['data']) <= limit
+        result.append([row['id'] for row in body['data']])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return result
+
+
+@pytest.mark.parametrize('limit', [1, 2, 4, 5, 12])
+def test_cursor_pages_cover_ties_exactly_once(client, sensor, limit):
+    descending = [row for page in pages(client, limit) for row in page]
+    ascending = [row for page in pages(client, limit, order='asc') for row in page]
+
+    assert ascending == list(range(1, 13))
+    assert descending == list(range(12, 0, -1))
+
+
+def test_order_sorts_by_time_then_id(client, sensor):
+    asc = client.get('/api/sensors/1/data', params={'order': 'asc', 'limit': 4}).json()['data']
+    desc = client.get('/api/sensors/1/data', params={'limit': 4}).json()['data']
+
+    assert [(r['recorded_at'], r['id']) for r in asc] == sorted((r['recorded_at'], r['id']) for r in asc)
+    assert [r['value'] for r in asc] == [0.0, 1.0, 2.0, 3.0]
+    assert [r['value'] for r in desc] == [11.0, 10.0, 9.0, 8.0]
+
+
+def test_time_window_and_last_page(client, sensor):
+    response = client.get('/api/sensors/1/data', params={
+        'start': (T0 + timedelta(seconds=1)).isoformat(),
+        'end': (T0 + timedelta(seconds=3)).isoformat(),
+        'order': 'asc', 'limit': 6
+    }).json()
+    assert [r['value'] for r in response['data']] == [3.0, 4.0, 5.0, 6.0, 7.0, 8.0]
+    assert response['next_cursor'] is None
+
+
+def test_invalid_cursor_and_unknown_sensor(client, sensor):
+    assert client.get('/api/sensors/1/data', params={'cursor': 'not-a-cursor'}).status_code == 400
+    assert client.get('/api/sensors/999/data').status_code == 404
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight, factors_key
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    async def compute(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {'key': key}
+
+    async def main():
+        results = await asyncio.gather(
+            *(flights.do('a', lambda: compute('a')) for _ in range(5)),
+            flights.do('b', lambda: compute('b'))
+        )
+        # 计算完成后不缓存结果，之后的调用重新计算
+        again = await flights.do('a', lambda: compute('a'))
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert calls == ['a', 'b', 'a']
+    assert all(r is results[0] for r in results[:5])
+    assert results[5] == {'key': 'b'}
+    assert again == {'key': 'a'} and again is not results[0]
+    assert flights.stats() == {
+        'inflight': 0, 'calls': 7, 'executions': 3, 'collapsed': 4,
+        'failures': 0, 'collapse_rate': round(4 / 7, 4)
+    }
+
+
+def test_failure_propagates_to_all_waiters_and_is_not_cached():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    async def main():
+        results = await asyncio.gather(*(flights.do('k', fail) for _ in range(3)),
+                                       return_exceptions=True)
+        retried = await flights.do('k', lambda: asyncio.sleep(0, result='ok'))
+        return results, retried
+
+    results, retried = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert retried == 'ok'
+    assert flights.failures == 1 and flights.executions == 2
+
+
+def test_cancelled_caller_does_not_cancel_shared_computation():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def main():
+        first = asyncio.ensure_future(flights.do('k', compute))
+        second = asyncio.ensure_future(flights.do('k', compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 42
+
+
+def test_factors_key_is_order_insensitive():
+    assert factors_key({'rainfall': 100, 'temperature': 25.0, 'sunshine': None}) == \
+        factors_key({'temperature': 25, 'rainfall': 100.0})
+    assert factors_key({}) is None
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.models.models import Sensor
+from app.services.ingest import sensor_cache
+from app.services.stream import StreamHub
+
+
+@pytest.fixture
+def sensors(db):
+    db.add_all([
+        Sensor(id=1, name='温度', sensor_id='S001', type='temperature', location='A'),
+        Sensor(id=2, name='湿度', sensor_id='S002', type='humidity', location='A'),
+        Sensor(id=3, name='温度', sensor_id='S003', type='temperature', location='B'),
+    ])
+    db.commit()
+    sensor_cache.invalidate()
+    sensor_cache.resolve(db, ['S001', 'S002', 'S003'])
+
+
+def row(pk, value):
+    return {'sensor_id': pk, 'value': value, 'recorded_at': datetime(2025, 6, 1)}
+
+
+async def drain(subscriber):
+    messages = []
+    while not subscriber.queue.empty():
+        messages.append(subscriber.queue.get_nowait())
+    return messages
+
+
+def test_subscribers_receive_only_matching_events(sensors):
+    hub = StreamHub(queue_size=10)
+
+    async def main():
+        everything = hub.subscribe()
+        temperature = hub.subscribe(types={'temperature'})
+        temperature_b = hub.subscribe(types={'temperature'}, locations={'B'})
+        humidity_b = hub.subscribe(types={'humidity'}, locations={'B'})
+
+        # 数据接收回调在其他线程中发布
+        thread = threading.Thread(target=hub.publish, args=([row(1, 20.0), row(2, 60.0), row(3, 25.0), row(9, 0.0)],))
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0)
+        return [await drain(s) for s in (everything, temperature, temperature_b, humidity_b)]
+
+    everything, temperature, temperature_b, humidity_b = asyncio.run(main())
+
+    # 每批数据为一条消息，未知传感器被忽略
+    assert [[e['sensor_id'] for e in m] for m in everything] == [['S001', 'S002', 'S003']]
+    assert [[e['sensor_id'] for e in m] for m in temperature] == [['S001', 'S003']]
+    assert temperature_b == [[{'sensor_id': 'S003', 'type': 'temperature', 'location': 'B',
+                               'value': 25.0, 'recorded_at': '2025-06-01T00:00:00'}]]
+    assert humidity_b == []
+    assert hub.stats()['delivered_messages'] == 3
+
+
+def test_slow_subscriber_is_dropped_without_blocking_others(sensors):
+    hub = StreamHub(queue_size=2)
+
+    async def main():
+        slow = hub.subscribe()
+        fast = hub.subscribe()
+        received = []
+        for i in range(4):
+            hub.publish([row(1, float(i))])
+            await asyncio.sleep(0)
+            received.extend(await drain(fast))
+        return slow, received
+
+    slow, received = asyncio.run(main())
+
+    assert slow.dropped
+    # 断开时清空队列，只留结束标记
+    assert slow.queue.qsize() == 1 and slow.queue.get_nowait() is None
+    assert [m[0]['value'] for m in received] == [0.0, 1.0, 2.0, 3.0]
+    assert hub.stats() == {'subscribers': 1, 'published_events': 4,
+                           'delivered_messages': 6, 'dropped_subscribers': 1}
+
+
+def test_publish_without_subscribers_is_noop(sensors):
+    hub = StreamHub()
+    hub.publish([row(1, 1.0)])
+    assert hub.stats()['published_events'] == 0
@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+
+from app.models.models import YieldRecord
+from app.services.forecast import ForecastService
+from app.services.yield_history import YieldHistoryLoader
+
+
+def month(i: int) -> datetime:
+    return datetime(2025 + i // 12, i % 12 + 1, 1)
+
+
+def seed(db, plots: int, months: range, value: float = 100.0, crop: str = '水稻'):
+    db.bulk_insert_mappings(YieldRecord, [
+        {'plot_id': p + 1, 'crop': crop, 'period_start': month(m),
+         'yield_value': value + p, 'temperature': 20.0 + p}
+        for m in months for p in range(plots)
+    ])
+    db.commit()
+
+
+@pytest.fixture
+def loader(db):
+    service = ForecastService()
+    return YieldHistoryLoader(service, session_factory=lambda: db, batch_size=7)
+
+
+def test_full_load_sums_plots_per_period(db, loader):
+    seed(db, plots=5, months=range(12))
+
+    assert loader.refresh(db) == {'mode': 'full', 'rows': 60}
+
+    history = loader.service.history.get('水稻')
+    assert len(history) == 12
+    assert history.yields.tolist() == [5 * 100.0 + 10] * 12
+    # 环境因素取各地块的平均
+    assert history.factors[:, 0].tolist() == [22.0] * 12
+    assert loader.high_water_mark == 60
+
+
+def test_incremental_load_folds_rows_into_existing_period(db, loader):
+    seed(db, plots=3, months=range(6))
+    loader.refresh(db)
+
+    # 已加载的最后一期再上报一个地块，并新增一期
+    db.bulk_insert_mappings(YieldRecord, [
+        {'plot_id': 4, 'crop': '水稻', 'period_start': month(5), 'yield_value': 50.0},
+        {'plot_id': 1, 'crop': '水稻', 'period_start': month(6), 'yield_value': 70.0},
+        {'plot_id': 2, 'crop': '水稻', 'period_start': month(6), 'yield_value': 80.0},
+    ])
+    db.commit()
+    result = loader.refresh(db)
+
+    assert result['mode'] == 'incremental'
+    assert result['rows'] == 3
+    assert result['revised'] == 1
+    history = loader.service.history.get('水稻')
+    assert len(history) == 7
+    assert history.yields.tolist() == [303.0] * 5 + [353.0, 150.0]
+
+
+def test_incremental_load_matches_full_load(db, loader):
+    seed(db, plots=4, months=range(10))
+    loader.refresh(db)
+    seed(db, plots=2, months=range(8, 14), value=10.0)
+    loader.refresh(db)
+
+    fresh = YieldHistoryLoader(ForecastService(), session_factory=lambda: db)
+    fresh.refresh(db)
+
+    incremental = loader.service.history.get('水稻')
+    full = fresh.service.history.get('水稻')
+    assert incremental.dates.tolist() == full.dates.tolist()
+    assert incremental.yields.tolist() == full.yields.tolist()
+
+
+def test_revised_period_invalidates_cached_model(db, loader):
+    seed(db, plots=2, months=range(24))
+    loader.refresh(db)
+    before = loader.service.forecast('水稻', 3)
+
+    db.add(YieldRecord(plot_id=3, crop='水稻', period_start=month(23), yield_value=5000.0))
+    db.commit()
+    result = loader.refresh(db)
+
+    assert result['invalidated'] == 1 and result['updated'] == 0
+    assert loader.service.forecast('水稻', 3) != before
+
+
+def test_new_period_updates_cached_model_incrementally(db, loader):
+    seed(db, plots=2, months=range(24))
+    loader.refresh(db)
+    loader.service.forecast('水稻', 3)
+
+    seed(db, plots=2, months=range(24, 25))
+    result = loader.refresh(db)
+
+    assert result['updated'] == 1 and result['invalidated'] == 0
+    assert len(loader.service.history.get('水稻')) == 25